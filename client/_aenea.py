@@ -34,6 +34,7 @@ try:
     import aenea.communications
     import aenea.config
     import aenea.configuration
+    import aenea.log
 except ImportError:
     print 'Unable to import Aenea client-side modules.'
     raise
@@ -113,7 +114,7 @@ def reload_code():
                 not bool(set(path.split(os.path.sep)) & dir_reload_blacklist)
                 and path != topy(os.path.abspath(__file__))):
 
-                print "removing %s from cache" % name
+                aenea.log.debug('removing %s from cache', name)
 
                 # Remove the module from the cache so that it will be reloaded
                 # the next time # that it is imported.  The paths for packages
@@ -28,6 +28,8 @@ except ImportError:
     print 'Unable to import Aenea client-side modules.'
     raise
 
+import aenea.capture_control
+
 
 _config = aenea.configuration.ConfigWatcher(
     'dictation_capture_state',
@@ -49,12 +51,14 @@ def enable_capture():
     _config.refresh()
     _config.conf['enabled'] = True
     _config.write()
+    aenea.capture_control.send_capture_state(True)
 
 
 def disable_capture():
     _config.refresh()
     _config.conf['enabled'] = False
     _config.write()
+    aenea.capture_control.send_capture_state(False)
 
 
 class ControlRule(dragonfly.MappingRule):
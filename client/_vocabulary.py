@@ -20,6 +20,7 @@
    you want a global context or being able to reload configurations on the
    fly rather than restarting Dragon.'''
 
+import aenea.communications
 import aenea.vocabulary
 import aenea.configuration
 
@@ -82,6 +83,7 @@ class StaticRule(dragonfly.CompoundRule):
             )
         )]
 
+    @aenea.communications.batched_recognition
     def _process_recognition(self, node, extras):
         extras['static'].execute(extras)
 
@@ -94,6 +96,7 @@ class DynamicRule(dragonfly.CompoundRule):
         aenea.vocabulary.register_global_dynamic_vocabulary()
         )]
 
+    @aenea.communications.batched_recognition
     def _process_recognition(self, node, extras):
         extras['dynamic'].execute(extras)
 
@@ -19,6 +19,7 @@ import aenea.communications
 import aenea.configuration
 import aenea.config
 import aenea.format
+import aenea.log
 import aenea.lax
 import aenea.strict
 import aenea.misc
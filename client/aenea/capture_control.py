@@ -0,0 +1,81 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Tells a running dictation capture client (aenea_client.py) to start or
+   stop forwarding keystrokes. The capture client used to poll
+   dictation_capture_state.json on every key; now _capture_client_control.py
+   pushes changes as UDP datagrams to localhost and the client only reads
+   the file once, at startup.'''
+
+import socket
+import threading
+
+import aenea.config
+import aenea.log
+
+ENABLE = 'enable'
+DISABLE = 'disable'
+
+
+def send_capture_state(enabled, address=None):
+    '''Pushes the new state to the capture client, if it is running.'''
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(ENABLE if enabled else DISABLE,
+                    address or aenea.config.CAPTURE_CONTROL_ADDRESS)
+    except socket.error as e:
+        aenea.log.warning(
+            'Unable to notify the dictation capture client: %s', e)
+    finally:
+        sock.close()
+
+
+class CaptureControlListener(object):
+    '''Receives the state pushed by send_capture_state in a background
+       thread. enabled is a plain attribute, so reading it costs nothing.
+       If the address is taken (e.g. by another capture client) capture
+       control is disabled: enabled keeps its initial value and address is
+       None.'''
+
+    def __init__(self, enabled=True, address=None):
+        self.enabled = enabled
+        self.address = None
+        address = address or aenea.config.CAPTURE_CONTROL_ADDRESS
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self._socket.bind(address)
+        except socket.error as e:
+            aenea.log.error('Cannot listen for capture control on %s:%i, '
+                            'capture cannot be started or stopped: %s',
+                            address[0], address[1], e)
+            self._socket.close()
+            return
+        self.address = self._socket.getsockname()
+        thread = threading.Thread(target=self._listen)
+        thread.daemon = True
+        thread.start()
+
+    def _listen(self):
+        while 1:
+            try:
+                message = self._socket.recv(64)
+            except socket.error:
+                return
+            if message == ENABLE:
+                self.enabled = True
+            elif message == DISABLE:
+                self.enabled = False
+
+    def close(self):
+        self._socket.close()
@@ -15,13 +15,21 @@
 # Copyright (2014) Alex Roper
 # Alex Roper <alex@aroper.net>
 
+import Queue
+import contextlib
+import functools
+import hashlib
 import httplib
+import json
 import jsonrpclib
 import socket
+import threading
 import time
+import uuid
 
 import aenea.config
 import aenea.configuration
+import aenea.log
 
 _server_config = aenea.configuration.ConfigWatcher(
     'server_state',
@@ -29,6 +37,20 @@ _server_config = aenea.configuration.ConfigWatcher(
      'port': aenea.config.DEFAULT_SERVER_ADDRESS[1]})
 _server_config.write()
 
+# RPCs that act without returning anything. Inside a batching scope these are
+# queued; any other call flushes the queue first since it may return data
+# that depends on the queued actions having run.
+DEFERRABLE_RPCS = frozenset([
+    'key_press', 'write_text', 'click_mouse', 'move_mouse', 'pause', 'notify',
+    'set_clipboard', 'invoke_macro'
+    ])
+
+
+def macro_id(commands):
+    '''Returns an id for the server's register_macro RPC that identifies
+       commands, (method, args, kwargs) tuples as for execute_batch.'''
+    return hashlib.sha1(json.dumps(commands, sort_keys=True)).hexdigest()[:16]
+
 
 def set_server_address(address):
     '''address is (host, port).'''
@@ -70,6 +92,11 @@ class Proxy(object):
         self.last_connect_good = False
         self._last_failed_connect = 0
         self._transport = _ImpatientTransport(aenea.config.COMMAND_TIMEOUT)
+        self._scope = threading.local()
+        # ids of the macros registered with the server at _address.
+        self._macros = set()
+        # commands of every macro executed so far, by id.
+        self._macro_commands = {}
 
     def _execute_batch(self, batch, use_multiple_actions=False):
         self._refresh_server()
@@ -82,32 +109,115 @@ class Proxy(object):
                 self.last_connect_good = True
 
                 if len(batch) == 1:
-                    return (getattr(
-                        self._server,
-                        batch[0][0])(*batch[0][1], **batch[0][2])
-                        )
+                    return self._call(*batch[0])
                 elif use_multiple_actions:
-                    self._server.multiple_actions(batch)
+                    self._call('multiple_actions', (batch,), {})
                 else:
                     for (command, args, kwargs) in batch:
-                        getattr(self._server, command)(*args, **kwargs)
+                        self._call(command, args, kwargs)
             except socket.error:
                 self._last_failed_connect = time.time()
                 self.last_connect_good = False
-                print 'Socket error connecting to aenea server. To avoid slowing dictation, we won\'t try again for %i seconds.' % aenea.config.CONNECT_RETRY_COOLDOWN
+                aenea.log.warning('Socket error connecting to aenea server. To avoid slowing dictation, we won\'t try again for %i seconds.', aenea.config.CONNECT_RETRY_COOLDOWN)
+
+    def _call(self, command, args, kwargs):
+        try:
+            return getattr(self._server, command)(*args, **kwargs)
+        except jsonrpclib.ProtocolError as e:
+            if 'unknown macro' not in str(e):
+                raise
+            # the server restarted and forgot its macros. Nothing was
+            # executed, so register the ones invoked again and retry once.
+            self._macros.clear()
+            if command == 'multiple_actions':
+                invoked = args[0]
+            else:
+                invoked = [(command, args, kwargs)]
+            macro_ids = set(kw.get('macro_id') or a[0]
+                            for (method, a, kw) in invoked
+                            if method == 'invoke_macro')
+            if not macro_ids.issubset(self._macro_commands):
+                raise
+            for macro_id in macro_ids:
+                self._server.register_macro(
+                    macro_id, self._macro_commands[macro_id])
+                self._macros.add(macro_id)
+            return getattr(self._server, command)(*args, **kwargs)
 
     def execute_batch(self, batch):
+        pending = self._pending()
+        if pending is not None:
+            pending.extend(batch)
+            return
         self._execute_batch(batch, aenea.config.USE_MULTIPLE_ACTIONS)
 
+    def execute_macro(self, macro_id, commands, arguments=None):
+        '''Executes commands (as for execute_batch) with the server's
+           invoke_macro RPC, sending them along with macro_id only the first
+           time. macro_id must identify commands, see macro_id().'''
+        self._refresh_server()
+        self._macro_commands[macro_id] = commands
+        if macro_id not in self._macros:
+            self.register_macro(macro_id, commands)
+            if not self.last_connect_good:
+                return
+            self._macros.add(macro_id)
+        if arguments:
+            self.invoke_macro(macro_id=macro_id, arguments=arguments)
+        else:
+            self.invoke_macro(macro_id=macro_id)
+
     def __getattr__(self, meth):
         def call(*a, **kw):
             # Cannot use both positional and keyword arguments
             # (according to JSON-RPC spec.)
             assert not (a and kw)
 
+            pending = self._pending()
+            if pending is not None and meth in DEFERRABLE_RPCS:
+                pending.append((meth, a, kw))
+                return
+            self.flush()
             return self._execute_batch([(meth, a, kw)])
         return call
 
+    def _pending(self):
+        return getattr(self._scope, 'pending', None)
+
+    def begin_batch(self):
+        '''Starts queueing actions instead of sending them. Scopes nest; the
+           queue is sent when the outermost one ends.'''
+        depth = getattr(self._scope, 'depth', 0)
+        if depth == 0:
+            self._scope.pending = []
+        self._scope.depth = depth + 1
+
+    def end_batch(self):
+        self._scope.depth -= 1
+        if self._scope.depth == 0:
+            try:
+                self.flush()
+            finally:
+                self._scope.pending = None
+
+    def flush(self):
+        '''Sends the queued actions, if any, as one batch.'''
+        pending = self._pending()
+        if pending:
+            self._scope.pending = []
+            self._execute_batch(pending, aenea.config.USE_MULTIPLE_ACTIONS)
+
+    @contextlib.contextmanager
+    def batched(self):
+        '''Every action executed in the with block reaches the server in a
+           single multiple_actions call (or fewer calls, if something in the
+           block needs an answer from the server).'''
+        self.begin_batch()
+        try:
+            yield
+        finally:
+            self.end_batch()
+
     def _refresh_server(self):
         _server_config.refresh()
         address = _server_config.conf['host'], _server_config.conf['port']
@@ -119,6 +229,7 @@ class Proxy(object):
                 transport=self._transport
                 )
             self._last_failed_connect = 0
+            self._macros.clear()
 
 
 class BatchProxy(object):
@@ -136,3 +247,98 @@ class BatchProxy(object):
         return call
 
 server = Proxy()
+
+
+class PipelinedSender(object):
+    '''Sends batches with the server's enqueue_actions RPC, which returns as
+       soon as a batch is queued rather than when it was executed, over
+       several connections at once. Batches are numbered in the order send()
+       is called and the server executes them in that order whatever order
+       they arrive in, so a slow batch (typing a long text, say) no longer
+       holds up the ones after it. Falls back to execute_batch, still in
+       order, for servers without enqueue_actions.'''
+    def __init__(self, connections=2):
+        self.stream = uuid.uuid4().hex
+        self.supported = True
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+        # every batch numbered below _delivered was sent (or failed).
+        self._delivered = 0
+        self._finished = set()
+        self._order = threading.Condition()
+        self._slots = threading.Semaphore(connections)
+        self._batches = Queue.Queue()
+        for _ in xrange(connections):
+            thread = threading.Thread(target=self._sender, args=(Proxy(),))
+            thread.daemon = True
+            thread.start()
+
+    def send(self, commands, replied=None):
+        '''Hands the batch to a connection. Blocks only while every
+           connection is waiting for an acknowledgement. replied, if given,
+           is called without arguments once the server answered.'''
+        self._slots.acquire()
+        with self._sequence_lock:
+            self._batches.put((self._sequence, commands, replied))
+            self._sequence += 1
+
+    def _sender(self, proxy):
+        while 1:
+            sequence, commands, replied = self._batches.get()
+            try:
+                self._deliver(proxy, sequence, commands)
+            except Exception as e:
+                # Keep delivering later batches.
+                aenea.log.error('Failed to send batch %i: %s', sequence, e)
+            finally:
+                self._finish(sequence)
+                self._slots.release()
+            if replied is not None:
+                replied()
+
+    def _deliver(self, proxy, sequence, commands):
+        if self.supported:
+            try:
+                proxy.enqueue_actions(
+                    actions=commands, sequence=sequence, stream=self.stream)
+                return
+            except jsonrpclib.ProtocolError as e:
+                aenea.log.warning('Server cannot enqueue actions (%s), sending them directly.', e)
+                self.supported = False
+        # Executed on arrival, so it must not overtake the batches before it.
+        with self._order:
+            while self._delivered < sequence:
+                self._order.wait()
+        server.execute_batch(commands)
+
+    def _finish(self, sequence):
+        with self._order:
+            self._finished.add(sequence)
+            while self._delivered in self._finished:
+                self._finished.remove(self._delivered)
+                self._delivered += 1
+            self._order.notify_all()
+
+
+def batched_recognition(process_recognition):
+    '''Decorator for a rule's _process_recognition (or process_recognition)
+       that sends all actions executed by one recognition in one batch:
+
+         class MyRule(dragonfly.CompoundRule):
+             @aenea.communications.batched_recognition
+             def _process_recognition(self, node, extras):
+                 ...
+
+       A MappingRule whose actions are sequences (Key(...) + Text(...))
+       can batch them the same way:
+
+         class MyMapping(dragonfly.MappingRule):
+             process_recognition = aenea.communications.batched_recognition(
+                 dragonfly.MappingRule.process_recognition)
+
+       Rules executing a single action gain nothing from it.'''
+    @functools.wraps(process_recognition)
+    def wrapper(*a, **kw):
+        with server.batched():
+            return process_recognition(*a, **kw)
+    return wrapper
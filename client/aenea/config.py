@@ -78,6 +78,43 @@ CONNECT_RETRY_COOLDOWN = _configuration.get('connect_retry_cooldown', 5)
 
 STALE_CONTEXT_DELTA = _configuration.get('stale_context_delta', 0.025)
 
+# Whether Mouse specs with several moves, e.g. drags, are sent as a single
+# mouse_path RPC. Off by default since only the linux X11 server has it.
+MOUSE_PATH = _configuration.get('mouse_path', False)
+
+# Whether vocabulary entries that are lists of actions are registered with
+# the server as macros, so that only an id is sent when they are spoken.
+# Off by default since only the linux X11 server has register_macro.
+VOCABULARY_MACROS = _configuration.get('vocabulary_macros', False)
+
+# How the dictation capture client coalesces keystrokes into batches: it
+# waits a delay of capture_rtt_factor times the observed round trip time,
+# clamped to [capture_min_delay, capture_max_delay] seconds, or until
+# capture_max_batch keystrokes are buffered. At most capture_max_in_flight
+# batches are queued or being sent; they are delivered in order.
+CAPTURE_MIN_DELAY = _configuration.get('capture_min_delay', 0.002)
+CAPTURE_MAX_DELAY = _configuration.get('capture_max_delay', 0.02)
+CAPTURE_RTT_FACTOR = _configuration.get('capture_rtt_factor', 0.5)
+CAPTURE_MAX_BATCH = _configuration.get('capture_max_batch', 64)
+CAPTURE_MAX_IN_FLIGHT = _configuration.get('capture_max_in_flight', 1)
+# Connections the capture client sends batches over with the server's
+# enqueue_actions RPC (acknowledged as soon as they are queued). 0 sends
+# them with execute_batch and waits for them to be executed.
+CAPTURE_CONNECTIONS = _configuration.get('capture_connections', 2)
+
+# Local address where the capture client listens for enable/disable
+# dictation capture (see aenea.capture_control).
+CAPTURE_CONTROL_ADDRESS = ('127.0.0.1',
+                           _configuration.get('capture_control_port', 8241))
+
+# Messages printed to the NatLink window (see aenea.log): the lowest level
+# shown ('debug', 'info', 'warning' or 'error'), and how often the same
+# message is shown at most, log_rate_limit times per log_rate_interval
+# seconds (0 for no limit).
+LOG_LEVEL = _configuration.get('log_level', 'info')
+LOG_RATE_LIMIT = _configuration.get('log_rate_limit', 5)
+LOG_RATE_INTERVAL = _configuration.get('log_rate_interval', 60)
+
 CONNECT_TIMEOUT = _configuration.get('connect_timeout', 0.1)
 COMMAND_TIMEOUT = _configuration.get('command_timeout', 2)
 
@@ -19,10 +19,12 @@
    can't handle the spec. So for example if you create a Key using Linux
    keysyms, everything will work fine unless you try to execute the action
    locally, in which case the key won't be pressed and a warning will be
-   printed to the Natlink window. If you want your grammar to work the same
+   logged to the Natlink window. If you want your grammar to work the same
    way on all platforms, use aenea.wrappers.strict instead.'''
 
+import aenea.log
 import aenea.proxy_actions
+import aenea.wrappers
 
 try:
     import dragonfly
@@ -47,9 +49,9 @@ class _WarnUserUnsupportedAction(dragonfly.ActionBase):
         self._exception = exception
 
     def execute(self, data=None):
-        print ('Warning: Current platform cannot handle this action. This '
-               'exception was thrown at grammar load time.')
-        traceback.print_tb(self._exception)
+        aenea.log.warning('Current platform cannot handle this action. '
+                          'This exception was thrown at grammar load time: '
+                          '%s', self._exception)
 
     def _parse_spec(self, spec):
         pass
@@ -59,29 +61,16 @@ class _WarnUserUnsupportedAction(dragonfly.ActionBase):
 
 
 class AeneaLaxDynStrActionBase(AeneaDynStrActionBase):
-    def _parse_spec(self, spec):
-        proxy = None
-        local = None
-        self._proxy_exception = None
-        self._local_exception = None
-        try:
-            proxy = self._proxy._parse_spec(spec)
-        except Exception as e:
-            self._proxy_exception = e
+    def _execute_events(self, spec):
+        action = self._active_action()
         try:
-            local = self._local._parse_spec(spec)
-        except Exception as e:
-            self._local_exception = e
-        return (proxy, local)
-
-    def _execute_events(self, commands):
-        if self.get_data()['_proxy']:
-            if self._proxy_exception is not None:
-                traceback.print_tb(self._proxy_exception)
-        else:
-            if self._local_exception is not None:
-                traceback.print_tb(self._local_exception)
-        AeneaDynStrActionBase._execute_events(self, commands)
+            events = aenea.wrappers._parse(action, spec)
+        except Exception:
+            aenea.log.warning(
+                'Current platform cannot handle this action:\n%s',
+                traceback.format_exc())
+            return
+        return action._execute_events(events)
 
 
 class Key(AeneaLaxDynStrActionBase):
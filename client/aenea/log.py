@@ -0,0 +1,129 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Messages for the NatLink window. Printing to it is slow, so code that
+   runs for every utterance or context evaluation logs through here
+   instead: messages below the configured level are dropped before they are
+   formatted, a message repeated more than log_rate_limit times within
+   log_rate_interval seconds is suppressed (and counted), and the rest are
+   formatted and written in one go by a background thread.
+
+   Usage mirrors the logging module:
+     aenea.log.warning('cannot reach %s:%i', host, port)'''
+
+import atexit
+import collections
+import sys
+import threading
+import time
+
+import aenea.config
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+
+
+class Logger(object):
+    '''Writes messages to stream (sys.stdout at the time of writing if None)
+       from a background thread that wakes up at most every flush_interval
+       seconds. A message is identified by its format string for rate
+       limiting, so log the variable parts as arguments.'''
+
+    def __init__(self, level=INFO, rate_limit=5, rate_interval=60,
+                 flush_interval=0.1, stream=None):
+        self.level = level
+        self.rate_limit = rate_limit
+        self.rate_interval = rate_interval
+        self.flush_interval = flush_interval
+        self.stream = stream
+        # format string -> [window start, messages written, suppressed]
+        self._rates = {}
+        self._records = collections.deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def log(self, level, message, *args):
+        if level < self.level:
+            return
+        now = time.time()
+        with self._lock:
+            rate = self._rates.get(message)
+            if rate is None or now - rate[0] >= self.rate_interval:
+                if rate is not None and rate[2]:
+                    self._records.append((
+                        '(suppressed %i more like "%s")', (rate[2], message)))
+                rate = self._rates[message] = [now, 0, 0]
+            if self.rate_limit and rate[1] >= self.rate_limit:
+                rate[2] += 1
+                return
+            rate[1] += 1
+            self._records.append((message, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        self._wake.set()
+
+    def debug(self, message, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(ERROR, message, *args)
+
+    def _run(self):
+        while 1:
+            self._wake.wait()
+            self._wake.clear()
+            # let a burst of messages accumulate into one write.
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        '''Writes every buffered message now.'''
+        lines = []
+        while self._records:
+            message, args = self._records.popleft()
+            try:
+                lines.append(message % args if args else message)
+            except (TypeError, ValueError):
+                lines.append('%s %r' % (message, args))
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write('\n'.join(lines) + '\n')
+            stream.flush()
+
+
+_logger = Logger(
+    level=LEVELS.get(str(aenea.config.LOG_LEVEL).lower(), INFO),
+    rate_limit=aenea.config.LOG_RATE_LIMIT,
+    rate_interval=aenea.config.LOG_RATE_INTERVAL)
+atexit.register(_logger.flush)
+
+log = _logger.log
+debug = _logger.debug
+info = _logger.info
+warning = _logger.warning
+error = _logger.error
+flush = _logger.flush
@@ -20,6 +20,7 @@
 
 import aenea.communications
 import aenea.config
+import aenea.log
 import aenea.proxy_contexts
 
 try:
@@ -31,7 +32,7 @@ except ImportError:
 class _Warn(dragonfly.ActionBase):
     def execute(self, data=None):
         pf = aenea.proxy_contexts._server_info().get('platform', None)
-        print 'Warning: grammar can\'t handle server platform %s' % pf
+        aenea.log.warning('Warning: grammar can\'t handle server platform %s', pf)
         return False
 
 
@@ -163,8 +164,29 @@ class ProxyNotification(ProxyBase, dragonfly.DynStrActionBase):
 # Mouse
 
 
+def _mouse_path(commands):
+    '''Turns the move_mouse and click_mouse commands of a mouse spec into
+       the waypoints of the server's mouse_path RPC. A click joins the
+       waypoint moved to before it.'''
+    points = []
+    for method, _, optional in commands:
+        if method == 'move_mouse' or not points or 'button' in points[-1]:
+            points.append({})
+        points[-1].update(optional)
+    return points
+
+
 class ProxyMouse(ProxyBase, dragonfly.DynStrActionBase):
     def _parse_spec(self, spec):
+        commands = self._parse_commands(spec)
+        # several moves (or moves and clicks) are executed by the server in
+        # one go.
+        if (aenea.config.MOUSE_PATH and len(commands) > 1 and
+                any(method == 'move_mouse' for (method, _, _) in commands)):
+            return [('mouse_path', (), {'points': _mouse_path(commands)})]
+        return commands
+
+    def _parse_commands(self, spec):
         proxy = aenea.communications.BatchProxy()
         list_parser = _make_mouse_parser()
         for item in list_parser.parseString(spec):
@@ -224,13 +246,31 @@ class ProxyMousePhantomClick(ProxyMouse):
        '''
 
     def _parse_spec(self, spec):
-        commands = ProxyMouse._parse_spec(self, spec)
+        commands = self._parse_commands(spec)
         move, click = commands
         move[2]['phantom'] = click[2]['button']
         return [move]
 
 
 
+###############################################################################
+# Macro
+
+
+class ProxyMacro(ProxyBase, dragonfly.ActionBase):
+    '''Executes a fixed list of commands, as the other proxy actions build
+       them, as a macro registered with the server: after the first time
+       only a short id is sent. Used for the actions of vocabularies.'''
+
+    def __init__(self, commands):
+        self._commands = commands
+        self._macro_id = aenea.communications.macro_id(commands)
+        dragonfly.ActionBase.__init__(self)
+
+    def _execute(self, data=None):
+        aenea.communications.server.execute_macro(self._macro_id,
+                                                  self._commands)
+
 ###############################################################################
 # BringApp
 
@@ -250,5 +290,6 @@ __all__ = [
     'ProxyPasteText',
     'ProxyMouse',
     'ProxyMousePhantomClick',
+    'ProxyMacro',
     'ProxyBringApp'
     ]
@@ -22,6 +22,7 @@ import time
 
 import aenea.communications
 import aenea.config
+import aenea.log
 
 try:
     import dragonfly
@@ -49,7 +50,7 @@ _last_context_time = 0
 class _Warn(dragonfly.Context):
     def matches(self, windows_executable, windows_title, windows_handle):
         pf = _server_info().get('platform', None)
-        print 'Warning: grammar can\'t handle server platform %s' % pf
+        aenea.log.warning('Warning: grammar can\'t handle server platform %s', pf)
         return False
 
 
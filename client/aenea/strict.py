@@ -30,11 +30,28 @@ import aenea.proxy_actions
 
 from aenea.wrappers import *
 
+# Constructing the proxy and local actions validates (parses) the spec for
+# both platforms. Grammars repeat the same specs a lot and the wrappers never
+# modify these actions, so they are shared per spec.
+_validated = {}
+
+
+def _validate(cls, *a, **kw):
+    key = (cls, a, tuple(sorted(kw.iteritems())))
+    try:
+        return _validated[key]
+    except KeyError:
+        action = _validated[key] = cls(*a, **kw)
+        return action
+    except TypeError:
+        # unhashable arguments.
+        return cls(*a, **kw)
+
 
 class Key(AeneaDynStrActionBase):
     def __init__(self, spec, **kwargs):
-        proxy = aenea.proxy_actions.ProxyKey(spec)
-        local = dragonfly.Key(spec, **kwargs)
+        proxy = _validate(aenea.proxy_actions.ProxyKey, spec)
+        local = _validate(dragonfly.Key, spec, **kwargs)
         AeneaDynStrActionBase.__init__(
             self,
             proxy,
@@ -51,8 +68,8 @@ class Text(AeneaDynStrActionBase):
         elif len(a) == 1:
             kw['spec'] = a[0]
         a = []
-        proxy = aenea.proxy_actions.ProxyText(*a, **kw)
-        local = dragonfly.Text(*a, **kw)
+        proxy = _validate(aenea.proxy_actions.ProxyText, *a, **kw)
+        local = _validate(dragonfly.Text, *a, **kw)
         AeneaDynStrActionBase.__init__(
             self,
             proxy,
@@ -68,8 +85,8 @@ class Mouse(AeneaDynStrActionBase):
         elif len(a) == 1:
             kw['spec'] = a[0]
         a = []
-        proxy = aenea.proxy_actions.ProxyMouse(*a, **kw)
-        local = dragonfly.Mouse(*a, **kw)
+        proxy = _validate(aenea.proxy_actions.ProxyMouse, *a, **kw)
+        local = _validate(dragonfly.Mouse, *a, **kw)
         AeneaDynStrActionBase.__init__(
             self,
             proxy,
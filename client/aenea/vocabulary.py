@@ -40,9 +40,10 @@ Alternative opt: only update _lists when win title/exe changes
 '''
 
 from dragonfly import Key, Text, Pause, Mimic
-from wrappers import NoAction
+from wrappers import AeneaAction, NoAction
 
 from aenea.proxy_actions import ProxyMousePhantomClick as MousePhantomClick
+from aenea.proxy_actions import ProxyKey, ProxyMacro
 
 try:
     import dragonfly
@@ -81,6 +82,7 @@ except ImportError:
 
 import aenea.config
 import aenea.configuration
+import aenea.log
 
 _vocabulary = {'static': {}, 'dynamic': {}}
 
@@ -147,6 +149,7 @@ def refresh_vocabulary(force_reload=False):
     vocabularies_have_changed = any(w.refresh() for w in _watchers.itervalues())
 
     if force_reload or vocabularies_have_changed:
+        reloaded = 0
         for vocabulary in 'static', 'dynamic':
             for kind in _vocabulary[vocabulary].itervalues():
                 del kind[:]
@@ -157,7 +160,8 @@ def refresh_vocabulary(force_reload=False):
                 if isinstance(vox, dict):
                     vox = [vox]
                 for v in vox:
-                    print('reloading vocabulary %s' % v['name'])
+                    aenea.log.debug('reloading vocabulary %s', v['name'])
+                    reloaded += 1
                     _update_one_vocabulary(
                         vocabulary,
                         v['name'],
@@ -166,6 +170,7 @@ def refresh_vocabulary(force_reload=False):
                         v.get('shortcuts', {})
                         )
             _rebuild_lists('static')
+        aenea.log.info('reloaded %i vocabularies', reloaded)
 
     _load_enabled_from_disk()
 
@@ -389,15 +394,51 @@ def _build_action(action):
     return actions[str(action['type'])](*map(str, action['args']))
 
 
+def _macro_commands(command):
+    '''Returns the server commands that a list of custom dynamic grammar
+       actions executes, or None if it has actions that cannot be executed
+       by the server (Mimic) or specs that depend on the recognition.'''
+    commands = []
+    for action in command:
+        kind = str(action['type'])
+        args = map(str, action['args'])
+        if any('%' in arg for arg in args):
+            return None
+        if kind == 'Key':
+            commands.extend(ProxyKey()._parse_spec(*args))
+        elif kind == 'Text':
+            commands.append(('write_text', (), {'text': args[0]}))
+        elif kind == 'Pause':
+            # in hundredths of a second, as for dragonfly's Pause.
+            commands.append(('pause', (), {'amount': float(args[0]) * 10}))
+        elif kind == 'MousePhantomClick':
+            commands.extend(MousePhantomClick()._parse_spec(*args))
+        elif kind != 'NoAction':
+            return None
+    return commands
+
+
 def _build_action_list(command):
     '''Processes a list of custom dynamic grammar actions into a single
-       dragonfly.ActionBase subclass.'''
+       dragonfly.ActionBase subclass. When the proxy is active the actions
+       are executed as a macro registered with the server, so that speaking
+       them sends only its id (see aenea.config.VOCABULARY_MACROS).'''
     if len(command) == 0:
         return NoAction()
     else:
         agg = _build_action(command[0])
         for action in command[1:]:
             agg = agg + _build_action(action)
+        if aenea.config.VOCABULARY_MACROS:
+            try:
+                commands = _macro_commands(command)
+            except Exception as e:
+                # e.g. a Key spec ProxyKey cannot parse.
+                aenea.log.warning('cannot execute %s as a macro: %s',
+                                  command, e)
+                commands = None
+            if commands:
+                return AeneaAction(ProxyMacro(commands), agg)
         return agg
 
 
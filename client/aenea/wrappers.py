@@ -81,8 +81,7 @@ try:
        Sequence,
        Text,
        Typeable,
-       WaitWindow,
-       Window
+       WaitWindow
        )
 except ImportError:
     from aenea.dragonfly_mock import (
@@ -143,8 +142,7 @@ except ImportError:
        Sequence,
        Text,
        Typeable,
-       WaitWindow,
-       Window
+       WaitWindow
        )
 
 
@@ -153,20 +151,57 @@ import aenea.communications
 import aenea.proxy_contexts
 
 
+def _foreground_window(data):
+    return aenea.config.get_window_foreground()
+
+
+def _proxy_active(data):
+    window = data['_context']
+    return aenea.config.proxy_active(
+        (window.executable, window.title, window.handle))
+
+
+def _server_info(data):
+    return aenea.proxy_contexts._server_info()
+
+
+def _proxy_context(data):
+    return aenea.proxy_contexts._get_context()
+
+
+class ExecutionContext(dict):
+    '''Execution data whose context fields (_proxy, _server_info,
+       _proxy_context and _context) are only looked up when first read. A
+       field that is looked up is also stored in the dict the context wraps,
+       which dragonfly passes to every action of a recognition, so it is
+       fetched at most once per recognition. Only indexing computes fields;
+       "in" and get() see the ones computed so far.'''
+    fields = {
+        '_proxy': _proxy_active,
+        '_server_info': _server_info,
+        '_proxy_context': _proxy_context,
+        '_context': _foreground_window
+        }
+
+    def __init__(self, data=None):
+        dict.__init__(self, data or {})
+        self._data = data
+
+    def __missing__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        value = self[key] = self.fields[key](self)
+        if self._data is not None:
+            self._data[key] = value
+        return value
+
+
 def ensure_execution_context(data):
-    '''Populates the data field of execute with context information if not
-      present.'''
-    if data is None:
-        data = {}
-    if '_proxy' not in data:
-        data['_proxy'] = aenea.config.proxy_active()
-    if '_server_info' not in data:
-        data['_server_info'] = aenea.proxy_contexts._server_info()
-    if '_proxy_context' not in data:
-        data['_proxy_context'] = aenea.proxy_contexts._get_context()
-    if '_context' not in data:
-        data['_context'] = Window.get_foreground()
-    return data
+    '''Wraps the data field of execute so that context information is
+       available (and computed on demand) if not present.'''
+    if isinstance(data, ExecutionContext):
+        return data
+    return ExecutionContext(data)
 
 
 class NoAction(ActionBase):
@@ -244,6 +279,9 @@ class AeneaAction(ActionBase):
 
 
 class AeneaDynStrActionBase(DynStrActionBase):
+    '''Parses the spec only with the action of the platform it is executed
+       on. Static specs were already parsed when the proxy and local actions
+       were constructed, so their events are reused.'''
     def __init__(self, proxy, local, spec=None, static=False):
         self._proxy = proxy
         self._local = local
@@ -259,15 +297,25 @@ class AeneaDynStrActionBase(DynStrActionBase):
         return self._data
 
     def _parse_spec(self, spec):
-        proxy = self._proxy._parse_spec(spec)
-        local = self._local._parse_spec(spec)
-        return (proxy, local)
+        # Which platform to parse for is only known at execution time.
+        return spec
 
-    def _execute_events(self, commands):
+    def _active_action(self):
         if self.get_data()['_proxy']:
-            return self._proxy._execute_events(commands[0])
+            return self._proxy
         else:
-            return self._local._execute_events(commands[1])
+            return self._local
+
+    def _execute_events(self, spec):
+        action = self._active_action()
+        return action._execute_events(_parse(action, spec))
+
+
+def _parse(action, spec):
+    '''Events of action for spec; parses only if action is dynamic.'''
+    if getattr(action, '_static', False):
+        return action._events
+    return action._parse_spec(spec)
 
 
 class ContextAction(ActionBase):
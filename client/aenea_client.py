@@ -14,11 +14,16 @@
 
 import Tkinter as tk
 import tkFont
+import Queue
 import datetime
+import functools
 import threading
+import time
 import ttk
 
 import aenea
+import aenea.capture_control
+import aenea.log
 
 # Keys that should be translated from a TK name to the name expected by
 # the server.
@@ -55,22 +60,72 @@ _config = aenea.configuration.ConfigWatcher(
     {'enabled': True})
 
 
+class CoalescingPolicy(object):
+    '''Nagle style coalescing for ProxyBuffer: after the first keystroke,
+       wait a little for more before sending them in one batch. The delay
+       follows the measured round trip time; there is little point in
+       sending faster than the server answers.'''
+    # weight of a new round trip time sample in the running average.
+    RTT_GAIN = 0.25
+
+    def __init__(self, min_delay=None, max_delay=None, rtt_factor=None,
+                 max_batch=None, max_in_flight=None):
+        def setting(value, default):
+            return default if value is None else value
+        self.min_delay = setting(min_delay, aenea.config.CAPTURE_MIN_DELAY)
+        self.max_delay = setting(max_delay, aenea.config.CAPTURE_MAX_DELAY)
+        self.rtt_factor = setting(rtt_factor, aenea.config.CAPTURE_RTT_FACTOR)
+        self.max_batch = setting(max_batch, aenea.config.CAPTURE_MAX_BATCH)
+        self.max_in_flight = max(1, setting(
+            max_in_flight, aenea.config.CAPTURE_MAX_IN_FLIGHT))
+        self.rtt = None
+
+    def observe(self, rtt):
+        if self.rtt is None:
+            self.rtt = rtt
+        else:
+            self.rtt += self.RTT_GAIN * (rtt - self.rtt)
+
+    def delay(self):
+        '''Seconds to wait for more keystrokes before sending.'''
+        if self.rtt is None:
+            return self.min_delay
+        return min(self.max_delay,
+                   max(self.min_delay, self.rtt * self.rtt_factor))
+
+
 class ProxyBuffer(object):
-    def __init__(self, log=lambda msg: None):
+    def __init__(self, log=lambda msg: None, policy=None, send=None):
         self.log = log
+        self.policy = policy or CoalescingPolicy()
+        if send is None:
+            if aenea.config.CAPTURE_CONNECTIONS > 0:
+                send = aenea.communications.PipelinedSender(
+                    aenea.config.CAPTURE_CONNECTIONS).send
+            else:
+                send = self._execute_batch
+        self.send = send
         self.text_buffer = []
         self.key_buffer = []
+        self.keystrokes = 0
         self.buffer_lock = threading.Lock()
         self.buffer_ready = threading.Condition(self.buffer_lock)
+        self.batch_done = threading.Condition(self.buffer_lock)
         self.to_send = aenea.communications.BatchProxy()
         self.aenea_worker_active = False
         self.sending = False
-        threading.Thread(target=self.worker_thread).start()
+        self.ready = []
+        self.in_flight = 0
+        self.batches = Queue.Queue()
+        for target in (self.worker_thread, self.sender_thread):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
 
     def start_capture(self):
         with self.buffer_lock:
-            while self.sending:
-                self.buffer_ready.wait()
+            while self.sending or self.in_flight:
+                self.batch_done.wait()
             aenea.ProxyKey('Control_R').execute()
 
     def send_key(self, key):
@@ -85,6 +140,9 @@ class ProxyBuffer(object):
                     self.key_buffer[-1] = (key, self.key_buffer[-1][1] + 1)
                 else:
                     self.key_buffer.append((key, 1))
+            self.keystrokes += 1
+            if self.keystrokes >= self.policy.max_batch:
+                self.cut_batch()
             self.buffer_ready.notify()
 
     # Requires buffer_lock
@@ -100,25 +158,73 @@ class ProxyBuffer(object):
                 self.to_send.key_press(key=key, count=count)
             self.key_buffer = []
 
+    # Requires buffer_lock
+    def cut_batch(self):
+        '''Moves everything buffered into a batch that is ready to send.'''
+        assert not self.text_buffer or not self.key_buffer
+        self.flush_text_buffer()
+        self.flush_key_buffer()
+        todo, self.to_send = self.to_send, aenea.communications.BatchProxy()
+        self.keystrokes = 0
+        if todo._commands:
+            self.ready.append(todo._commands)
+
     def worker_thread(self):
         while 1:
             with self.buffer_lock:
 
                 # Wait until we have something to send.
-                while not (self.text_buffer or self.key_buffer or self.to_send._commands):
+                while not (self.ready or self.text_buffer or self.key_buffer or
+                           self.to_send._commands):
                     assert not self.text_buffer or not self.key_buffer
                     self.sending = False
+                    self.batch_done.notify_all()
                     self.buffer_ready.wait()
                     self.sending = True
 
-                assert not self.text_buffer or not self.key_buffer
-                self.flush_text_buffer()
-                self.flush_key_buffer()
-
-                todo, self.to_send = self.to_send, aenea.communications.BatchProxy()
+                # Give the keystrokes that follow a chance to join the batch,
+                # unless it is full already.
+                deadline = time.time() + self.policy.delay()
+                while not self.ready:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.buffer_ready.wait(remaining)
+
+                # Keep buffering while too many batches are outstanding.
+                while self.in_flight >= self.policy.max_in_flight:
+                    self.batch_done.wait()
+
+                if not self.ready:
+                    self.cut_batch()
+                if self.ready:
+                    self.in_flight += 1
+                    self.batches.put(self.ready.pop(0))
+
+    def sender_thread(self):
+        # A single sender delivers the batches in the order they were cut.
+        while 1:
+            commands = self.batches.get()
+            try:
+                self.send(commands,
+                          functools.partial(self.replied, time.time()))
+            except Exception as e:
+                # Keep delivering later batches.
+                aenea.log.error('Failed to send keystrokes: %s', e)
+            finally:
+                with self.buffer_lock:
+                    self.in_flight -= 1
+                    self.batch_done.notify_all()
+
+    def replied(self, start):
+        '''Called (from any thread) once the server answered the batch sent
+           at start.'''
+        with self.buffer_lock:
+            self.policy.observe(time.time() - start)
 
-            if todo._commands:
-                aenea.communications.server.execute_batch(todo._commands)
+    def _execute_batch(self, commands, replied):
+        aenea.communications.server.execute_batch(commands)
+        replied()
 
 class AltKeySequenceState(object):
     NO_SEQUENCE = 0
@@ -206,6 +312,10 @@ class AeneaClient(tk.Tk):
         note.pack(side=tk.LEFT, fill=tk.BOTH, expand=tk.YES)
 
         self.proxy_buffer = ProxyBuffer(log=self.log)
+        # The state file is only read at startup; changes are pushed by
+        # _capture_client_control.py.
+        self.capture_control = aenea.capture_control.CaptureControlListener(
+            _config.conf.get('enabled', True))
 
     def log(self, message):
         timeStamp = datetime.datetime.now()
@@ -230,8 +340,7 @@ class AeneaClient(tk.Tk):
         pass
 
     def send_key(self, char, key):
-        _config.refresh()
-        if not _config.conf.get('enabled', True):
+        if not self.capture_control.enabled:
             return
 
         if key == 'Alt_L':
@@ -0,0 +1,117 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Client side cost of executing the Key/Text/Mouse wrappers, without any
+   network: commands are collected by a BatchProxy instead of being sent.
+   For every dynamic spec it measures executing the action, which parses
+   the spec for the active platform only, against parsing it for both
+   platforms the way the wrappers used to. Results are printed as JSON.
+
+   Run from the client directory:
+     python benchmark_actions.py --iterations 2000'''
+
+import argparse
+import json
+import time
+
+import aenea.communications
+import aenea.config
+import aenea.lax
+import aenea.strict
+
+SPECS = [
+    ('key', aenea.strict.Key, '%(key)s', {'key': 'c-a, s-b, enter:3'}),
+    ('text', aenea.strict.Text, '%(text)s',
+     {'text': 'the quick brown fox jumps over the lazy dog'}),
+    ('mouse', aenea.strict.Mouse, '%(where)s, left',
+     {'where': '[0.25, 0.75]'}),
+    ('lax_key', aenea.lax.Key, '%(key)s', {'key': 'c-a, s-b, enter:3'}),
+]
+
+
+def execution_data(proxy, extras):
+    data = dict(extras)
+    data.update(_proxy=proxy, _server_info={}, _proxy_context={},
+                _context=None)
+    return data
+
+
+def per_action(call, iterations):
+    start = time.time()
+    for _ in xrange(iterations):
+        call()
+    return (time.time() - start) / iterations * 1e6
+
+
+def bench_spec(factory, spec, extras, iterations):
+    action = factory(spec)
+    data = execution_data(True, extras)
+    expanded = spec % extras
+
+    def execute():
+        action.execute(data)
+
+    def parse_both():
+        action._proxy._parse_spec(expanded)
+        action._local._parse_spec(expanded)
+
+    def parse_proxy():
+        action._proxy._parse_spec(expanded)
+
+    results = {
+        'execute_us': per_action(execute, iterations),
+        'parse_both_us': per_action(parse_both, iterations),
+        'parse_proxy_us': per_action(parse_proxy, iterations)
+    }
+    results['saved_per_action_us'] = (
+        results['parse_both_us'] - results['parse_proxy_us'])
+    return results
+
+
+def bench_construction(iterations):
+    '''Strict construction of one spec repeated, as in large grammars.'''
+    def construct():
+        aenea.strict.Key('cs-home')
+        aenea.strict.Text('hello world')
+    return {'construct_us': per_action(construct, iterations)}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Aenea client action execution benchmark')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--output', help='Write JSON results here.')
+    arguments = parser.parse_args()
+
+    previous = aenea.communications.server
+    aenea.communications.server = aenea.communications.BatchProxy()
+    try:
+        document = dict(
+            (name, bench_spec(factory, spec, extras, arguments.iterations))
+            for (name, factory, spec, extras) in SPECS)
+        document['strict_construction'] = bench_construction(
+            arguments.iterations)
+    finally:
+        aenea.communications.server = previous
+
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if arguments.output is None:
+        print text
+    else:
+        with open(arguments.output, 'w') as fd:
+            fd.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Keystroke storm benchmark for the dictation capture client. Feeds
+   synthetic keystrokes into aenea_client.ProxyBuffer at a fixed rate, as
+   Dragon does when it types into the capture window, and delivers them to
+   an in-process null server (see benchmark_proxy.py) through a relay that
+   adds network delay. Compares the coalescing policy from aenea.json with
+   sending every batch as soon as possible, and reports characters per
+   second and per keystroke latency as JSON.
+
+   Run from the client directory with the server directory of the aenea
+   checkout importable, e.g.:
+     python benchmark_capture.py --delay 0 --delay 5 --rate 1000'''
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+import aenea.communications
+import aenea.config
+
+from aenea_client import CoalescingPolicy, ProxyBuffer
+from benchmark_proxy import LocalServer, LossyRelay, summarize
+
+TEXT = 'the quick brown fox jumps over the lazy dog. '
+
+POLICIES = {
+    'immediate': dict(min_delay=0, max_delay=0, max_in_flight=1),
+    'coalescing': dict()
+}
+
+
+def keystrokes(commands):
+    count = 0
+    for (method, args, kwargs) in commands:
+        if method == 'write_text':
+            count += len(kwargs.get('text', args and args[0]))
+        else:
+            count += kwargs.get('count', 1)
+    return count
+
+
+class Storm(object):
+    '''Keystrokes sent and when each of them was delivered.'''
+    def __init__(self, count, rate):
+        self.count = count
+        self.rate = rate
+        self.pressed = []
+        self.delivered = []
+        self.batches = 0
+        self.done = threading.Event()
+        self._proxy = aenea.communications.Proxy()
+
+    def send(self, commands, replied):
+        self._proxy._execute_batch(commands, aenea.config.USE_MULTIPLE_ACTIONS)
+        replied()
+        now = time.time()
+        self.batches += 1
+        self.delivered.extend([now] * keystrokes(commands))
+        if len(self.delivered) >= self.count:
+            self.done.set()
+
+    def run(self, policy):
+        buffer = ProxyBuffer(policy=policy, send=self.send)
+        start = time.time()
+        for index in xrange(self.count):
+            if self.rate:
+                # keep to the schedule even if send_key was slow.
+                wait = start + float(index) / self.rate - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+            char = TEXT[index % len(TEXT)]
+            self.pressed.append(time.time())
+            buffer.send_key(char)
+        self.done.wait(60)
+        latencies = [delivered - pressed for (pressed, delivered)
+                     in zip(self.pressed, self.delivered)]
+        elapsed = self.delivered[-1] - self.pressed[0]
+        return {
+            'keystrokes': self.count,
+            'keystrokes_delivered': len(self.delivered),
+            'batches': self.batches,
+            'chars_per_second': len(self.delivered) / elapsed,
+            'latency': summarize(latencies),
+            'final_delay': policy.delay()
+        }
+
+
+def run(delay, count, rate):
+    server = LocalServer()
+    relay = LossyRelay(server.address, delay=delay)
+    previous = (aenea.communications._server_config.conf['host'],
+                aenea.communications._server_config.conf['port'])
+    aenea.communications.set_server_address(relay.address)
+    try:
+        results = {'delay': delay}
+        for name, settings in sorted(POLICIES.items()):
+            results[name] = Storm(count, rate).run(
+                CoalescingPolicy(**settings))
+    finally:
+        aenea.communications.set_server_address(previous)
+        relay.stop()
+        server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Aenea capture client keystroke storm benchmark')
+    parser.add_argument('--count', type=int, default=2000,
+                        help='Keystrokes per run.')
+    parser.add_argument('--rate', type=float, default=1000,
+                        help='Keystrokes per second, 0 for no limit.')
+    parser.add_argument(
+        '--delay', type=float, action='append', dest='delays',
+        help='Simulated one way network delay in milliseconds.')
+    parser.add_argument('--output', help='Write JSON results here.')
+    arguments = parser.parse_args()
+
+    # Proxy prints connection errors; keep them out of the JSON on stdout.
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        runs = [run(delay / 1000., arguments.count, arguments.rate)
+                for delay in (arguments.delays or (0,))]
+    finally:
+        sys.stdout = stdout
+    document = {
+        'rate': arguments.rate,
+        'min_delay': aenea.config.CAPTURE_MIN_DELAY,
+        'max_delay': aenea.config.CAPTURE_MAX_DELAY,
+        'rtt_factor': aenea.config.CAPTURE_RTT_FACTOR,
+        'max_batch': aenea.config.CAPTURE_MAX_BATCH,
+        'max_in_flight': aenea.config.CAPTURE_MAX_IN_FLIGHT,
+        'runs': runs
+    }
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if arguments.output is None:
+        print text
+    else:
+        with open(arguments.output, 'w') as fd:
+            fd.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Latency benchmark for sending dictation batches with execute_batch
+   (acknowledged once executed) against PipelinedSender (enqueue_actions,
+   acknowledged once queued, over one or more connections). The stub server
+   is an in-process AeneaServer whose platform takes char_delay seconds per
+   character typed, like xdotool with XDOTOOL_DELAY, and every few batches
+   are long texts. Reports how long the sender was blocked and how long
+   each batch took from being sent to being typed, as JSON.
+
+   Run from the client directory with the server directory of the aenea
+   checkout importable, e.g.:
+     python benchmark_pipeline.py --delay 0 --delay 5'''
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+import aenea.communications
+import aenea.config
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from benchmark_proxy import LossyRelay, summarize
+from server.core import AeneaServer
+from server.null import NullPlatformRpcs
+
+
+class TypingPlatform(NullPlatformRpcs):
+    '''Null platform that types slowly and records when each text was done.'''
+    def __init__(self, char_delay):
+        super(TypingPlatform, self).__init__()
+        self.char_delay = char_delay
+        self.typed = {}
+
+    def write_text(self, text, paste=False):
+        time.sleep(len(text) * self.char_delay)
+        index = int(text.split(':', 1)[0])
+        self.typed[index] = time.time()
+
+
+class StubServer(object):
+    def __init__(self, char_delay):
+        self.platform = TypingPlatform(char_delay)
+        self.rpc_server = SimpleJSONRPCServer(
+            ('127.0.0.1', 0), logRequests=False)
+        self.server = AeneaServer(self.platform, self.rpc_server)
+        self.address = self.rpc_server.server_address
+        thread = threading.Thread(target=self.rpc_server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.rpc_server.shutdown()
+        self.rpc_server.server_close()
+
+
+def make_batches(count, long_every, long_length):
+    batches = []
+    for index in xrange(count):
+        length = long_length if index % long_every == long_every - 1 else 4
+        text = '%i:%s' % (index, 'x' * length)
+        batches.append([('write_text', (), {'text': text})])
+    return batches
+
+
+def bench(send, platform, batches, interval):
+    platform.typed.clear()
+    sent = []
+    blocked = []
+    start = time.time()
+    for index, batch in enumerate(batches):
+        wait = start + index * interval - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        before = time.time()
+        sent.append(before)
+        send(batch)
+        blocked.append(time.time() - before)
+
+    deadline = time.time() + 60
+    while len(platform.typed) < len(batches) and time.time() < deadline:
+        time.sleep(0.005)
+    latencies = [platform.typed[index] - sent[index]
+                 for index in xrange(len(batches)) if index in platform.typed]
+    return {
+        'batches_typed': len(platform.typed),
+        'sender_blocked': summarize(blocked),
+        'send_to_typed': summarize(latencies),
+        'elapsed': max(platform.typed.values()) - start
+    }
+
+
+def run(delay, arguments):
+    stub = StubServer(arguments.char_delay)
+    relay = LossyRelay(stub.address, delay=delay)
+    previous = (aenea.communications._server_config.conf['host'],
+                aenea.communications._server_config.conf['port'])
+    aenea.communications.set_server_address(relay.address)
+    batches = make_batches(arguments.batches, arguments.long_every,
+                           arguments.long_length)
+    try:
+        results = {
+            'delay': delay,
+            'execute_batch': bench(aenea.communications.server.execute_batch,
+                                   stub.platform, batches, arguments.interval)
+        }
+        for connections in arguments.connections or (1, 2):
+            sender = aenea.communications.PipelinedSender(connections)
+            results['pipelined_%i' % connections] = bench(
+                sender.send, stub.platform, batches, arguments.interval)
+    finally:
+        aenea.communications.set_server_address(previous)
+        relay.stop()
+        stub.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Aenea pipelined sender latency benchmark')
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.005,
+                        help='Seconds between batches.')
+    parser.add_argument('--char-delay', type=float, default=0.0002,
+                        help='Seconds the stub server takes per character.')
+    parser.add_argument('--long-every', type=int, default=10,
+                        help='Every Nth batch is a long text.')
+    parser.add_argument('--long-length', type=int, default=200)
+    parser.add_argument(
+        '--connections', type=int, action='append',
+        help='Connections of the pipelined sender (default 1 and 2).')
+    parser.add_argument(
+        '--delay', type=float, action='append', dest='delays',
+        help='Simulated one way network delay in milliseconds.')
+    parser.add_argument('--output', help='Write JSON results here.')
+    arguments = parser.parse_args()
+
+    # Proxy prints connection errors; keep them out of the JSON on stdout.
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        runs = [run(delay / 1000., arguments)
+                for delay in (arguments.delays or (0,))]
+    finally:
+        sys.stdout = stdout
+    document = {
+        'use_multiple_actions': aenea.config.USE_MULTIPLE_ACTIONS,
+        'interval': arguments.interval,
+        'char_delay': arguments.char_delay,
+        'runs': runs
+    }
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if arguments.output is None:
+        print text
+    else:
+        with open(arguments.output, 'w') as fd:
+            fd.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''End to end client -> server latency benchmark. Starts an in-process
+   AeneaServer with the null platform (so no Dragon, VM or X server is
+   needed) and drives it through aenea.communications.Proxy and BatchProxy,
+   optionally through a local relay that adds network delay and drops
+   connections. Results are printed as JSON.
+
+   Run from the client directory with the server directory of the aenea
+   checkout importable, e.g.:
+     python benchmark_proxy.py --delay 0 --delay 5 --loss 0.05'''
+
+import argparse
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from os.path import join, dirname, realpath
+
+# the stand-in server lives in the server directory of the aenea checkout.
+sys.path.append(realpath(join(dirname(__file__), '..')))
+
+import aenea.communications
+import aenea.config
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server.core import AeneaServer
+from server.null import NullPlatformRpcs
+
+
+class LocalServer(object):
+    '''AeneaServer with a recording null platform served from a thread.'''
+    def __init__(self):
+        self.platform = NullPlatformRpcs(record=True)
+        self.rpc_server = SimpleJSONRPCServer(
+            ('127.0.0.1', 0), logRequests=False)
+        self.server = AeneaServer(self.platform, self.rpc_server)
+        self.address = self.rpc_server.server_address
+        self._thread = threading.Thread(target=self.rpc_server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.rpc_server.shutdown()
+        self.rpc_server.server_close()
+
+
+class LossyRelay(object):
+    '''TCP relay that delays every chunk it forwards by delay seconds and
+       resets a fraction loss of the connections it accepts.'''
+    def __init__(self, target, delay=0, loss=0, seed=0):
+        self.target = target
+        self.delay = delay
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.dropped = 0
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(16)
+        self.address = self._listener.getsockname()
+        self._running = True
+        thread = threading.Thread(target=self._accept_loop)
+        thread.daemon = True
+        thread.start()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                client, _ = self._listener.accept()
+            except socket.error:
+                return
+            if self.random.random() < self.loss:
+                self.dropped += 1
+                client.close()
+                continue
+            upstream = socket.create_connection(self.target)
+            for source, sink in ((client, upstream), (upstream, client)):
+                thread = threading.Thread(target=self._pump,
+                                          args=(source, sink))
+                thread.daemon = True
+                thread.start()
+
+    def _pump(self, source, sink):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                if self.delay:
+                    time.sleep(self.delay)
+                sink.sendall(data)
+        except socket.error:
+            pass
+        finally:
+            for sock in (source, sink):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+    def stop(self):
+        self._running = False
+        self._listener.close()
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    total = sum(durations)
+
+    def percentile(fraction):
+        return durations[min(len(durations) - 1,
+                             int(fraction * len(durations)))]
+
+    return {
+        'iterations': len(durations),
+        'mean': total / len(durations),
+        'median': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'max': durations[-1]
+    }
+
+
+def make_batch(size):
+    batch = aenea.communications.BatchProxy()
+    for index in xrange(size):
+        if index % 2:
+            batch.write_text(text='hello')
+        else:
+            batch.key_press(key='a', modifiers=['control'])
+    return batch._commands
+
+
+def bench_round_trip(proxy, iterations):
+    '''Single RPCs, which bypass batching entirely.'''
+    results = {}
+    for name, call in (
+            ('server_info', lambda: proxy.server_info()),
+            ('get_context', lambda: proxy.get_context()),
+            ('key_press', lambda: proxy.key_press(key='a'))):
+        durations = []
+        for _ in xrange(iterations):
+            start = time.time()
+            call()
+            durations.append(time.time() - start)
+        results[name] = summarize(durations)
+    return results
+
+
+def bench_batches(proxy, platform, iterations, sizes):
+    '''Batches sent with and without multiple_actions.'''
+    results = {}
+    for use_multiple_actions in (True, False):
+        for size in sizes:
+            batch = make_batch(size)
+            del platform.calls[:]
+            durations = []
+            for _ in xrange(iterations):
+                start = time.time()
+                proxy._execute_batch(batch, use_multiple_actions)
+                durations.append(time.time() - start)
+            stats = summarize(durations)
+            stats['actions_per_second'] = (
+                size * iterations / sum(durations))
+            stats['actions_sent'] = size * iterations
+            stats['actions_delivered'] = len(platform.calls)
+            name = 'batch_%i_%s' % (
+                size, 'multiple_actions' if use_multiple_actions else 'serial')
+            results[name] = stats
+    return results
+
+
+def run(delay, loss, iterations, sizes):
+    server = LocalServer()
+    relay = LossyRelay(server.address, delay=delay, loss=loss)
+    proxy = aenea.communications.Proxy()
+    # _refresh_server re-reads the address on every call, so route it to
+    # the relay and restore the user's configured server afterwards.
+    previous = (aenea.communications._server_config.conf['host'],
+                aenea.communications._server_config.conf['port'])
+    aenea.communications.set_server_address(relay.address)
+    try:
+        results = {
+            'delay': delay,
+            'loss': loss,
+            'round_trip': bench_round_trip(proxy, iterations),
+            'batches': bench_batches(
+                proxy, server.platform, iterations, sizes),
+            'connections_dropped': relay.dropped
+        }
+    finally:
+        aenea.communications.set_server_address(previous)
+        relay.stop()
+        server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Aenea client -> server latency benchmark')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument(
+        '--batch-size', type=int, action='append', dest='sizes',
+        help='Batch sizes to measure (default 1, 10, 50).')
+    parser.add_argument(
+        '--delay', type=float, action='append', dest='delays',
+        help='Simulated one way network delay in milliseconds.')
+    parser.add_argument(
+        '--loss', type=float, default=0,
+        help='Fraction of connections the relay resets.')
+    parser.add_argument('--output', help='Write JSON results here.')
+    arguments = parser.parse_args()
+
+    # Proxy prints connection errors; keep them out of the JSON on stdout.
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        runs = [run(delay / 1000., arguments.loss, arguments.iterations,
+                    arguments.sizes or (1, 10, 50))
+                for delay in (arguments.delays or (0,))]
+    finally:
+        sys.stdout = stdout
+    document = {
+        'use_multiple_actions': aenea.config.USE_MULTIPLE_ACTIONS,
+        'connect_retry_cooldown': aenea.config.CONNECT_RETRY_COOLDOWN,
+        'runs': runs
+    }
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if arguments.output is None:
+        print text
+    else:
+        with open(arguments.output, 'w') as fd:
+            fd.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
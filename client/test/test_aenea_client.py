@@ -0,0 +1,86 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+
+from aenea_client import CoalescingPolicy, ProxyBuffer
+
+
+class TestCoalescingPolicy(unittest.TestCase):
+    def test_delay_follows_rtt(self):
+        policy = CoalescingPolicy(min_delay=0.002, max_delay=0.02,
+                                  rtt_factor=0.5)
+        self.assertEqual(policy.delay(), 0.002)
+        policy.observe(0.01)
+        self.assertEqual(policy.delay(), 0.005)
+        policy.observe(0.09)
+        self.assertEqual(policy.rtt, 0.03)
+        self.assertEqual(policy.delay(), 0.015)
+        policy.observe(1)
+        self.assertEqual(policy.delay(), 0.02)
+
+
+class TestProxyBuffer(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.delivered = threading.Condition()
+
+    def send(self, commands, replied):
+        self.release.wait(5)
+        with self.delivered:
+            self.batches.append(commands)
+            self.delivered.notify()
+
+    def wait_for(self, count):
+        with self.delivered:
+            while len(self.batches) < count:
+                self.delivered.wait(5)
+
+    def test_coalesces_in_order(self):
+        policy = CoalescingPolicy(min_delay=0.5, max_delay=0.5, max_batch=4,
+                                  max_in_flight=1)
+        buffer = ProxyBuffer(policy=policy, send=self.send)
+        for key in 'abcd':
+            buffer.send_key(key)
+        # the first batch is in flight; these wait behind it.
+        for key in ['Return', 'Return', 'e']:
+            buffer.send_key(key)
+        self.release.set()
+        self.wait_for(2)
+        self.assertEqual(self.batches, [
+            [('write_text', ('abcd',), {})],
+            [('key_press', (), {'key': 'Return', 'count': 2}),
+             ('write_text', ('e',), {})]])
+
+    def test_observes_round_trip(self):
+        # the batch is handed over at once, the server answers later.
+        answers = []
+        policy = CoalescingPolicy(min_delay=0.001, max_delay=0.001)
+        buffer = ProxyBuffer(
+            policy=policy,
+            send=lambda commands, replied: answers.append(replied))
+        buffer.send_key('a')
+        with buffer.buffer_lock:
+            while buffer.in_flight or not answers:
+                buffer.batch_done.wait(5)
+        self.assertEqual(policy.rtt, None)
+        time.sleep(0.05)
+        answers[0]()
+        self.assertTrue(policy.rtt >= 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import unittest
+
+from aenea.capture_control import CaptureControlListener, send_capture_state
+
+
+class TestCaptureControl(unittest.TestCase):
+    def wait_for(self, listener, enabled):
+        deadline = time.time() + 5
+        while listener.enabled != enabled and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(listener.enabled, enabled)
+
+    def test_push(self):
+        listener = CaptureControlListener(True, ('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+        send_capture_state(False, listener.address)
+        self.wait_for(listener, False)
+        send_capture_state(True, listener.address)
+        self.wait_for(listener, True)
+
+    def test_address_in_use(self):
+        listener = CaptureControlListener(True, ('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+        second = CaptureControlListener(False, listener.address)
+        self.addCleanup(second.close)
+        self.assertEqual(second.address, None)
+        self.assertFalse(second.enabled)
+        send_capture_state(True, listener.address)
+        self.wait_for(listener, True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import jsonrpclib
+import threading
+import unittest
+import mock
+
+import aenea.communications
+from aenea.proxy_actions import ProxyKey, ProxyText
+
+
+class TestBatching(unittest.TestCase):
+    def setUp(self):
+        self.proxy = aenea.communications.Proxy()
+        self.proxy._execute_batch = mock.Mock(return_value=None)
+
+    def test_unbatched(self):
+        self.proxy.key_press(key='a')
+        self.proxy.write_text(text='b')
+        self.assertEqual(self.proxy._execute_batch.call_count, 2)
+        self.proxy._execute_batch.assert_called_with(
+            [('write_text', (), {'text': 'b'})])
+
+    def test_batched(self):
+        with self.proxy.batched():
+            self.proxy.execute_batch([('key_press', (), {'key': 'a'})])
+            self.proxy.write_text(text='b')
+            with self.proxy.batched():
+                self.proxy.pause(amount=5)
+            self.assertFalse(self.proxy._execute_batch.called)
+        self.proxy._execute_batch.assert_called_once_with(
+            [('key_press', (), {'key': 'a'}),
+             ('write_text', (), {'text': 'b'}),
+             ('pause', (), {'amount': 5})],
+            aenea.config.USE_MULTIPLE_ACTIONS)
+
+        # the scope is over.
+        self.proxy.write_text(text='c')
+        self.proxy._execute_batch.assert_called_with(
+            [('write_text', (), {'text': 'c'})])
+
+    def test_flush_before_query(self):
+        self.proxy._execute_batch.side_effect = [None, {'title': 't'}]
+        with self.proxy.batched():
+            self.proxy.key_press(key='a')
+            self.assertEqual(self.proxy.get_context(), {'title': 't'})
+        self.assertEqual(self.proxy._execute_batch.call_args_list, [
+            mock.call([('key_press', (), {'key': 'a'})],
+                      aenea.config.USE_MULTIPLE_ACTIONS),
+            mock.call([('get_context', (), {})])])
+
+    def test_batched_recognition(self):
+        with mock.patch('aenea.communications.server', self.proxy):
+            @aenea.communications.batched_recognition
+            def process_recognition():
+                ProxyKey('a').execute()
+                ProxyText('bc').execute()
+                ProxyKey('d').execute()
+            process_recognition()
+        self.proxy._execute_batch.assert_called_once_with(
+            [('key_press', (), {'key': 'a', 'count': 1, 'modifiers': []}),
+             ('write_text', (), {'text': 'bc'}),
+             ('key_press', (), {'key': 'd', 'count': 1, 'modifiers': []})],
+            aenea.config.USE_MULTIPLE_ACTIONS)
+
+
+    def test_macro(self):
+        self.proxy._refresh_server = mock.Mock()
+        self.proxy.last_connect_good = True
+        commands = [('key_press', (), {'key': 'a'})]
+        macro_id = aenea.communications.macro_id(commands)
+        with self.proxy.batched():
+            self.proxy.write_text(text='b')
+            self.proxy.execute_macro(macro_id, commands)
+            self.proxy.execute_macro(macro_id, commands)
+        self.assertEqual(self.proxy._execute_batch.call_args_list, [
+            mock.call([('write_text', (), {'text': 'b'})],
+                      aenea.config.USE_MULTIPLE_ACTIONS),
+            mock.call([('register_macro', (macro_id, commands), {})]),
+            mock.call([('invoke_macro', (), {'macro_id': macro_id})] * 2,
+                      aenea.config.USE_MULTIPLE_ACTIONS)])
+
+
+class ForgetfulServer(object):
+    '''Registers macros like the X11 server, and forgets them on restart().'''
+    def __init__(self):
+        self.macros = {}
+        self.calls = []
+
+    def restart(self):
+        self.macros = {}
+
+    def register_macro(self, macro_id, commands):
+        self.calls.append('register_macro')
+        self.macros[macro_id] = commands
+
+    def invoke_macro(self, macro_id):
+        self._check([macro_id])
+        self.calls.append('invoke_macro')
+
+    def multiple_actions(self, actions):
+        self._check([kw['macro_id'] for (method, a, kw) in actions
+                     if method == 'invoke_macro'])
+        self.calls.append('multiple_actions')
+
+    def _check(self, macro_ids):
+        for macro_id in macro_ids:
+            if macro_id not in self.macros:
+                raise jsonrpclib.ProtocolError(
+                    (-32603, 'Server error: <type \'exceptions.ValueError\'> '
+                     '| unknown macro "%s"' % macro_id))
+
+
+class TestMacroAfterRestart(unittest.TestCase):
+    def setUp(self):
+        self.proxy = aenea.communications.Proxy()
+        self.proxy._refresh_server = mock.Mock()
+        self.proxy._address = ('127.0.0.1', 8240)
+        self.proxy.last_connect_good = True
+        self.proxy._server = self.server = ForgetfulServer()
+        self.commands = [('key_press', (), {'key': 'a'})]
+        self.macro_id = aenea.communications.macro_id(self.commands)
+
+    def test_registered_again(self):
+        self.proxy.execute_macro(self.macro_id, self.commands)
+        self.server.restart()
+        self.proxy.execute_macro(self.macro_id, self.commands)
+        self.assertEqual(self.server.calls, [
+            'register_macro', 'invoke_macro', 'register_macro',
+            'invoke_macro'])
+
+    def test_registered_again_in_batch(self):
+        self.proxy.execute_macro(self.macro_id, self.commands)
+        self.server.restart()
+        with mock.patch('aenea.config.USE_MULTIPLE_ACTIONS', True):
+            with self.proxy.batched():
+                self.proxy.key_press(key='b')
+                self.proxy.execute_macro(self.macro_id, self.commands)
+        self.assertEqual(self.server.calls, [
+            'register_macro', 'invoke_macro', 'register_macro',
+            'multiple_actions'])
+
+    def test_other_errors_raised(self):
+        self.assertRaises(jsonrpclib.ProtocolError, self.proxy.invoke_macro,
+                          macro_id='unknown')
+
+
+class TestPipelinedSender(unittest.TestCase):
+    @mock.patch('aenea.communications.Proxy')
+    def test_numbers_batches(self, proxy):
+        calls = []
+        done = threading.Semaphore(0)
+
+        def enqueue_actions(**kw):
+            calls.append(kw)
+            done.release()
+        proxy.return_value.enqueue_actions.side_effect = enqueue_actions
+
+        sender = aenea.communications.PipelinedSender(connections=2)
+        for text in 'abc':
+            sender.send([('write_text', (), {'text': text})])
+        for _ in xrange(3):
+            done.acquire()
+        self.assertEqual(
+            sorted((call['sequence'], call['actions'][0][2]['text'])
+                   for call in calls),
+            [(0, 'a'), (1, 'b'), (2, 'c')])
+        self.assertEqual(set(call['stream'] for call in calls),
+                         set([sender.stream]))
+
+    @mock.patch('aenea.communications.server')
+    @mock.patch('aenea.communications.Proxy')
+    def test_falls_back_in_order(self, proxy, server):
+        proxy.return_value.enqueue_actions.side_effect = (
+            jsonrpclib.ProtocolError((-32601, 'Method not found')))
+        executed = []
+        server.execute_batch.side_effect = executed.append
+        replied = threading.Semaphore(0)
+
+        sender = aenea.communications.PipelinedSender(connections=3)
+        for text in 'abcdef':
+            sender.send([('write_text', (), {'text': text})], replied.release)
+        for _ in xrange(6):
+            replied.acquire()
+        self.assertFalse(sender.supported)
+        self.assertEqual([commands[0][2]['text'] for commands in executed],
+                         list('abcdef'))
+
+    @mock.patch('aenea.communications.Proxy')
+    def test_survives_errors(self, proxy):
+        proxy.return_value.enqueue_actions.side_effect = ValueError('bad')
+        replied = threading.Semaphore(0)
+        sender = aenea.communications.PipelinedSender(connections=1)
+        for text in 'ab':
+            sender.send([('write_text', (), {'text': text})], replied.release)
+        for _ in xrange(2):
+            replied.acquire()
+        self.assertEqual(proxy.return_value.enqueue_actions.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
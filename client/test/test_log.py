@@ -0,0 +1,82 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import StringIO
+import time
+import unittest
+
+import mock
+
+from aenea.log import DEBUG, INFO, WARNING, Logger
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        self.stream = StringIO.StringIO()
+
+    def logger(self, **kwargs):
+        kwargs.setdefault('flush_interval', 10)
+        return Logger(stream=self.stream, **kwargs)
+
+    def lines(self):
+        return self.stream.getvalue().splitlines()
+
+    def test_level(self):
+        logger = self.logger(level=INFO)
+        argument = mock.MagicMock()
+        logger.log(DEBUG, 'hidden %s', argument)
+        logger.info('shown %s', 1)
+        logger.flush()
+        self.assertEqual(self.lines(), ['shown 1'])
+        self.assertFalse(argument.__str__.called)
+
+    def test_buffered(self):
+        logger = self.logger()
+        logger.warning('one')
+        logger.warning('two %i', 2)
+        self.assertEqual(self.lines(), [])
+        logger.flush()
+        self.assertEqual(self.lines(), ['one', 'two 2'])
+
+    def test_background_writer(self):
+        logger = self.logger(flush_interval=0)
+        logger.info('written')
+        deadline = time.time() + 5
+        while not self.lines() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.lines(), ['written'])
+
+    def test_rate_limit(self):
+        logger = self.logger(rate_limit=2, rate_interval=60)
+        for index in range(10):
+            logger.warning('platform %s', index)
+        logger.warning('other')
+        logger.flush()
+        self.assertEqual(self.lines(), ['platform 0', 'platform 1', 'other'])
+
+        with mock.patch('time.time', return_value=time.time() + 61):
+            logger.warning('platform %s', 10)
+        logger.flush()
+        self.assertEqual(self.lines()[3:], [
+            '(suppressed 8 more like "platform %s")', 'platform 10'])
+
+    def test_no_rate_limit(self):
+        logger = self.logger(rate_limit=0, level=WARNING)
+        for index in range(10):
+            logger.error('error %s', index)
+        logger.flush()
+        self.assertEqual(len(self.lines()), 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -88,6 +88,10 @@ class TestActions(unittest.TestCase):
                                                ('move_mouse', (), {'x': 3.0, 'y': 5.0, 'proportional': False, 'reference': 'absolute'}),
                                                ('move_mouse', (), {'x': 3.0, 'y': 5.0, 'proportional': False, 'reference': 'absolute'})])
 
+        with mock.patch('aenea.config.MOUSE_PATH', True):
+            ProxyMouse(','.join(['[3 5]'] * 3)).execute()
+        comm.execute_batch.assert_called_with([('mouse_path', (), {'points': [{'x': 3.0, 'y': 5.0, 'proportional': False, 'reference': 'absolute'}] * 3})])
+
     @mock.patch('aenea.communications.server')
     def test_mouse_click(self, comm):
         ProxyMouse('left').execute()
@@ -107,6 +111,14 @@ class TestActions(unittest.TestCase):
         ProxyMouse('middle:up/5').execute()
         comm.execute_batch.assert_called_with([('click_mouse', (), {'button': 'middle', 'direction': 'up', 'count_delay': 0.05, 'count': 1})])
 
+        with mock.patch('aenea.config.MOUSE_PATH', True):
+            ProxyMouse('left:down, [10 20], left:up, right').execute()
+        comm.execute_batch.assert_called_with([('mouse_path', (), {'points': [
+            {'button': 'left', 'direction': 'down', 'count_delay': None, 'count': 1},
+            {'x': 10.0, 'y': 20.0, 'proportional': False, 'reference': 'absolute',
+             'button': 'left', 'direction': 'up', 'count_delay': None, 'count': 1},
+            {'button': 'right', 'direction': 'click', 'count_delay': None, 'count': 1}]})])
+
     @mock.patch('aenea.communications.server')
     def test_phantom_click(self, comm):
         ProxyMousePhantomClick('(78, 114), left').execute()
@@ -261,5 +261,36 @@ class TestMakeRefreshVocabulary(unittest.TestCase):
 
         aenea.vocabulary.unregister_dynamic_vocabulary('foo')
 
+
+@mock.patch('aenea.config.VOCABULARY_MACROS', True)
+class TestBuildActionList(unittest.TestCase):
+    def test_macro(self):
+        action = aenea.vocabulary._build_action_list([
+            {'type': 'Key', 'args': ['c-a']},
+            {'type': 'Text', 'args': ['hello']},
+            {'type': 'Pause', 'args': ['20']}])
+        self.assertEqual(action._proxy_action._commands, [
+            ('key_press', (), {'key': 'a', 'modifiers': ['control'],
+                               'count': 1}),
+            ('write_text', (), {'text': 'hello'}),
+            ('pause', (), {'amount': 200.0})])
+
+        with mock.patch('aenea.communications.server') as server:
+            action._proxy_action.execute()
+        server.execute_macro.assert_called_once_with(
+            action._proxy_action._macro_id, action._proxy_action._commands)
+
+    def test_not_a_macro(self):
+        for command in ([{'type': 'Mimic', 'args': ['hello']}],
+                        [{'type': 'Text', 'args': ['%(text)s']}]):
+            action = aenea.vocabulary._build_action_list(command)
+            self.assertFalse(hasattr(action, '_proxy_action'))
+
+    def test_disabled(self):
+        with mock.patch('aenea.config.VOCABULARY_MACROS', False):
+            action = aenea.vocabulary._build_action_list(
+                [{'type': 'Text', 'args': ['hello']}])
+        self.assertFalse(hasattr(action, '_proxy_action'))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import mock
+
+import aenea.lax
+import aenea.proxy_actions
+import aenea.strict
+import aenea.wrappers
+
+
+def _data(proxy, **kw):
+    kw.update(_proxy=proxy, _server_info={}, _proxy_context={}, _context=None)
+    return kw
+
+
+class TestDynStrActions(unittest.TestCase):
+    @mock.patch('aenea.communications.server')
+    def test_parses_active_platform_only(self, comm):
+        key = aenea.strict.Key('%(key)s')
+        with mock.patch.object(key._local, '_parse_spec') as local_parse:
+            key.execute(_data(True, key='b'))
+            self.assertFalse(local_parse.called)
+        comm.execute_batch.assert_called_with(
+            [('key_press', (), {'key': 'b', 'count': 1, 'modifiers': []})])
+
+        with mock.patch.object(key._proxy, '_parse_spec') as proxy_parse:
+            with mock.patch.object(key._local, '_execute_events') as local:
+                key.execute(_data(False, key='b'))
+            self.assertFalse(proxy_parse.called)
+            self.assertTrue(local.called)
+
+    @mock.patch('aenea.communications.server')
+    def test_static_spec_is_parsed_once(self, comm):
+        key = aenea.strict.Key('c-a')
+        with mock.patch.object(aenea.proxy_actions.ProxyKey,
+                               '_parse_spec') as proxy_parse:
+            key.execute(_data(True))
+            self.assertFalse(proxy_parse.called)
+        comm.execute_batch.assert_called_with(
+            [('key_press', (), {'key': 'a', 'count': 1,
+                                'modifiers': ['control']})])
+
+    def test_strict_validation_is_cached(self):
+        first, second = aenea.strict.Key('c-x'), aenea.strict.Key('c-x')
+        self.assertIs(first._proxy, second._proxy)
+        self.assertIs(first._local, second._local)
+        self.assertIsNot(first._proxy, aenea.strict.Key('c-y')._proxy)
+
+    @mock.patch('aenea.communications.server')
+    def test_lax_unsupported_spec(self, comm):
+        key = aenea.lax.Key('%(key)s')
+        with mock.patch.object(key._proxy, '_parse_spec',
+                               side_effect=ValueError):
+            key.execute(_data(True, key='b'))
+        self.assertFalse(comm.execute_batch.called)
+
+
+class TestExecutionContext(unittest.TestCase):
+    def setUp(self):
+        window = mock.Mock(executable='python', title='t', handle=1)
+        patches = [
+            mock.patch('aenea.config.get_window_foreground',
+                       return_value=window),
+            mock.patch('aenea.config.proxy_active', return_value=True),
+            mock.patch('aenea.proxy_contexts._server_info'),
+            mock.patch('aenea.proxy_contexts._get_context')]
+        (self.foreground, self.proxy_active, self.server_info,
+         self.get_context) = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    @mock.patch('aenea.communications.server')
+    def test_only_read_fields_are_fetched(self, comm):
+        data = {}
+        aenea.strict.Key('a').execute(data)
+        aenea.strict.Text('b').execute(data)
+        self.assertEqual(comm.execute_batch.call_count, 1)
+        self.assertEqual(comm.write_text.call_count, 1)
+
+        # the foreground window is looked up once for the recognition.
+        self.assertEqual(self.foreground.call_count, 1)
+        self.proxy_active.assert_called_once_with(('python', 't', 1))
+        self.assertFalse(self.server_info.called)
+        self.assertFalse(self.get_context.called)
+        self.assertIs(data['_proxy'], True)
+        self.assertNotIn('_proxy_context', data)
+
+    def test_fields(self):
+        context = aenea.wrappers.ensure_execution_context(None)
+        self.assertIs(aenea.wrappers.ensure_execution_context(context),
+                      context)
+        self.assertIs(context['_server_info'], self.server_info.return_value)
+        self.assertIs(context['_proxy_context'],
+                      self.get_context.return_value)
+        self.assertRaises(KeyError, lambda: context['unknown'])
+        self.assertFalse(self.foreground.called)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,427 @@
+import collections
+import contextlib
+import functools
+import logging
+import threading
+import time
+
+from server.metrics import AeneaMetrics
+
+
+class _Stream(object):
+    def __init__(self):
+        self.next_sequence = 0
+        self.held = {}
+        self.gap_since = None
+
+
+class BatchCancelled(Exception):
+    """
+    The batch was dropped by ActionQueue.cancel before it was done.
+    """
+
+
+class _Ticket(object):
+    """
+    Completion of a batch that somebody waits for, see ActionQueue.run.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+def pause_seconds(action):
+    """
+    :param action: (method, parameters, optional) triple.
+    :return: seconds action pauses for, 0 if it is not a pause.
+    :rtype: float
+    """
+    method, parameters, optional = action
+    if method != 'pause':
+        return 0
+    amount = parameters[0] if parameters else optional.get('amount', 0)
+    return max(amount, 0) / 1000.0
+
+
+def chunked(action, key_chunk=0, text_chunk=0):
+    """
+    Split long input into parts that can be cancelled in between.
+
+    :param action: (method, parameters, optional) triple.
+    :param int key_chunk: Split a key_press repeating its key more than
+     key_chunk times into presses of at most key_chunk repetitions.  0 never
+     splits.
+    :param int text_chunk: Split a write_text (unless pasted) longer than
+     text_chunk characters.  0 never splits.
+    :return: (action, seconds) pairs: the parts and how long to wait after
+     each of them.
+    :rtype: list
+    """
+    method, parameters, optional = action
+    if parameters:
+        return [(action, 0)]
+    if (method == 'key_press' and key_chunk and
+            optional.get('direction', 'press') == 'press'):
+        count = optional.get('count', 1)
+        if count > key_chunk:
+            delay = (optional.get('count_delay') or 0) / 1000.0
+            parts = []
+            while count > 0:
+                part = dict(optional, count=min(count, key_chunk))
+                parts.append((('key_press', [], part), delay))
+                count -= key_chunk
+            return parts
+    if (method == 'write_text' and text_chunk and
+            not optional.get('paste')):
+        text = optional.get('text', '')
+        if len(text) > text_chunk:
+            return [(('write_text', [],
+                      dict(optional, text=text[index:index + text_chunk])), 0)
+                    for index in xrange(0, len(text), text_chunk)]
+    return [(action, 0)]
+
+
+def timed_steps(actions, key_chunk=0, text_chunk=0):
+    """
+    Split a batch at its pauses, and between the parts of long input (see
+    chunked).
+
+    :param list actions: (method, parameters, optional) triples.
+    :param int key_chunk: See chunked.
+    :param int text_chunk: See chunked.
+    :return: (actions, seconds) pairs: the actions before a pause and how
+     long to wait after them.
+    :rtype: list
+    """
+    steps = []
+    step = []
+    for action in actions:
+        seconds = pause_seconds(action)
+        if seconds:
+            steps.append((step, seconds))
+            step = []
+            continue
+        parts = chunked(action, key_chunk, text_chunk)
+        for part, wait in parts[:-1]:
+            step.append(part)
+            steps.append((step, wait))
+            step = []
+        step.append(parts[-1][0])
+    if step or not steps:
+        steps.append((step, 0))
+    return steps
+
+
+class ActionQueue(object):
+    """
+    Executes batches of input actions on a worker thread so that the RPC
+    that submitted them can return as soon as they are queued.  Batches are
+    executed one at a time in the order they were enqueued.  Batches that
+    carry a sequence number are ordered per stream instead: a client sending
+    over several connections numbers its batches from 0 and the queue holds
+    early arrivals until the batches before them came in.  A missing batch
+    (e.g. its connection failed) is given up on after gap_timeout seconds.
+
+    Given a split function (e.g. timed_steps) a batch is executed as timed
+    steps: the actions between two pauses are executed in one go, and the
+    pauses are waited out by the worker without holding the platform.
+    Input that has to happen after queued input (a direct key_press, ...)
+    must call drain() first; ordered() wraps an RPC accordingly.  RPCs that
+    only read state (get_context, ...) should use between_steps() instead,
+    which sees the effects of all input due so far but does not wait for
+    pauses.  Both wrappers serialize access to the platform, so the RPC
+    server may serve requests on several threads.
+
+    cancel() drops everything queued and stops the executing batch at its
+    next step; split long input into steps (see chunked) to be able to stop
+    it part way.  execute should check cancelled() between actions to stop
+    the rest of a step as well.
+    """
+    def __init__(self, execute, gap_timeout=1.0, max_held=256, logger=None,
+                 metrics=None, split=None, interrupt=None, profiled=None):
+        """
+        :param execute: Called as execute(actions) on the worker thread for
+         every step of a batch.  Returning False aborts the rest of the
+         batch.
+        :param float gap_timeout: Seconds to wait for a missing sequence
+         number before executing the batches after it.
+        :param int max_held: Out of order batches held per stream before the
+         gap is given up on regardless of gap_timeout.
+        :param logger:
+        :param AeneaMetrics metrics: Receives enqueued_batches, skipped
+         sequence numbers and execution errors.
+        :param split: Called as split(actions) to turn a batch into
+         (actions, seconds) steps, see timed_steps.  By default a batch is a
+         single step.
+        :param interrupt: Called without arguments by cancel() to abort the
+         step that is executing, e.g. by killing the process typing it.
+        :param profiled: Called as profiled(function) to wrap the execution
+         of a batch on the worker thread, see AeneaProfiler.profiled.
+        """
+        self.execute = execute
+        self.gap_timeout = gap_timeout
+        self.max_held = max_held
+        self.logger = logger or logging.getLogger('aenea.ActionQueue')
+        self.metrics = metrics or AeneaMetrics()
+        self.split = split or (lambda actions: [(actions, 0)])
+        self.interrupt = interrupt
+        self.profiled = profiled or (lambda function: function)
+        self._condition = threading.Condition()
+        self._ready = collections.deque()
+        self._streams = {}
+        self._busy = False
+        self._pausing = False
+        self._generation = 0
+        self._platform = threading.RLock()
+        self._local = threading.local()
+        self._thread = threading.Thread(target=self._run,
+                                        name='aenea-action-queue')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def enqueue(self, actions, sequence=None, stream=None):
+        """
+        :param list actions: (method, parameters, optional) triples, as for
+         multiple_actions.
+        :param int sequence: Position of this batch in stream, counting from
+         0.  None executes the batch after everything enqueued so far.
+        :param str stream: Identifies the sender that numbered the batch.
+        :return: number of batches queued or executing, this one included.
+        :rtype: int
+        """
+        self.metrics.increment('enqueued_batches')
+        with self._condition:
+            if sequence is None:
+                self._ready.append((actions, None))
+            else:
+                state = self._streams.setdefault(stream, _Stream())
+                if sequence < state.next_sequence or sequence in state.held:
+                    self.logger.warn('dropping duplicate batch %s of %s',
+                                     sequence, stream)
+                else:
+                    state.held[sequence] = actions
+                    self._release(state)
+            self._condition.notify_all()
+            return self._pending()
+
+    # Requires _condition
+    def _pending(self):
+        held = sum(len(state.held) for state in self._streams.itervalues())
+        return len(self._ready) + held + (1 if self._busy else 0)
+
+    # Requires _condition
+    def _release(self, state, skip=False):
+        if skip or len(state.held) > self.max_held:
+            first = min(state.held)
+            self.logger.warn('gave up waiting for batches %s to %s',
+                             state.next_sequence, first - 1)
+            self.metrics.increment('skipped_sequence_numbers',
+                                   first - state.next_sequence)
+            state.next_sequence = first
+        while state.next_sequence in state.held:
+            self._ready.append((state.held.pop(state.next_sequence), None))
+            state.next_sequence += 1
+        if not state.held:
+            state.gap_since = None
+        elif state.gap_since is None:
+            state.gap_since = time.time()
+
+    # Requires _condition
+    def _expire_gaps(self):
+        """
+        :return: seconds until the next gap expires, or None.
+        """
+        now = time.time()
+        timeout = None
+        for state in self._streams.itervalues():
+            if state.gap_since is None:
+                continue
+            if now - state.gap_since >= self.gap_timeout:
+                self._release(state, skip=True)
+                self._condition.notify_all()
+            else:
+                remaining = state.gap_since + self.gap_timeout - now
+                timeout = remaining if timeout is None else min(timeout,
+                                                                remaining)
+        return timeout
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._ready:
+                    self._condition.wait(self._expire_gaps())
+                    if not self._ready:
+                        self._expire_gaps()
+                actions, ticket = self._ready.popleft()
+                self._busy = True
+                generation = self._generation
+            try:
+                self.profiled(self._execute_steps)(actions, generation)
+            except Exception as e:
+                if ticket is not None:
+                    ticket.error = e
+                elif not isinstance(e, BatchCancelled):
+                    self.metrics.increment('enqueued_batch_errors')
+                    self.logger.error('queued batch failed: %s', e)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+                if ticket is not None:
+                    ticket.done.set()
+
+    def _execute_steps(self, actions, generation):
+        for step, pause in self.split(actions):
+            if step:
+                with self.exclusive():
+                    if self._generation != generation:
+                        raise BatchCancelled()
+                    if self.execute(step) is False:
+                        return
+            if pause > 0:
+                self._pause(pause, generation)
+        if self._generation != generation:
+            raise BatchCancelled()
+
+    def _pause(self, seconds, generation):
+        end = time.time() + seconds
+        with self._condition:
+            self._pausing = True
+            self._condition.notify_all()
+            try:
+                # woken up early by cancel()
+                while self._generation == generation:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            finally:
+                self._pausing = False
+
+    def cancel(self):
+        """
+        Drop every batch that is queued or held for a missing sequence number
+        and abort the one executing after its current step; interrupt (if
+        given) is called to cut that step short as well.  Callers of run()
+        waiting for a dropped batch return as if it was executed.
+
+        :return: number of batches dropped, the executing one included.
+        :rtype: int
+        """
+        with self._condition:
+            cancelled = self._pending()
+            for _, ticket in self._ready:
+                if ticket is not None:
+                    ticket.error = BatchCancelled()
+                    ticket.done.set()
+            self._ready.clear()
+            for state in self._streams.itervalues():
+                if state.held:
+                    state.next_sequence = max(state.held) + 1
+                    state.held.clear()
+                    state.gap_since = None
+            self._generation += 1
+            busy = self._busy
+            self._condition.notify_all()
+        if busy and self.interrupt is not None:
+            self.interrupt()
+        self.metrics.increment('cancelled_batches', cancelled)
+        return cancelled
+
+    def run(self, actions):
+        """
+        Execute a batch after everything queued so far and wait until it was
+        executed.  Unlike a batch executed by its caller, pauses in it do not
+        keep other RPCs from being served.
+
+        :param list actions: (method, parameters, optional) triples.
+        :raises: whatever executing the batch raised.
+        """
+        if self.holding():
+            # called while executing input, e.g. from a queued batch.
+            self._execute_steps(actions, self._local.generation)
+            return
+        ticket = _Ticket()
+        with self._condition:
+            self._ready.append((actions, ticket))
+            self._condition.notify_all()
+        ticket.done.wait()
+        if (ticket.error is not None and
+                not isinstance(ticket.error, BatchCancelled)):
+            raise ticket.error
+
+    def holding(self):
+        """
+        :return: whether the calling thread holds the platform, i.e. is
+         executing input (see exclusive()).
+        """
+        return getattr(self._local, 'depth', 0) > 0
+
+    def cancelled(self):
+        """
+        :return: whether cancel() was called since the calling thread took
+         the platform, i.e. whether the input it is executing should stop.
+        """
+        return self.holding() and self._local.generation != self._generation
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """
+        Hold the platform: no step of a batch and no other wrapped RPC runs
+        until the block is left.  Reentrant.
+        """
+        with self._platform:
+            depth = getattr(self._local, 'depth', 0)
+            if not depth:
+                self._local.generation = self._generation
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+
+    def drain(self):
+        """
+        Block until every queued batch was executed.  Returns immediately
+        when called from the worker thread itself.
+        """
+        self._wait(lambda: not self._pending())
+
+    def _wait(self, done):
+        if threading.current_thread() is self._thread:
+            return
+        with self._condition:
+            while not done():
+                self._condition.wait(self._expire_gaps())
+                self._expire_gaps()
+
+    def ordered(self, function):
+        """
+        :return: function wrapped to drain the queue before running, so that
+         its effects happen after everything enqueued before it.  Called
+         while executing input (e.g. by a queued batch) it runs right away.
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if self.holding():
+                return function(*args, **kwargs)
+            self.drain()
+            with self.exclusive():
+                return function(*args, **kwargs)
+        return wrapper
+
+    def between_steps(self, function):
+        """
+        :return: function wrapped to run once the queue is idle or waiting
+         out a pause, so that it observes the effects of all input due so
+         far.  Meant for RPCs that only read state; they are not held up by
+         pauses and whatever was queued after them.
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if self.holding():
+                return function(*args, **kwargs)
+            self._wait(lambda: self._pausing or not self._pending())
+            with self.exclusive():
+                return function(*args, **kwargs)
+        return wrapper
@@ -0,0 +1,348 @@
+#!/usr/bin/python
+
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Benchmarks the server's RPC hot paths. Requests are fed through the
+   JSON-RPC dispatcher of a real AeneaServer (JSON decoding, dispatch,
+   metrics and encoding included, no network) backed by either the null
+   platform or one of the X11 backends, optionally on a private Xvfb
+   display. Results are printed as JSON so they can be compared between
+   commits.
+
+   From the root of the aenea project:
+     python -m server.benchmark --backend null
+     python -m server.benchmark --backend xdotool --xvfb
+
+   --backend may be repeated to compare backends on the same display:
+     python -m server.benchmark --xvfb --backend xdotool --backend libxdo \\
+         --backend xtest
+
+   --logging compares throughput with every command logged at debug level
+   to a file, written by the RPC thread (sync) or by a background thread
+   (queued), against logging disabled (off):
+     python -m server.benchmark --logging off --logging sync \\
+         --logging queued'''
+
+import argparse
+import json
+import os
+import logging
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from os.path import join, dirname, realpath
+
+# enable server.core imports by adding the root of the aenea project to path
+sys.path.append(realpath(join(dirname(__file__), '..')))
+
+import jsonrpclib
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server.core import AeneaLoggingManager, AeneaServer
+from server.null import NullPlatformRpcs
+
+LONG_TEXT = ('The quick brown fox jumps over the lazy dog. ' * 46)[:2048]
+# mostly characters that a US keyboard layout can not type.
+UNICODE_TEXT = (u'\xc0 bient\xf4t, ch\xe8re \xc9lo\xefse: \u2192 '
+                u'\u03b1\u03b2\u03b3 \u20ac5 ') * 8
+
+
+def _action(method, **kwargs):
+    return (method, [], kwargs)
+
+
+def _batch(size):
+    '''A batch resembling what ProxyKey/ProxyText generate for an utterance.'''
+    actions = []
+    while len(actions) < size:
+        actions.append(_action('key_press', key='a', modifiers=['control']))
+        actions.append(_action('write_text', text='hello'))
+        actions.append(_action('key_press', key='left', count=2))
+    return [list(action) for action in actions[:size]]
+
+
+def _mouse_grid(size, **kwargs):
+    '''A mouse grid utterance: size moves across a grid, then a click.'''
+    columns = int(size ** 0.5) or 1
+    actions = []
+    for index in xrange(size):
+        x, y = (index % columns + 1), (index // columns + 1)
+        if kwargs.get('proportional'):
+            x, y = x / (columns + 1.), y / (columns + 1.)
+        else:
+            x, y = x * 20, y * 20
+        actions.append(list(_action('move_mouse', x=x, y=y, **kwargs)))
+    actions.append(list(_action('click_mouse', button='left')))
+    return actions
+
+
+def default_scenarios():
+    '''Returns a list of (name, method, params) to benchmark.'''
+    scenarios = [
+        ('key_press', 'key_press', {'key': 'a'}),
+        ('key_press_modified', 'key_press',
+         {'key': 'home', 'modifiers': ['control', 'shift']}),
+        ('write_text_short', 'write_text', {'text': 'hello world'}),
+        ('write_text_long', 'write_text', {'text': LONG_TEXT}),
+        ('write_text_unicode', 'write_text', {'text': UNICODE_TEXT}),
+        ('click_mouse', 'click_mouse', {'button': 'left'}),
+        ('move_mouse', 'move_mouse', {'x': 100, 'y': 100}),
+        ('move_mouse_relative_active', 'move_mouse',
+         {'x': 10, 'y': 10, 'reference': 'relative_active'}),
+        ('get_context', 'get_context', {}),
+    ]
+    for size in (1, 10, 50, 100):
+        scenarios.append(('multiple_actions_%i' % size, 'multiple_actions',
+                          {'actions': _batch(size)}))
+    for reference, kwargs in (
+            ('absolute', {}),
+            ('relative_active', {'reference': 'relative_active'}),
+            ('proportional', {'reference': 'relative_active',
+                              'proportional': True})):
+        scenarios.append(('mouse_grid_%s_36' % reference, 'multiple_actions',
+                          {'actions': _mouse_grid(36, **kwargs)}))
+    return scenarios
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize(durations):
+    '''Returns latency statistics (in seconds) for a list of durations.'''
+    durations = sorted(durations)
+    total = sum(durations)
+    return {
+        'iterations': len(durations),
+        'mean': total / len(durations),
+        'median': percentile(durations, 0.5),
+        'p90': percentile(durations, 0.9),
+        'p99': percentile(durations, 0.99),
+        'min': durations[0],
+        'max': durations[-1],
+        'ops_per_second': len(durations) / total if total else None
+    }
+
+
+def time_calls(call, iterations, warmup=0):
+    '''Calls call() warmup + iterations times and summarizes the latency of
+       the last iterations calls.'''
+    for _ in xrange(warmup):
+        call()
+    durations = []
+    for _ in xrange(iterations):
+        start = time.time()
+        call()
+        durations.append(time.time() - start)
+    return summarize(durations)
+
+
+def _counter_totals(metrics):
+    return dict((name, sum(series['value'] for series in values))
+                for (name, values) in metrics.snapshot()['counters'].items())
+
+
+def run_scenarios(dispatcher, scenarios, iterations, warmup=0, metrics=None):
+    '''Benchmarks scenarios by feeding encoded JSON-RPC requests to
+       dispatcher._marshaled_dispatch. If metrics is given, the average
+       increase of each of its counters per call (e.g. subprocess_spawns) is
+       reported as well.'''
+    results = {}
+    for name, method, params in scenarios:
+        request = jsonrpclib.dumps(params, methodname=method, rpcid=1)
+
+        def call():
+            response = dispatcher._marshaled_dispatch(request)
+            if '"error"' in response:
+                raise RuntimeError('%s failed: %s' % (name, response))
+
+        before = _counter_totals(metrics) if metrics is not None else {}
+        results[name] = time_calls(call, iterations, warmup)
+        if metrics is not None:
+            calls = float(iterations + warmup)
+            results[name]['counters_per_call'] = dict(
+                (counter, (total - before.get(counter, 0)) / calls)
+                for (counter, total) in _counter_totals(metrics).items())
+    return results
+
+
+def make_platform(backend):
+    if backend == 'null':
+        return NullPlatformRpcs()
+
+    # the X11 backends read the server's config.py from linux_x11.
+    sys.path.insert(0, join(dirname(realpath(__file__)), 'linux_x11'))
+    if backend == 'xdotool':
+        import config
+        from server.linux_x11.x11_xdotool import XdotoolPlatformRpcs
+        return XdotoolPlatformRpcs(config)
+    elif backend == 'libxdo':
+        from server.linux_x11.x11_libxdo import XdoPlatformRpcs
+        return XdoPlatformRpcs()
+    elif backend == 'xtest':
+        from server.linux_x11.x11_xtest import XtestPlatformRpcs
+        return XtestPlatformRpcs()
+    raise ValueError('invalid "backend" parameter: "%s"' % backend)
+
+
+def make_server(platform_rpcs):
+    '''Returns an AeneaServer whose socket is bound but never served.'''
+    rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+    return AeneaServer(platform_rpcs, rpc_server)
+
+
+def configure_logging(mode, log_file):
+    '''Configures the aenea loggers for a --logging mode. Console output is
+       sent to /dev/null so that it does not mix with the results.'''
+    stderr, sys.stderr = sys.stderr, open(os.devnull, 'w')
+    try:
+        if mode == 'off':
+            AeneaLoggingManager.configure(level='WARNING')
+        else:
+            AeneaLoggingManager.configure(level='DEBUG', log_file=log_file,
+                                          queued=(mode == 'queued'))
+    finally:
+        sys.stderr = stderr
+
+
+def run_logging_modes(backend, modes, scenarios, iterations, warmup):
+    '''Benchmarks scenarios once per logging mode. Besides the scenarios,
+       reports how long the queued mode took to write its backlog after the
+       last call and how many records it dropped.'''
+    directory = tempfile.mkdtemp(prefix='aenea-benchmark-')
+    results = {}
+    try:
+        for mode in modes:
+            configure_logging(mode, join(directory, '%s.log' % mode))
+            handlers = logging.getLogger(
+                AeneaLoggingManager.aenea_logger_name).handlers
+            server = make_server(make_platform(backend))
+            results[mode] = {'scenarios': run_scenarios(
+                server.server, scenarios, iterations, warmup)}
+            start = time.time()
+            AeneaLoggingManager.flush()
+            results[mode]['flush_seconds'] = time.time() - start
+            results[mode]['records_dropped'] = sum(
+                getattr(handler, 'dropped', 0) for handler in handlers)
+            server.server.server_close()
+    finally:
+        logging.shutdown()
+        shutil.rmtree(directory)
+    return results
+
+
+def start_xvfb(display=':97', screen='1280x1024x24'):
+    '''Starts Xvfb on display and points DISPLAY at it. Returns the process,
+       which the caller must terminate.'''
+    process = subprocess.Popen(['Xvfb', display, '-screen', '0', screen],
+                               stdout=open(os.devnull, 'w'),
+                               stderr=subprocess.STDOUT)
+    os.environ['DISPLAY'] = display
+    # give Xvfb a moment to accept connections.
+    time.sleep(1)
+    return process
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=dirname(realpath(__file__)),
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(backend, results, output=None):
+    '''backend is the name of the benchmarked backend, or a list of names if
+       results maps each of them to its results.'''
+    document = {
+        'backend': backend,
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': sys.version.split()[0],
+        'results': results
+    }
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if output is None:
+        print text
+    else:
+        with open(output, 'w') as fd:
+            fd.write(text + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Aenea server benchmarks')
+    parser.add_argument(
+        '--backend', action='append', dest='backends',
+        choices=('null', 'xdotool', 'libxdo', 'xtest'),
+        help='Platform backend(s) to benchmark (default null).')
+    parser.add_argument(
+        '--xvfb', action='store_true',
+        help='Run the X11 backends against a private Xvfb display.')
+    parser.add_argument(
+        '--iterations', type=int, default=200,
+        help='Timed calls per scenario.')
+    parser.add_argument(
+        '--warmup', type=int, default=10,
+        help='Untimed calls per scenario before measuring.')
+    parser.add_argument(
+        '--scenario', action='append', dest='scenarios',
+        help='Only run the named scenario(s).')
+    parser.add_argument(
+        '--logging', action='append', dest='logging_modes',
+        choices=('off', 'sync', 'queued'),
+        help='Compare RPC throughput with the given logging mode(s).')
+    parser.add_argument(
+        '--output', help='Write JSON results here instead of stdout.')
+    arguments = parser.parse_args(argv)
+
+    backends = arguments.backends or ['null']
+    xvfb = None
+    if arguments.xvfb:
+        xvfb = start_xvfb()
+    results = {}
+    try:
+        for backend in backends:
+            scenarios = default_scenarios()
+            if arguments.scenarios:
+                scenarios = [s for s in scenarios
+                             if s[0] in arguments.scenarios]
+            if arguments.logging_modes:
+                results[backend] = run_logging_modes(
+                    backend, arguments.logging_modes, scenarios,
+                    arguments.iterations, arguments.warmup)
+                continue
+            server = make_server(make_platform(backend))
+            results[backend] = run_scenarios(
+                server.server, scenarios, arguments.iterations,
+                arguments.warmup, server.metrics)
+            server.server.server_close()
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    if len(backends) == 1:
+        report(backends[0], results[backends[0]], arguments.output)
+    else:
+        report(backends, results, arguments.output)
+
+if __name__ == '__main__':
+    main()
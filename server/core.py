@@ -1,10 +1,44 @@
+import SocketServer
 import abc
+import atexit
+import copy
+import functools
 import time
+import threading
 import logging
 import logging.config
 
 from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
 
+from server import logging_queue
+from server.action_queue import ActionQueue, BatchCancelled, timed_steps
+from server.macros import Macro
+from server.metrics import AeneaMetrics
+from server.mouse_path import expand_paths, path_actions
+from server.optimizer import ActionOptimizer
+from server.profiling import AeneaProfiler
+from server.rpc_trace import TraceRecorder
+
+
+# RPCs that only read state.  They are served between the steps of queued
+# batches, e.g. during a pause, instead of after everything queued.
+READ_ONLY_RPCS = frozenset(['server_info', 'get_context', 'get_clipboard'])
+
+# RPCs of AeneaServer that order their input on the action queue themselves
+# (or have none).
+SELF_ORDERED_RPCS = frozenset([
+    'enqueue_actions', 'multiple_actions', 'pause', 'mouse_path',
+    'register_macro', 'invoke_macro'])
+
+
+class ThreadedJSONRPCServer(SocketServer.ThreadingMixIn, SimpleJSONRPCServer):
+    """
+    Serves every request on its own thread, so that an RPC waiting out a
+    pause does not hold up the others.  AeneaServer serializes access to the
+    platform itself, see ActionQueue.
+    """
+    daemon_threads = True
+
 
 class AeneaServer(object):
     """
@@ -12,7 +46,10 @@ class AeneaServer(object):
     over the network.  Takes care of the JSON RPC protocol that Aenea is built
     on top of and handles dispatching RPCs to the appropriate action.
     """
-    def __init__(self, rpc_impl, server, plugins=tuple(), logger=None):
+    def __init__(self, rpc_impl, server, plugins=tuple(), logger=None,
+                 metrics=None, metrics_file=None, metrics_interval=60,
+                 profile_dir=None, optimize_actions=True, trace_file=None,
+                 interruptible_key_count=10, interruptible_text_length=0):
         """
         :param rpc_impl: Object that implements all AbstractAeneaPlatformRpc
          methods.  This is where the platform specific magic happens to gather
@@ -25,20 +62,107 @@ class AeneaServer(object):
           to register new RPCs in this method with a call to
           "server.register_function(...)"
         :param logger:
+        :param AeneaMetrics metrics: Collects call counts, errors and latency
+         for every registered RPC, including plugin RPCs. A new instance is
+         created if not provided.
+        :param str metrics_file: If provided, metrics are periodically written
+         to this path in the Prometheus text format.
+        :param int metrics_interval: Seconds between writes to metrics_file.
+        :param str profile_dir: Directory that profiles captured via the
+         start_profiling/stop_profiling RPCs are written to.
+        :param bool optimize_actions: Rewrite multiple_actions batches with
+         the transformations listed in rpc_impl.optimizations before
+         executing them. See ActionOptimizer.
+        :param str trace_file: If provided, every RPC received is appended to
+         this file for replaying with server/replay.py. See TraceRecorder.
+        :param int interruptible_key_count: key_press repeating its key more
+         often is typed in parts of this many presses, so that cancel_pending
+         can stop it in between.  0 types it in one go.
+        :param int interruptible_text_length: Same for the characters of
+         write_text.  Text is not split by default, since every part is
+         typed (or pasted) on its own.
         """
         self.logger = logger or logging.getLogger(self.__class__.__name__)
         self.server = server
-
-        self.logger.debug('using {0} for input emulation'.format(
-            rpc_impl.__class__.__name__))
+        self.rpc_impl = rpc_impl
+        self.metrics = metrics or AeneaMetrics()
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        self.profiler = AeneaProfiler(profile_dir, logger=self.logger)
+        self.optimizer = ActionOptimizer(
+            rpc_impl.optimizations if optimize_actions else (),
+            metrics=self.metrics)
+        self.macros = {}
+        self.action_queue = ActionQueue(
+            self._execute_actions, logger=self.logger, metrics=self.metrics,
+            split=functools.partial(timed_steps,
+                                    key_chunk=interruptible_key_count,
+                                    text_chunk=interruptible_text_length),
+            interrupt=rpc_impl.interrupt, profiled=self.profiler.profiled)
+
+        # share our metrics with the platform so that it can report platform
+        # specific counters (e.g. subprocess spawns).
+        rpc_impl.metrics = self.metrics
+
+        self.logger.debug('using %s for input emulation',
+                          rpc_impl.__class__.__name__)
 
         for rpc_func, rpc_name in rpc_impl.rpc_commands.items():
             self.server.register_function(rpc_name, rpc_func)
-        self.server.register_function(self.multiple_actions, 'multiple_actions')
+        own_rpcs = {
+            'multiple_actions': self.multiple_actions,
+            'enqueue_actions': self.enqueue_actions,
+            'pause': self.pause,
+            'mouse_path': self.mouse_path,
+            'register_macro': self.register_macro,
+            'invoke_macro': self.invoke_macro,
+        }
+        for rpc_name, rpc_func in own_rpcs.items():
+            self.server.register_function(rpc_func, rpc_name)
+        # only the platform's own RPCs understand its batch argument, not the
+        # ones replaced above (e.g. pause).
+        self.platform_rpcs = frozenset(rpc_impl.rpc_commands) - frozenset(
+            own_rpcs)
 
         for plugin in plugins:
             plugin.register_rpcs(self.server)
 
+        # wrap everything registered so far, plugin RPCs included.  Since
+        # multiple_actions dispatches through server.funcs, actions executed
+        # as part of a batch are recorded as well.  Everything else waits for
+        # queued batches first, so effects happen in the order the RPCs
+        # arrived; read-only RPCs only wait for the current step.  The
+        # batch RPCs, pause, mouse_path and macros order themselves on the
+        # action queue, as do long key presses and text, in parts that can be
+        # cancelled.
+        self._execute_ordered = self.action_queue.ordered(
+            self._execute_actions)
+        self._run_ordered = self.action_queue.ordered(
+            lambda function, *args: function(*args))
+        for rpc_name, rpc_func in self.server.funcs.items():
+            rpc_func = self.metrics.wrap(rpc_name, rpc_func)
+            if rpc_name in READ_ONLY_RPCS:
+                rpc_func = self.action_queue.between_steps(rpc_func)
+            elif rpc_name not in SELF_ORDERED_RPCS:
+                rpc_func = self.action_queue.ordered(rpc_func)
+                if rpc_name in ('key_press', 'write_text'):
+                    rpc_func = self._interruptible(rpc_name, rpc_func)
+            self.server.funcs[rpc_name] = self.profiler.profiled(rpc_func)
+        self.server.register_function(
+            self.metrics.wrap('cancel_pending', self.cancel_pending),
+            'cancel_pending')
+        self.server.register_function(self.get_metrics, 'get_metrics')
+        self.server.register_function(self.start_profiling, 'start_profiling')
+        self.server.register_function(self.stop_profiling, 'stop_profiling')
+        self.server.register_function(self.get_optimizer_stats,
+                                      'get_optimizer_stats')
+
+        self.trace = None
+        if trace_file is not None:
+            self.trace = TraceRecorder(trace_file)
+            self.server._dispatch = self.trace.wrap(self.server._dispatch)
+            atexit.register(self.trace.close)
+
     @classmethod
     def from_config(cls, platform_rpcs, config):
         """
@@ -51,10 +175,17 @@ class AeneaServer(object):
         """
         AeneaLoggingManager.configure(
                 level=getattr(config, 'LOG_LEVEL', None),
-                log_file=getattr(config, 'LOG_FILE', None))
+                log_file=getattr(config, 'LOG_FILE', None),
+                console_level=getattr(config, 'CONSOLE_LOG_LEVEL', None),
+                file_level=getattr(config, 'FILE_LOG_LEVEL', None),
+                queued=getattr(config, 'LOG_QUEUE', True))
         logger = logging.getLogger(AeneaLoggingManager.aenea_logger_name)
 
-        rpc_server = SimpleJSONRPCServer(
+        if getattr(config, 'THREADED_SERVER', True):
+            server_class = ThreadedJSONRPCServer
+        else:
+            server_class = SimpleJSONRPCServer
+        rpc_server = server_class(
                 (config.HOST, config.PORT), logRequests=False)
 
         # TODO: dynamically load/instantiate platform_rpcs from config instead
@@ -63,17 +194,152 @@ class AeneaServer(object):
         plugins = AeneaPluginLoader(logger).get_plugins(
                 getattr(config, 'PLUGIN_PATH', None))
 
-        return cls(platform_rpcs, rpc_server, plugins=plugins, logger=logger)
+        return cls(platform_rpcs, rpc_server, plugins=plugins, logger=logger,
+                   metrics_file=getattr(config, 'METRICS_FILE', None),
+                   metrics_interval=getattr(config, 'METRICS_INTERVAL', 60),
+                   profile_dir=getattr(config, 'PROFILE_DIR', None),
+                   optimize_actions=getattr(config, 'OPTIMIZE_ACTIONS', True),
+                   trace_file=getattr(config, 'TRACE_FILE', None),
+                   interruptible_key_count=getattr(
+                       config, 'INTERRUPTIBLE_KEY_COUNT', 10),
+                   interruptible_text_length=getattr(
+                       config, 'INTERRUPTIBLE_TEXT_LENGTH', 0))
 
     def serve_forever(self):
         self.logger.debug(
             'starting server on {0}:{1}'.format(*self.server.server_address))
+        if self.metrics_file is not None:
+            metrics_thread = threading.Thread(target=self._dump_metrics_loop)
+            metrics_thread.daemon = True
+            metrics_thread.start()
         self.server.serve_forever()
 
+    def _dump_metrics_loop(self):
+        while True:
+            time.sleep(self.metrics_interval)
+            try:
+                self.metrics.dump(self.metrics_file)
+            except (IOError, OSError) as e:
+                self.logger.warn('failed to write metrics to %s: %s' %
+                                 (self.metrics_file, e))
+
+    def get_metrics(self):
+        """
+        Return per RPC call counts, error counts and latency histograms as
+        well as platform counters such as subprocess spawns.
+        :return: see AeneaMetrics.snapshot
+        :rtype: dict
+        """
+        if self.metrics_file is not None:
+            self.metrics.dump(self.metrics_file)
+        return self.metrics.snapshot()
+
+    def start_profiling(self, mode='cprofile', interval=0.005):
+        """
+        Start profiling the live server. See AeneaProfiler for the
+        differences between the modes.
+        :param str mode: 'cprofile' or 'sampling'.
+        :param float interval: Seconds between stack samples in sampling
+         mode.
+        :return: This function always returns None
+        """
+        self.logger.info('starting %s profiler' % mode)
+        self.profiler.start(mode, interval)
+
+    def stop_profiling(self):
+        """
+        Stop profiling and write the profile to the profile directory.
+        :return: Path of the profile on the server.
+        :rtype: str
+        """
+        path = self.profiler.stop()
+        self.logger.info('wrote profile to %s' % path)
+        return path
+
+    def get_optimizer_stats(self):
+        """
+        Return how many actions the multiple_actions optimizer eliminated.
+        :return: see ActionOptimizer.stats
+        :rtype: dict
+        """
+        return self.optimizer.stats()
+
+    def enqueue_actions(self, actions, sequence=None, stream=None):
+        """
+        Like multiple_actions, but returns as soon as the actions are queued
+        instead of when they were executed.  Batches are executed in order,
+        and any other RPC waits until the batches queued before it were
+        executed.  Meant for input only; return values are discarded.
+        :param list actions: see multiple_actions.
+        :param int sequence: Number of this batch in stream, counting from 0.
+         Lets a client send batches over several connections at once; they
+         are executed in sequence order no matter in which order they arrive.
+        :param str stream: Identifies the client that numbered the batch.
+        :return: number of batches waiting or executing, this one included.
+        :rtype: int
+        """
+        return self.action_queue.enqueue(self._expand(actions), sequence,
+                                         stream)
+
+    def cancel_pending(self):
+        """
+        Drop all input that was queued (by enqueue_actions, or by a batch
+        that pauses and is still waiting) and stop the batch that is typing
+        at its next pause or part, killing the process typing it where the
+        platform can.  Not ordered: it takes effect right away.
+        :return: number of batches cancelled.
+        :rtype: int
+        """
+        return self.action_queue.cancel()
+
+    def _interruptible(self, rpc_name, function):
+        """
+        :return: function wrapped to execute calls that timed_steps splits
+         (e.g. key_press with a high count) on the action queue in parts.
+         Only RPCs called directly are split: within a batch, the actions
+         before the call may still be waiting in the platform's accumulator
+         and would be executed after it.
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            action = (rpc_name, list(args), kwargs)
+            if (self.action_queue.holding() or
+                    self.rpc_impl.batch_argument in kwargs):
+                return function(*args, **kwargs)
+            if len(self.action_queue.split([action])) > 1:
+                self.action_queue.run([action])
+            else:
+                return function(*args, **kwargs)
+        return wrapper
+
+    def pause(self, amount):
+        """
+        Pause command execution.  Waited out on the action queue, so only
+        input is held up, not RPCs that read state.
+        :param int amount: number of milliseconds to sleep for.
+        :return: This function always returns None.
+        """
+        # zero pauses reach us from inside batches, see timed_steps.
+        if amount > 0:
+            self.action_queue.run([('pause', [amount], {})])
+
+    def mouse_path(self, points, rate=60):
+        """
+        Move the mouse along a path.  Executed as a batch on the action
+        queue, waiting out the time between pointer moves like pauses.
+        :param list points: see AbstractAeneaPlatformRpcs.mouse_path.
+        :param int rate: Pointer moves per second while interpolating.
+        :return: This function always returns None.
+        """
+        self.action_queue.run(path_actions(points, rate))
+
     def multiple_actions(self, actions):
         """
         Execute multiple rpc commands, aborting on any error. Guaranteed to
-        execute in specified order. See also JSON-RPC multicall.
+        execute in specified order. See also JSON-RPC multicall.  A batch
+        that pauses (or contains input long enough to be split, see
+        timed_steps) runs on the action queue, so that read-only RPCs are
+        served during its pauses and cancel_pending can stop it.
         :param list actions:  List of dicts.  Each dictionary must provide
           "method", "optional", and "parameters" keys. e.g.
           ..code python
@@ -85,17 +351,123 @@ class AeneaServer(object):
         :return: This function always returns None
         :rtype: None
         """
+        actions = self._expand(actions)
+        steps = self.action_queue.split(actions)
+        if len(steps) > 1 or steps[0][1]:
+            self.action_queue.run(actions)
+        else:
+            try:
+                self._execute_ordered(actions)
+            except BatchCancelled:
+                pass
+
+    def register_macro(self, macro_id, actions):
+        """
+        Store a batch so that clients can execute it again with
+        invoke_macro, sending only macro_id.  Macros without arguments that
+        execute in one step (no pauses) are compiled for the platform, see
+        AbstractAeneaPlatformRpcs.compile_actions.  Registering macro_id
+        again replaces the macro.
+        :param str macro_id: Chosen by the client.
+        :param list actions: see multiple_actions.  A value of the form
+         {"macro_argument": name} anywhere in the parameters or optional
+         arguments of an action is a placeholder for the argument name of
+         invoke_macro.
+        :return: names of the macro's arguments.
+        :rtype: list
+        """
+        macro = Macro(actions)
+        if not macro.arguments:
+            macro.actions = expand_paths(macro.actions)
+            steps = self.action_queue.split(macro.actions)
+            if len(steps) == 1 and not steps[0][1] and macro.actions:
+                optimized = macro.actions
+                if self.optimizer.capabilities:
+                    optimized = self.optimizer.optimize(optimized)
+                macro.compiled = self.rpc_impl.compile_actions(optimized)
+        self.macros[macro_id] = macro
+        return sorted(macro.arguments)
+
+    def invoke_macro(self, macro_id, arguments=None):
+        """
+        Execute a macro registered with register_macro, as multiple_actions
+        would execute its actions.  Within a multiple_actions or
+        enqueue_actions batch, invoke_macro is replaced by the macro's
+        actions before the batch is executed.
+        :param str macro_id:
+        :param dict arguments: Values of the macro's placeholders.
+        :return: This function always returns None.
+        :raises ValueError: if macro_id was not registered (e.g. the server
+         was restarted since) or an argument is missing.
+        """
+        macro = self._macro(macro_id)
+        if macro.compiled is not None:
+            self._run_ordered(self.rpc_impl.run_compiled, macro.compiled)
+        else:
+            self.multiple_actions(macro.bind(arguments))
+
+    def _macro(self, macro_id):
+        try:
+            return self.macros[macro_id]
+        except KeyError:
+            raise ValueError('unknown macro "%s"' % macro_id)
 
-        for (method, parameters, optional) in actions:
-            if method in self.server.funcs:
-                # JSON-RPC forbids specifying both optional and parameters.
-                # Since multiple_actions is trying to mimic something like
-                # Multicall except with sequential ordering and abort,
-                # we enforce it here.
-                assert not (parameters and optional)
-                self.server.funcs[method](*parameters, **optional)
+    def _expand(self, actions):
+        """
+        :return: actions with invoke_macro and mouse_path replaced by the
+         actions they execute.
+        """
+        if any(action[0] == 'invoke_macro' for action in actions):
+            expanded = []
+            for action in actions:
+                method, parameters, optional = action
+                if method == 'invoke_macro':
+                    expanded.extend(self._bind_macro(*parameters, **optional))
+                else:
+                    expanded.append(action)
+            actions = expanded
+        return expand_paths(actions)
+
+    def _bind_macro(self, macro_id, arguments=None):
+        return self._macro(macro_id).bind(arguments)
+
+    def _execute_actions(self, actions):
+        """
+        Execute a batch without pauses.  Stops before the next action once
+        cancel_pending was called, dropping input the platform accumulated.
+        :return: False if the batch ended at an unknown method.
+        :raises BatchCancelled: if cancel_pending was called.
+        """
+        # platforms that can coalesce input (e.g. into a single xdotool
+        # invocation) receive the same accumulator for every platform RPC in
+        # the batch.  Only the platform's own RPCs understand it, plugin RPCs
+        # never get it.
+        if self.optimizer.capabilities:
+            actions = self.optimizer.optimize(actions)
+
+        batch_argument = self.rpc_impl.batch_argument
+        batch = self.rpc_impl.start_batch()
+        try:
+            for (method, parameters, optional) in actions:
+                if self.action_queue.cancelled():
+                    raise BatchCancelled()
+                if method in self.server.funcs:
+                    # JSON-RPC forbids specifying both optional and parameters.
+                    # Since multiple_actions is trying to mimic something like
+                    # Multicall except with sequential ordering and abort,
+                    # we enforce it here.
+                    assert not (parameters and optional)
+                    if batch is not None and method in self.platform_rpcs:
+                        optional = dict(optional)
+                        optional[batch_argument] = batch
+                    self.server.funcs[method](*parameters, **optional)
+                else:
+                    return False
+        finally:
+            if self.action_queue.cancelled():
+                self.rpc_impl.discard_batch(batch)
             else:
-                break
+                self.rpc_impl.finish_batch(batch)
 
 
 class AbstractAeneaPlatformRpcs(object):
@@ -108,8 +480,11 @@ class AbstractAeneaPlatformRpcs(object):
 
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, metrics=None):
         self.logger = logger or logging.getLogger(self.__class__.__name__)
+        # replaced by AeneaServer so that platform counters end up in the
+        # same place as the RPC metrics.
+        self.metrics = metrics or AeneaMetrics()
 
     @property
     def rpc_commands(self):
@@ -126,7 +501,10 @@ class AbstractAeneaPlatformRpcs(object):
             'click_mouse': self.click_mouse,
             'move_mouse': self.move_mouse,
             'pause': self.pause,
+            'mouse_path': self.mouse_path,
             'notify': self.notify,
+            'set_clipboard': self.set_clipboard,
+            'get_clipboard': self.get_clipboard,
         }
 
     @abc.abstractmethod
@@ -210,6 +588,106 @@ class AbstractAeneaPlatformRpcs(object):
         """
         raise NotImplementedError()
 
+    def mouse_path(self, points, rate=60):
+        """
+        Move the mouse along a path of waypoints, pressing and releasing
+        buttons on the way (e.g. to drag), in one call.
+        :param list points: Waypoints, dicts with the optional keys x, y,
+         reference, proportional (as for move_mouse), duration (milliseconds
+         to get there from the previous waypoint), interpolation ('linear' or
+         'smooth'), button, direction, count, count_delay (as for
+         click_mouse) and pause (milliseconds to wait afterwards).  See
+         server.mouse_path.path_actions.
+        :param int rate: Pointer moves per second while interpolating.
+        :return: This function always returns None.
+        """
+        # like pause, implemented with the platform's own RPCs.
+        for method, parameters, optional in path_actions(points, rate):
+            getattr(self, method)(*parameters, **optional)
+
+    def set_clipboard(self, text, selection='clipboard'):
+        """
+        Make text the contents of a clipboard.
+        :param str text: New clipboard contents.
+        :param str selection: Which clipboard. On X11 one of 'clipboard',
+         'primary' or 'secondary'.
+        :return: This function always returns None
+        """
+        raise NotImplementedError()
+
+    def get_clipboard(self, selection='clipboard'):
+        """
+        Return the contents of a clipboard.
+        :param str selection: Which clipboard, see set_clipboard.
+        :return: The clipboard's text, or None if it is empty or holds no
+         text.
+        :rtype: str or None
+        """
+        raise NotImplementedError()
+
+    # Transformations of server.optimizer that may be applied to this
+    # platform's multiple_actions batches.  Platforms only list those whose
+    # result they execute exactly like the original actions.
+    optimizations = frozenset()
+
+    # Name of the keyword argument that start_batch's accumulator is passed
+    # as to every RPC in a multiple_actions batch.
+    batch_argument = None
+
+    def start_batch(self):
+        """
+        Called by multiple_actions before executing a batch.  Platforms that
+        can coalesce input return an accumulator here; it is passed to every
+        platform RPC in the batch as the keyword argument named by
+        batch_argument.  RPCs queue input on it and must flush it themselves
+        before anything that reads state (e.g. get_context).
+        :return: accumulator, or None if the platform does not batch.
+        """
+        return None
+
+    def finish_batch(self, batch):
+        """
+        Called by multiple_actions after a batch, even if it failed, with the
+        accumulator returned by start_batch.  Must execute any input still
+        queued on it.
+        """
+        pass
+
+    def discard_batch(self, batch):
+        """
+        Called instead of finish_batch when the batch was cancelled (see
+        AeneaServer.cancel_pending).  Input still queued on the accumulator
+        must not be executed.
+        """
+        pass
+
+    def compile_actions(self, actions):
+        """
+        Called by register_macro with a batch of platform RPCs, without
+        pauses, that is going to be executed many times.  Platforms that can
+        prepare such a batch ahead of time (e.g. into the arguments of a
+        single process) return the result here, which run_compiled is
+        called with instead of executing the batch.
+        :param list actions: (method, parameters, optional) triples.
+        :return: compiled batch, or None to execute the actions as usual.
+        """
+        return None
+
+    def run_compiled(self, compiled):
+        """
+        Execute a batch compiled by compile_actions.
+        :return: This function always returns None.
+        """
+        raise NotImplementedError()
+
+    def interrupt(self):
+        """
+        Called by cancel_pending from another thread while input is being
+        executed.  Platforms that type input in a way that can be aborted
+        (e.g. a child process) should abort it here.
+        """
+        pass
+
     def pause(self, amount):
         """
         Pause command execution.
@@ -263,7 +741,7 @@ class AeneaPluginLoader(object):
 
         plugins = []
         for plugin_info in plugin_manager.getAllPlugins():
-            self.logger.debug('Loading plugin "%s"' % plugin_info.name)
+            self.logger.debug('Loading plugin "%s"', plugin_info.name)
             plugin_manager.activatePluginByName(plugin_info.name)
             plugin = plugin_info.plugin_object
 
@@ -308,28 +786,64 @@ class AeneaLoggingManager(object):
         }
     }
 
+    # Listener of the queued mode, stopped when logging is configured again.
+    _listener = None
+
     @classmethod
-    def configure(cls, level=None, log_file=None):
+    def configure(cls, level=None, log_file=None, console_level=None,
+                  file_level=None, queued=False):
         """
         Configure logging.
         :param str level: python logging level. e.g. 'INFO' | 'DEBUG'
         :param str log_file: location of log file to write to..
+        :param str console_level: level of the console handler, defaults to
+         level.
+        :param str file_level: level of the log file handler, defaults to
+         level.
+        :param bool queued: If True the thread that logs only queues the
+         record; a background thread formats and writes it.
         :return: None
         :type: None
         """
         level = level or 'DEBUG'
-        config = cls.default_config.copy()
-        config['handlers']['console']['level'] = level
+        config = copy.deepcopy(cls.default_config)
+        config['handlers']['console']['level'] = console_level or level
+        levels = [console_level or level]
 
         if log_file is not None:
             config['handlers']['file'] = {
                 'class': 'logging.handlers.RotatingFileHandler',
                 'formatter': 'generic',
-                'level': level,
+                'level': file_level or level,
                 'filename': log_file,
                 'mode': 'a',
                 'backupCount': 3
             }
             config['loggers'][cls.aenea_logger_name]['handlers'].append('file')
+            levels.append(file_level or level)
+
+        # Records no handler wants are rejected before they are created.
+        config['loggers'][cls.aenea_logger_name]['level'] = min(
+            logging.getLevelName(name) if isinstance(name, basestring)
+            else name for name in levels)
 
+        if cls._listener is not None:
+            cls._listener.stop()
+            cls._listener = None
         logging.config.dictConfig(config)
+        if queued:
+            cls._listener, _ = logging_queue.install(
+                logging.getLogger(cls.aenea_logger_name))
+            atexit.register(cls._listener.stop)
+
+    @classmethod
+    def flush(cls):
+        """
+        Wait for the background thread of the queued mode to write every
+        record logged so far.  Logging is synchronous afterwards.
+        """
+        if cls._listener is not None:
+            logger = logging.getLogger(cls.aenea_logger_name)
+            logger.handlers = cls._listener.handlers
+            cls._listener.stop()
+            cls._listener = None
@@ -0,0 +1,93 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Keeps the keycodes that the keyboard layout leaves unused and binds them
+   to keysyms that are missing from the layout when text needs them. xdotool
+   and libxdo rebind a scratch keycode for every such keystroke. With the
+   pool, a missing character costs one mapping change the first time it is
+   typed, and the binding is reused until the least recently used keycode
+   is needed for another keysym.'''
+
+import collections
+
+NO_SYMBOL = 0
+
+
+class KeycodePool(object):
+    '''Pure bookkeeping: callers apply the mapping changes bind() asks for
+       and tell the pool about the keyboard mapping through update().'''
+    def __init__(self):
+        # keysym -> keycode, least recently used first.
+        self._bindings = collections.OrderedDict()
+        self._free = []
+        self._pinned = set()
+        self.remaps = 0
+
+    @property
+    def keycodes(self):
+        '''The keycodes owned by the pool.'''
+        return set(self._free) | set(self._bindings.itervalues())
+
+    def update(self, mapping):
+        '''Adopts keycodes without keysyms and gives up the ones the layout
+           now uses for something else.
+
+           :param dict mapping: {keycode: [keysym, ...]} of the whole
+            keyboard.'''
+        owners = dict((keycode, keysym)
+                      for (keysym, keycode) in self._bindings.iteritems())
+        for keycode, keysyms in sorted(mapping.iteritems()):
+            bound = set(keysyms) - set([NO_SYMBOL])
+            if keycode in owners:
+                if bound != set([owners[keycode]]):
+                    del self._bindings[owners[keycode]]
+                    self._pinned.discard(keycode)
+                    if not bound:
+                        self._free.append(keycode)
+            elif keycode in self._free:
+                if bound:
+                    self._free.remove(keycode)
+            elif not bound:
+                self._free.append(keycode)
+
+    def bind(self, keysym):
+        '''Returns (keycode, remap) for keysym. If remap is True, the caller
+           must bind keycode to keysym before using it. Keycodes handed out
+           since the last unpin() are never rebound, so (None, False) means
+           the caller has to submit its pending events and unpin() first.'''
+        if keysym in self._bindings:
+            keycode = self._bindings.pop(keysym)
+            self._bindings[keysym] = keycode
+            self._pinned.add(keycode)
+            return keycode, False
+
+        if self._free:
+            keycode = self._free.pop(0)
+        else:
+            for evicted, keycode in self._bindings.iteritems():
+                if keycode not in self._pinned:
+                    del self._bindings[evicted]
+                    break
+            else:
+                return None, False
+
+        self._bindings[keysym] = keycode
+        self._pinned.add(keycode)
+        self.remaps += 1
+        return keycode, True
+
+    def unpin(self):
+        '''Called once the events using the handed out keycodes were
+           submitted.'''
+        self._pinned.clear()
@@ -0,0 +1,221 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Owns X selections (PRIMARY, CLIPBOARD, ...) from inside the server so
+   that pasting and the clipboard RPCs need no xsel processes. X selections
+   are not buffers: the owner has to answer every client that asks for the
+   contents, so a private connection serves those requests from a thread.
+   Needs python-xlib; available is False without it or without a display.'''
+
+import Queue
+import logging
+import threading
+
+try:
+    import Xlib.threaded
+    import Xlib.X
+    import Xlib.Xatom
+    import Xlib.display
+    import Xlib.protocol.event
+    import Xlib.protocol.request
+except ImportError:
+    Xlib = None
+
+SELECTIONS = ('primary', 'secondary', 'clipboard')
+
+
+class SelectionOwner(object):
+    '''
+    :param str display: X display to connect to. None uses $DISPLAY. The
+     connection is only made when the selections are first used.
+    :param logger:
+    '''
+    def __init__(self, display=None, logger=None):
+        self.display_name = display
+        self.logger = logger or logging.getLogger('aenea.SelectionOwner')
+        self.display = None
+        self._connect_lock = threading.Lock()
+        self._connect_failed = False
+        self._lock = threading.Lock()
+        self._contents = {}
+        self._served = threading.Event()
+        self._replies = Queue.Queue()
+
+    @property
+    def available(self):
+        '''Connects on first use. False if that is impossible.'''
+        with self._connect_lock:
+            if self.display is None and not self._connect_failed:
+                try:
+                    self._connect()
+                except Exception as error:
+                    self.logger.warn('cannot own X selections: %s', error)
+                    self._connect_failed = True
+        return self.display is not None
+
+    def _connect(self):
+        if Xlib is None:
+            raise RuntimeError('python-xlib is not installed')
+        display = Xlib.display.Display(self.display_name)
+        self.window = display.screen().root.create_window(
+            0, 0, 1, 1, 0, 0, window_class=Xlib.X.InputOnly)
+        self.atoms = {
+            'primary': Xlib.Xatom.PRIMARY,
+            'secondary': Xlib.Xatom.SECONDARY,
+            'clipboard': display.intern_atom('CLIPBOARD'),
+        }
+        self.targets = display.intern_atom('TARGETS')
+        self.utf8_string = display.intern_atom('UTF8_STRING')
+        self.text = display.intern_atom('TEXT')
+        self.incr = display.intern_atom('INCR')
+        self.property = display.intern_atom('AENEA_SELECTION')
+        display.flush()
+        self.display = display
+
+        thread = threading.Thread(target=self._serve,
+                                  name='aenea-selection-owner')
+        thread.daemon = True
+        thread.start()
+
+    def _atom(self, selection):
+        if selection not in SELECTIONS:
+            raise ValueError('invalid "selection" parameter: "%s"' % selection)
+        if not self.available:
+            raise RuntimeError('X selections are not available')
+        return self.atoms[selection]
+
+    def set(self, text, selection='clipboard'):
+        '''Serves text as the contents of selection until another client
+           takes the selection over.'''
+        atom = self._atom(selection)
+        if isinstance(text, str):
+            text = text.decode('utf-8')
+        with self._lock:
+            self._contents[atom] = text
+        self.window.set_selection_owner(atom, Xlib.X.CurrentTime)
+        owner = self.display.get_selection_owner(atom)
+        if getattr(owner, 'id', owner) != self.window.id:
+            with self._lock:
+                self._contents.pop(atom, None)
+            raise RuntimeError('failed to take ownership of %s' % selection)
+
+    def clear(self, selection='clipboard'):
+        '''Gives up selection if we own it.'''
+        atom = self._atom(selection)
+        with self._lock:
+            owned = self._contents.pop(atom, None) is not None
+        if owned:
+            Xlib.protocol.request.SetSelectionOwner(
+                display=self.display.display, window=Xlib.X.NONE,
+                selection=atom, time=Xlib.X.CurrentTime)
+            self.display.flush()
+
+    def get(self, selection='clipboard', timeout=1.0):
+        '''Returns the contents of selection as unicode, or None if it is
+           empty, its owner does not answer within timeout seconds or it only
+           offers the contents incrementally (INCR).'''
+        atom = self._atom(selection)
+        with self._lock:
+            if atom in self._contents:
+                return self._contents[atom]
+
+        while not self._replies.empty():
+            self._replies.get_nowait()
+        self.window.convert_selection(atom, self.utf8_string, self.property,
+                                      Xlib.X.CurrentTime)
+        self.display.flush()
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except Queue.Empty:
+            self.logger.warn('owner of %s did not answer', selection)
+            return None
+        if reply.property == Xlib.X.NONE:
+            return None
+
+        value = self.window.get_full_property(self.property,
+                                              Xlib.X.AnyPropertyType)
+        self.window.delete_property(self.property)
+        self.display.flush()
+        if value is None or value.property_type == self.incr:
+            return None
+        return value.value.decode('utf-8', 'replace')
+
+    def paste(self, text, click, timeout=0.5, restore_timeout=0.05):
+        '''Pastes text with a middle click: serves it as PRIMARY, calls
+           click() and waits up to timeout seconds for the target window to
+           fetch it. The previous PRIMARY contents are then served again (X
+           has no way to hand ownership back to the previous owner), if its
+           owner handed them over within restore_timeout seconds; that wait
+           adds to every paste, so it is kept short.'''
+        previous = self.get('primary', timeout=restore_timeout)
+        self._served.clear()
+        self.set(text, 'primary')
+        click()
+        if not self._served.wait(timeout):
+            self.logger.debug('pasted text was not requested within %ss',
+                              timeout)
+        if previous is None:
+            self.clear('primary')
+        else:
+            self.set(previous, 'primary')
+
+    def _serve(self):
+        while True:
+            try:
+                event = self.display.next_event()
+            except Exception as error:
+                self.logger.warn('stopped serving X selections: %s', error)
+                return
+            if event.type == Xlib.X.SelectionRequest:
+                self.answer(event)
+            elif event.type == Xlib.X.SelectionClear:
+                with self._lock:
+                    self._contents.pop(event.atom, None)
+            elif event.type == Xlib.X.SelectionNotify:
+                self._replies.put(event)
+
+    def answer(self, request):
+        '''Answers a SelectionRequest for one of our selections.'''
+        with self._lock:
+            text = self._contents.get(request.selection)
+        # obsolete clients leave property unset and expect the target.
+        prop = request.property or request.target
+        requestor = request.requestor
+        served = False
+
+        if text is None:
+            prop = Xlib.X.NONE
+        elif request.target == self.targets:
+            requestor.change_property(
+                prop, Xlib.Xatom.ATOM, 32,
+                [self.targets, self.utf8_string, self.text,
+                 Xlib.Xatom.STRING])
+        elif request.target in (self.utf8_string, self.text):
+            requestor.change_property(prop, self.utf8_string, 8,
+                                      text.encode('utf-8'))
+            served = True
+        elif request.target == Xlib.Xatom.STRING:
+            requestor.change_property(prop, Xlib.Xatom.STRING, 8,
+                                      text.encode('latin-1', 'replace'))
+            served = True
+        else:
+            prop = Xlib.X.NONE
+
+        requestor.send_event(Xlib.protocol.event.SelectionNotify(
+            time=request.time, requestor=requestor,
+            selection=request.selection, target=request.target,
+            property=prop))
+        self.display.flush()
+        if served:
+            self._served.set()
@@ -58,11 +58,13 @@ if __name__ == '__main__':
         required=False, help='If provided the server runs in the background.')
     parser.add_argument(
         '--input', action='store', type=str, default='xdotool',
-        choices=('xdotool', 'libxdo'), required=False, dest='impl',
+        choices=('xdotool', 'libxdo', 'xtest'), required=False, dest='impl',
         help='Aenea Server Input Method.  Providing the default, '
                     '"xdotool" will make the server shell out to the xdotool '
                     'program to emulate input. "libxdo" will cause the server '
-                    'to make calls to the xdo library.')
+                    'to make calls to the xdo library. "xtest" will cause the '
+                    'server to fake input through the XTEST extension '
+                    'directly (requires python-xlib only).')
 
     arguments = parser.parse_args()
 
@@ -71,7 +73,22 @@ if __name__ == '__main__':
         platform_rpcs = XdotoolPlatformRpcs(config)
     elif arguments.impl == 'libxdo':
         from server.linux_x11.x11_libxdo import XdoPlatformRpcs
-        platform_rpcs = XdoPlatformRpcs()
+        from server.linux_x11.text_injection import TextInjectionPolicy
+        platform_rpcs = XdoPlatformRpcs(
+            xdo_delay=getattr(config, 'XDOTOOL_DELAY', 0),
+            enable_xsel=getattr(config, 'ENABLE_XSEL', False),
+            text_injection=TextInjectionPolicy.from_config(config),
+            cache_geometry=getattr(config, 'CACHE_WINDOW_GEOMETRY', True),
+            paste_strategy=getattr(config, 'PASTE_STRATEGY', 'selection'))
+    elif arguments.impl == 'xtest':
+        from server.linux_x11.x11_xtest import XtestPlatformRpcs
+        from server.linux_x11.text_injection import TextInjectionPolicy
+        platform_rpcs = XtestPlatformRpcs(
+            xtest_delay=getattr(config, 'XDOTOOL_DELAY', 0),
+            enable_xsel=getattr(config, 'ENABLE_XSEL', False),
+            text_injection=TextInjectionPolicy.from_config(config),
+            cache_geometry=getattr(config, 'CACHE_WINDOW_GEOMETRY', True),
+            paste_strategy=getattr(config, 'PASTE_STRATEGY', 'selection'))
 
     if arguments.daemon:
         daemonize()
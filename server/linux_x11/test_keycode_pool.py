@@ -0,0 +1,56 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from server.linux_x11.keycode_pool import KeycodePool
+
+
+class TestKeycodePool(unittest.TestCase):
+    def setUp(self):
+        self.pool = KeycodePool()
+        self.pool.update({8: [0, 0], 9: [0], 10: [97, 65], 11: []})
+
+    def test_adopts_unused_keycodes(self):
+        self.assertEqual(self.pool.keycodes, set([8, 9, 11]))
+
+    def test_reuses_bindings(self):
+        self.assertEqual(self.pool.bind(1000), (8, True))
+        self.assertEqual(self.pool.bind(1000), (8, False))
+        self.assertEqual(self.pool.bind(1001), (9, True))
+        self.assertEqual(self.pool.remaps, 2)
+
+    def test_least_recently_used_is_rebound(self):
+        for keysym in (1000, 1001, 1002):
+            self.pool.bind(keysym)
+        self.pool.unpin()
+        self.pool.bind(1000)
+        self.assertEqual(self.pool.bind(1003), (9, True))
+        self.assertEqual(self.pool.bind(1002), (11, False))
+        self.assertEqual(self.pool.bind(1004), (None, False))
+        self.pool.unpin()
+        self.assertEqual(self.pool.bind(1004), (8, True))
+
+    def test_update_gives_up_reassigned_keycodes(self):
+        self.pool.bind(1000)
+        self.pool.update({8: [1000, 1000], 9: [98, 66], 12: [0]})
+        self.assertEqual(self.pool.keycodes, set([8, 11, 12]))
+        self.assertEqual(self.pool.bind(1000), (8, False))
+        # the layout took over the keycode bound to 1000.
+        self.pool.update({8: [99, 67]})
+        self.assertEqual(self.pool.keycodes, set([11, 12]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import mock
+import time
+import unittest
+
+import Xlib.X
+import Xlib.Xatom
+
+from server.linux_x11.selection import SelectionOwner
+
+_CLIPBOARD, _TARGETS, _UTF8_STRING, _TEXT, _PROPERTY = 300, 301, 302, 303, 304
+
+
+class TestSelectionOwner(unittest.TestCase):
+    def setUp(self):
+        self.owner = SelectionOwner()
+        # stand in for the X connection _connect would make.
+        self.owner.display = mock.Mock()
+        self.owner.window = mock.Mock(id=7)
+        self.owner.display.get_selection_owner.return_value = self.owner.window
+        self.owner.atoms = {
+            'primary': Xlib.Xatom.PRIMARY,
+            'secondary': Xlib.Xatom.SECONDARY,
+            'clipboard': _CLIPBOARD,
+        }
+        self.owner.targets = _TARGETS
+        self.owner.utf8_string = _UTF8_STRING
+        self.owner.text = _TEXT
+        self.owner.property = _PROPERTY
+
+    def request(self, target, selection=_CLIPBOARD):
+        requestor = mock.Mock(__window__=lambda: 42)
+        return mock.Mock(selection=selection, target=target, property=99,
+                         time=0, requestor=requestor)
+
+    def notified_property(self, request):
+        (notify,), _ = request.requestor.send_event.call_args
+        return notify.property
+
+    def test_serves_utf8(self):
+        self.owner.set(u'caf\xe9')
+        request = self.request(_UTF8_STRING)
+        self.owner.answer(request)
+        request.requestor.change_property.assert_called_once_with(
+            99, _UTF8_STRING, 8, 'caf\xc3\xa9')
+        self.assertEqual(self.notified_property(request), 99)
+        self.assertTrue(self.owner._served.is_set())
+
+    def test_targets(self):
+        self.owner.set('text')
+        request = self.request(_TARGETS)
+        self.owner.answer(request)
+        _, _, format, targets = request.requestor.change_property.call_args[0]
+        self.assertEqual(format, 32)
+        self.assertIn(_UTF8_STRING, targets)
+        self.assertFalse(self.owner._served.is_set())
+
+    def test_refuses_unknown(self):
+        self.owner.set('text')
+        for request in (self.request(12345),
+                        self.request(_UTF8_STRING, Xlib.Xatom.PRIMARY)):
+            self.owner.answer(request)
+            self.assertEqual(self.notified_property(request), Xlib.X.NONE)
+            self.assertFalse(request.requestor.change_property.called)
+
+    def test_lost_ownership(self):
+        self.owner.display.get_selection_owner.return_value = mock.Mock(id=8)
+        self.assertRaises(RuntimeError, self.owner.set, 'text')
+        self.assertRaises(ValueError, self.owner.set, 'text', 'nonsense')
+
+    def test_owned_selection_is_read_locally(self):
+        self.owner.set('text', 'primary')
+        self.assertEqual(self.owner.get('primary'), u'text')
+        self.assertFalse(self.owner.window.convert_selection.called)
+
+    def test_paste_restores_previous_contents(self):
+        self.owner.set('before', 'primary')
+        clicks = []
+
+        def click():
+            clicks.append(self.owner.get('primary'))
+            self.owner.answer(self.request(_UTF8_STRING, Xlib.Xatom.PRIMARY))
+
+        self.owner.paste('pasted', click, timeout=0)
+        self.assertEqual(clicks, [u'pasted'])
+        self.assertEqual(self.owner.get('primary'), u'before')
+
+    def test_paste_waits_briefly_for_silent_owner(self):
+        start = time.time()
+        self.owner.paste('pasted', lambda: None, timeout=0)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertTrue(self.owner.window.convert_selection.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
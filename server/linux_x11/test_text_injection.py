@@ -0,0 +1,46 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from server.linux_x11.text_injection import TextInjectionPolicy
+
+
+class TestTextInjectionPolicy(unittest.TestCase):
+    def test_defaults_never_paste(self):
+        policy = TextInjectionPolicy()
+        self.assertFalse(policy.should_paste('x' * 10000))
+        self.assertEqual(policy.chunks('hello'), ['hello'])
+        self.assertFalse(policy.needs_window_class)
+
+    def test_threshold_and_chunks(self):
+        policy = TextInjectionPolicy(paste_threshold=5, type_chunk_size=2)
+        self.assertFalse(policy.should_paste('abcd'))
+        self.assertTrue(policy.should_paste('abcde'))
+        self.assertEqual(policy.chunks('abcde'), ['ab', 'cd', 'e'])
+
+    def test_overrides(self):
+        policy = TextInjectionPolicy(
+            paste_threshold=5,
+            overrides={'Term': {'paste_threshold': None,
+                                'type_chunk_size': 3}})
+        self.assertTrue(policy.needs_window_class)
+        self.assertTrue(policy.should_paste('abcdef', 'Other'))
+        self.assertFalse(policy.should_paste('abcdef', 'Term'))
+        self.assertEqual(policy.chunks('abcdef', 'Term'), ['abc', 'def'])
+        self.assertEqual(policy.chunks('abcdef', 'Other'), ['abcdef'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import mock
+import unittest
+
+import Xlib.X
+
+from server.linux_x11.window_geometry import WindowGeometryCache
+
+
+class TestWindowGeometryCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = WindowGeometryCache(watch=False)
+        # pretend the X event watcher is running.
+        self.cache._display = mock.Mock()
+        self.cache._net_active_window = 42
+        self.queries = []
+
+    def query(self, value):
+        def query():
+            self.queries.append(value)
+            return value
+        return query
+
+    def event(self, type, window=None, atom=None):
+        return mock.Mock(type=type, window=mock.Mock(id=window), atom=atom)
+
+    def test_disabled_never_caches(self):
+        cache = WindowGeometryCache(watch=False)
+        self.assertFalse(cache.enabled)
+        for _ in xrange(3):
+            self.assertEqual(cache.geometry(1, self.query({'x': 1})),
+                             {'x': 1})
+            self.assertEqual(cache.active_window(self.query(1)), 1)
+        self.assertEqual(len(self.queries), 6)
+
+    def test_configure_notify_invalidates_window(self):
+        self.cache.geometry(1, self.query('one'))
+        self.cache.geometry(2, self.query('two'))
+        self.cache.geometry(1, self.query('one'))
+        self.assertEqual(self.queries, ['one', 'two'])
+        self.cache._display.create_resource_object.assert_any_call(
+            'window', 1)
+
+        self.cache.handle_event(self.event(Xlib.X.ConfigureNotify, window=1))
+        self.assertEqual(self.cache.geometry(1, self.query('moved')), 'moved')
+        self.assertEqual(self.cache.geometry(2, self.query('two')), 'two')
+        self.assertEqual(self.queries, ['one', 'two', 'moved'])
+
+    def test_focus_change_invalidates_everything(self):
+        self.cache.active_window(self.query(1))
+        self.cache.geometry(1, self.query('one'))
+        self.assertEqual(self.cache.active_window(self.query(2)), 1)
+
+        self.cache.handle_event(self.event(Xlib.X.PropertyNotify, atom=7))
+        self.assertEqual(self.cache.active_window(self.query(2)), 1)
+
+        self.cache.handle_event(self.event(Xlib.X.PropertyNotify, atom=42))
+        self.assertEqual(self.cache.active_window(self.query(2)), 2)
+        self.assertEqual(self.cache.geometry(1, self.query('again')), 'again')
+
+    def test_window_class_kept_until_destroyed(self):
+        self.cache.window_class(1, self.query('Firefox'))
+        for event in (self.event(Xlib.X.ConfigureNotify, window=1),
+                      self.event(Xlib.X.PropertyNotify, atom=42)):
+            self.cache.handle_event(event)
+            self.assertEqual(self.cache.window_class(1, self.query('other')),
+                             'Firefox')
+
+        self.cache.handle_event(self.event(Xlib.X.DestroyNotify, window=1))
+        self.assertEqual(self.cache.window_class(1, self.query('Emacs')),
+                         'Emacs')
+        self.assertEqual(self.queries, ['Firefox', 'Emacs'])
+
+    def test_event_during_query_is_not_cached(self):
+        def query():
+            self.cache.handle_event(
+                self.event(Xlib.X.ConfigureNotify, window=1))
+            return 'stale'
+        self.assertEqual(self.cache.geometry(1, query), 'stale')
+        self.assertEqual(self.cache.geometry(1, self.query('fresh')), 'fresh')
+
+
+if __name__ == '__main__':
+    unittest.main()
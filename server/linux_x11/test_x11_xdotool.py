@@ -0,0 +1,251 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import StringIO
+import contextlib
+import mock
+import sys
+import threading
+import time
+import types
+import unittest
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server.core import AeneaServer
+
+# x11_xdotool reads the server's config module at import time.
+_config = types.ModuleType('config')
+_config.ENABLE_XSEL = False
+_config.XDOTOOL_DELAY = 0
+_config.CACHE_WINDOW_GEOMETRY = False
+# Only config is removed again afterwards: python 2 clears the globals of
+# modules that are unloaded, which would break x11_xdotool's imports.
+sys.modules['config'] = _config
+try:
+    from server.linux_x11 import x11_xdotool
+finally:
+    del sys.modules['config']
+
+
+class FakeProcess(object):
+    pid = None
+
+    def communicate(self, message=None):
+        return None, None
+
+
+class FakeShell(object):
+    '''Stands in for subprocess.Popen/os.popen and records every process
+       spawned.'''
+    def __init__(self):
+        self.commands = []
+
+    def Popen(self, command, **kwargs):
+        if not isinstance(command, basestring):
+            command = ' '.join(command)
+        self.commands.append(command)
+        return FakeProcess()
+
+    @contextlib.contextmanager
+    def popen(self, command, mode='r'):
+        self.commands.append(command)
+        if command.endswith('getactivewindow'):
+            yield StringIO.StringIO('1234\n')
+        elif 'getwindowgeometry' in command:
+            yield StringIO.StringIO(
+                'WINDOW=1234\nX=10\nY=20\nWIDTH=800\nHEIGHT=600\nSCREEN=0\n')
+        else:
+            yield StringIO.StringIO('')
+
+
+class TestXdotoolBatching(unittest.TestCase):
+    def setUp(self):
+        self.shell = FakeShell()
+        patcher = mock.patch.object(x11_xdotool.os, 'popen', self.shell.popen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(x11_xdotool.subprocess, 'Popen',
+                                    self.shell.Popen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.platform = x11_xdotool.XdotoolPlatformRpcs(_config)
+        self.rpc_server = SimpleJSONRPCServer(
+            ('127.0.0.1', 0), logRequests=False)
+        self.addCleanup(self.rpc_server.server_close)
+        self.server = AeneaServer(self.platform, self.rpc_server)
+
+    def multiple_actions(self, actions):
+        self.rpc_server.funcs['multiple_actions'](
+            [(method, [], optional) for (method, optional) in actions])
+
+    def spawns(self):
+        return sum(counter['value'] for counter in
+                   self.server.metrics.snapshot()['counters'].get(
+                       'subprocess_spawns', []))
+
+    def test_input_batch_is_one_process(self):
+        self.multiple_actions(
+            [('key_press', {'key': 'a', 'modifiers': ['control']})] * 10 +
+            [('click_mouse', {'button': 'left'}),
+             ('key_press', {'key': 'enter'})])
+        self.assertEqual(self.spawns(), 1)
+        self.assertEqual(len(self.shell.commands), 1)
+        command = self.shell.commands[0]
+        self.assertTrue(command.startswith('xdotool keydown Control_L'))
+        self.assertTrue(command.endswith('key  Return'))
+
+    def test_pause_splits_batch(self):
+        # the server waits out the pause, not xdotool.
+        self.multiple_actions([
+            ('key_press', {'key': 'a'}),
+            ('pause', {'amount': 10}),
+            ('key_press', {'key': 'enter'})])
+        self.assertEqual(self.spawns(), 2)
+        self.assertNotIn('sleep', ''.join(self.shell.commands))
+        self.assertTrue(self.shell.commands[1].endswith('key  Return'))
+
+    def test_server_rpcs_in_batch(self):
+        # pause and mouse_path are the server's, which takes no batch.
+        self.rpc_server.funcs['multiple_actions']([
+            ('key_press', [], {'key': 'a'}),
+            ('pause', [0], {}),
+            ('pause', [], {'amount': 0}),
+            ('mouse_path', [[{'x': 10, 'y': 10},
+                             {'x': 30, 'y': 30, 'duration': 40}]],
+             {'rate': 50}),
+            ('key_press', [], {'key': 'b'})])
+        self.rpc_server.funcs['mouse_path']([{'x': 5, 'y': 5},
+                                             {'button': 'left'}])
+        commands = ' '.join(self.shell.commands)
+        self.assertTrue(commands.index('key  a') <
+                        commands.index('mousemove 30.000000 30.000000') <
+                        commands.index('key  b') <
+                        commands.index('mousemove 5.000000 5.000000'))
+
+    def test_barriers_flush_in_order(self):
+        self.multiple_actions([
+            ('key_press', {'key': 'a'}),
+            ('key_press', {'key': 'b'}),
+            ('get_context', {}),
+            ('key_press', {'key': 'c'}),
+            ('write_text', {'text': 'hello'}),
+            ('key_press', {'key': 'd'}),
+            ('move_mouse', {'x': -5, 'y': 10, 'reference': 'relative'}),
+        ])
+        commands = self.shell.commands
+        self.assertEqual(commands[0], 'xdotool key  a key  b')
+        self.assertEqual(commands[1], 'xdotool getactivewindow')
+        self.assertIn('xdotool key  c', commands)
+        self.assertTrue(commands.index('xdotool key  c') <
+                        commands.index('xdotool type --file - --delay 0'))
+        self.assertTrue(commands.index('xdotool type --file - --delay 0') <
+                        commands.index('xdotool key  d'))
+        self.assertTrue(commands[-1].startswith(
+            'xdotool mousemove_relative -- -5.000000 10.000000'))
+
+    def test_absolute_moves_do_not_query_geometry(self):
+        self.multiple_actions(
+            [('move_mouse', {'x': 10 * i, 'y': 10 * i}) for i in xrange(1, 30)])
+        self.assertEqual(len(self.shell.commands), 1)
+        self.assertNotIn('getwindowgeometry', self.shell.commands[0])
+
+    def test_cached_geometry(self):
+        self.platform.geometry_cache._display = mock.Mock()
+        self.multiple_actions(
+            [('move_mouse', {'x': 0.5, 'y': 0.5, 'proportional': True}),
+             ('move_mouse', {'x': 5, 'y': 5, 'reference': 'relative_active'})] *
+            10)
+        self.assertEqual(self.shell.commands.count('xdotool getactivewindow'),
+                         1)
+        self.assertEqual(
+            len([c for c in self.shell.commands if 'getwindowgeometry' in c]),
+            1)
+        # relative_active still flushes first in case the batch switched
+        # windows, but no longer looks anything up.
+        self.assertEqual(len(self.shell.commands), 2 + 20)
+        self.assertIn('xdotool mousemove --window 1234 5.000000 5.000000',
+                      self.shell.commands)
+
+    def test_without_batch_each_action_spawns(self):
+        for _ in xrange(5):
+            self.rpc_server.funcs['key_press'](key='a')
+        self.assertEqual(self.spawns(), 5)
+
+    def test_macro_compiled_to_one_command(self):
+        self.rpc_server.funcs['register_macro']('m', [
+            ('key_press', [], {'key': 'a', 'modifiers': ['control']}),
+            ('move_mouse', [], {'x': 10, 'y': 20}),
+            ('click_mouse', [], {'button': 'left'})])
+        self.assertEqual(self.shell.commands, [])
+        for _ in xrange(3):
+            self.rpc_server.funcs['invoke_macro']('m')
+        self.assertEqual(len(set(self.shell.commands)), 1)
+        self.assertEqual(self.spawns(), 3)
+        self.assertIn('mousemove 10.000000 20.000000', self.shell.commands[0])
+
+        # text needs the active window, so it is executed as usual.
+        self.rpc_server.funcs['register_macro']('t', [
+            ('write_text', [], {'text': 'hi'})])
+        self.assertEqual(self.server.macros['t'].compiled, None)
+
+    def test_long_key_press_in_batch_keeps_its_place(self):
+        # the optimizer merges the presses into one with count=15, which
+        # must not be typed before the key press preceding it.
+        self.assertTrue(self.server.optimizer.capabilities)
+        self.multiple_actions([('key_press', {'key': 'a'})] +
+                              [('key_press', {'key': 'down'})] * 15)
+        commands = ' '.join(self.shell.commands)
+        self.assertEqual(commands.count('key  Down'), 15)
+        self.assertTrue(commands.index('key  a') <
+                        commands.index('key  Down'))
+
+    def test_paste_through_selection_without_xsel(self):
+        self.platform.selection = mock.Mock(available=True)
+        self.platform.write_text('text', paste=True)
+        self.assertEqual(self.platform.selection.paste.call_args[0][0], 'text')
+        self.assertFalse(any('xsel' in command
+                             for command in self.shell.commands))
+
+        self.platform.selection.available = False
+        self.platform.write_text('text', paste=True)
+        self.assertEqual(self.platform.selection.paste.call_count, 1)
+        self.assertIn('type --file -', self.shell.commands[-1])
+
+    def test_long_key_press_typed_in_parts(self):
+        self.rpc_server.funcs['key_press'](key='down', count=25)
+        self.assertEqual(
+            [command.count('key  Down') for command in self.shell.commands],
+            [10, 10, 5])
+
+
+class TestXdotoolInterrupt(unittest.TestCase):
+    def test_interrupt_kills_running_command(self):
+        platform = x11_xdotool.XdotoolPlatformRpcs(_config)
+        thread = threading.Thread(target=platform.run_command,
+                                  args=('10',), kwargs={'executable': 'sleep'})
+        start = time.time()
+        thread.start()
+        while not platform._children and time.time() - start < 5:
+            time.sleep(0.01)
+        platform.interrupt()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(time.time() - start < 5)
+        self.assertFalse(platform._children)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,296 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import distutils.spawn
+import mock
+import subprocess
+import time
+import unittest
+
+import Xlib.X
+import Xlib.XK
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server.core import AeneaServer
+from server.linux_x11 import x11_xtest
+
+_DOWN, _UP = Xlib.X.KeyPress, Xlib.X.KeyRelease
+
+
+class FakeDisplay(object):
+    '''Just enough of Xlib.display.Display for the XTEST backend.'''
+    min_keycode = 8
+    mapping = {
+        10: ['1', 'exclam'],
+        36: ['Return', None],
+        37: ['Control_L', None],
+        38: ['a', 'A'],
+        50: ['Shift_L', None],
+    }
+    shift_keys = [50, 0]
+
+    def __init__(self, name=None):
+        self.display = mock.Mock()
+        self.display.info.min_keycode = self.min_keycode
+        self.display.info.max_keycode = max(self.mapping)
+        self.root = mock.Mock()
+        self.syncs = 0
+        self.events = []
+        # events the X server sends once the requests so far are processed.
+        self.replies = []
+
+    def has_extension(self, name):
+        return name == 'XTEST'
+
+    def screen(self):
+        return mock.Mock(root=self.root)
+
+    def intern_atom(self, name):
+        return hash(name)
+
+    def get_keyboard_mapping(self, first, count):
+        rows = []
+        for keycode in xrange(first, first + count):
+            names = self.mapping.get(keycode, [None, None])
+            rows.append([Xlib.XK.string_to_keysym(name) if name else 0
+                         for name in names])
+        return rows
+
+    def get_modifier_mapping(self):
+        mapping = [[0, 0] for _ in xrange(8)]
+        mapping[Xlib.X.ShiftMapIndex] = self.shift_keys
+        return mapping
+
+    def pending_events(self):
+        return len(self.events)
+
+    def next_event(self):
+        return self.events.pop(0)
+
+    def sync(self):
+        self.syncs += 1
+        self.events.extend(self.replies)
+        del self.replies[:]
+
+
+class TestXtestPlatformRpcs(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        for patcher in (
+                mock.patch.object(x11_xtest.Xlib.display, 'Display',
+                                  FakeDisplay),
+                mock.patch.object(x11_xtest.Xlib.ext.xtest, 'fake_input',
+                                  self.fake_input)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.platform = x11_xtest.XtestPlatformRpcs(cache_geometry=False)
+        self.display = self.platform.display
+        self.display.mapping = dict(FakeDisplay.mapping)
+        self.display.change_keyboard_mapping = self.change_keyboard_mapping
+
+    def change_keyboard_mapping(self, first_keycode, keysyms):
+        self.sent.append(('remap', first_keycode, keysyms[0][0]))
+        self.display.replies.append(mock.Mock(
+            type=Xlib.X.MappingNotify, request=Xlib.X.MappingKeyboard,
+            first_keycode=first_keycode, count=len(keysyms)))
+
+    def fake_input(self, display, event_type, detail=0, time=0, root=0, x=0,
+                   y=0):
+        self.sent.append((event_type, detail, time, x, y))
+
+    def test_keymap(self):
+        keymap = self.platform.keymap
+        self.assertEqual(keymap[Xlib.XK.XK_a], (38, False))
+        self.assertEqual(keymap[Xlib.XK.XK_A], (38, True))
+        self.assertEqual(keymap[Xlib.XK.XK_exclam], (10, True))
+        self.assertEqual(self.platform.shift_keycode, 50)
+
+    def test_shift_without_shift_l(self):
+        del self.display.mapping[50]
+        self.display.mapping[49] = ['Shift_R', None]
+        self.platform.load_keymap()
+        self.assertEqual(self.platform.shift_keycode, 49)
+
+        # e.g. a layout binding the shift modifier to another key.
+        del self.display.mapping[49]
+        self.display.shift_keys = [0, 48]
+        self.platform.load_keymap()
+        self.assertEqual(self.platform.shift_keycode, 48)
+
+        self.display.shift_keys = [0, 0]
+        self.assertRaises(RuntimeError, self.platform.load_keymap)
+
+    def test_key_press(self):
+        self.platform.key_press(key='a', modifiers=['control'], count=2,
+                                count_delay=30)
+        self.assertEqual(self.sent, [
+            (_DOWN, 37, 0, 0, 0),
+            (_DOWN, 38, 0, 0, 0), (_UP, 38, 0, 0, 0),
+            # the pause is carried out by the X server.
+            (_DOWN, 38, 30, 0, 0), (_UP, 38, 0, 0, 0),
+            (_UP, 37, 0, 0, 0)])
+        self.assertEqual(self.display.syncs, 1)
+        self.assertRaises(ValueError, self.platform.key_press, key='f13')
+
+    def test_missing_keys_use_the_keycode_pool(self):
+        self.platform.key_press(key='F13', modifiers=['control'], count=2)
+        remap, = [event for event in self.sent if event[0] == 'remap']
+        self.assertEqual(remap[2], Xlib.XK.XK_F13)
+        self.assertEqual([event[:2] for event in self.sent], [
+            remap[:2], (_DOWN, 37),
+            (_DOWN, remap[1]), (_UP, remap[1]),
+            (_DOWN, remap[1]), (_UP, remap[1]),
+            (_UP, 37)])
+
+        # in a batch, an exhausted pool submits the batch first.
+        del self.sent[:]
+        self.platform.keycode_pool = x11_xtest.KeycodePool()
+        self.platform.keycode_pool.update({9: [0]})
+        batch = self.platform.start_batch()
+        self.platform.key_press(key='F14', _xtest=batch)
+        self.platform.key_press(key='F15', _xtest=batch)
+        self.assertEqual(self.sent, [('remap', 9, Xlib.XK.XK_F14),
+                                     (_DOWN, 9, 0, 0, 0), (_UP, 9, 0, 0, 0)])
+        self.platform.finish_batch(batch)
+        self.assertEqual(self.sent[-3][0], 'remap')
+        self.assertEqual(self.sent[-3][2], Xlib.XK.XK_F15)
+
+        self.assertRaises(ValueError, self.platform.key_press, key='F16',
+                          modifiers=['F17'])
+
+    def test_write_text_shifts(self):
+        self.platform.write_text('a!\n')
+        self.assertEqual([event[:2] for event in self.sent], [
+            (_DOWN, 38), (_UP, 38),
+            (_DOWN, 50), (_DOWN, 10), (_UP, 10), (_UP, 50),
+            (_DOWN, 36), (_UP, 36)])
+
+    def test_batch_is_one_round_trip(self):
+        rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+        self.addCleanup(rpc_server.server_close)
+        AeneaServer(self.platform, rpc_server)
+        rpc_server.funcs['multiple_actions']([
+            ('key_press', [], {'key': 'a'}),
+            ('write_text', [], {'text': 'aaa'}),
+            ('click_mouse', [], {'button': 'left'}),
+            ('move_mouse', [], {'x': -5, 'y': 7, 'reference': 'relative'}),
+            ('key_press', [], {'key': 'enter'})])
+        self.assertEqual(self.display.syncs, 1)
+        self.assertEqual(len(self.sent), 13)
+        self.assertIn((Xlib.X.MotionNotify, True, 0, -5, 7), self.sent)
+        self.assertEqual(self.sent[-2], (_DOWN, 36, 0, 0, 0))
+
+    def test_pause_splits_batch(self):
+        rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+        self.addCleanup(rpc_server.server_close)
+        AeneaServer(self.platform, rpc_server)
+        rpc_server.funcs['multiple_actions']([
+            ('key_press', [], {'key': 'a'}),
+            ('pause', [], {'amount': 20}),
+            ('key_press', [], {'key': 'enter'})])
+        # the server waits out the pause, not the X server.
+        self.assertEqual(self.display.syncs, 2)
+        self.assertEqual(self.sent[-2], (_DOWN, 36, 0, 0, 0))
+
+    def test_mapping_notify_reloads_keymap(self):
+        self.display.mapping = dict(FakeDisplay.mapping, **{11: ['b', 'B']})
+        self.display.events.append(mock.Mock(
+            type=Xlib.X.MappingNotify, request=Xlib.X.MappingKeyboard))
+        self.platform.key_press(key='b')
+        self.assertEqual([event[:2] for event in self.sent],
+                         [(_DOWN, 11), (_UP, 11)])
+
+    def test_missing_characters_use_the_keycode_pool(self):
+        self.assertIn(9, self.platform.keycode_pool.keycodes)
+        self.assertNotIn(38, self.platform.keycode_pool.keycodes)
+        self.platform.write_text(u'\xe9a\u20ac\xe9')
+        remaps = [event for event in self.sent if event[0] == 'remap']
+        self.assertEqual([keysym for (_, _, keysym) in remaps],
+                         [0xe9, 0x10020ac])
+        e_acute = remaps[0][1]
+        self.assertEqual(self.sent[0], remaps[0])
+        self.assertEqual(
+            [event[1] for event in self.sent if event[0] == _DOWN],
+            [e_acute, 38, remaps[1][1], e_acute])
+        self.assertEqual(self.platform.keycode_pool.remaps, 2)
+
+    def test_exhausted_pool_submits_pending_events(self):
+        self.platform.keycode_pool = x11_xtest.KeycodePool()
+        self.platform.keycode_pool.update({9: [0], 11: [0]})
+        self.platform.write_text(u'\xe9\xe8\xea')
+        # the third character needs a keycode the first two are still
+        # using, so they are submitted before it is rebound.  Every remap
+        # is synced as well.
+        self.assertEqual(self.display.syncs, 5)
+        self.assertEqual(self.sent[-3], ('remap', 9, 0xea))
+
+    def test_remap_waits_for_mapping_notify(self):
+        sync = self.display.sync
+
+        def record_sync():
+            sync()
+            self.sent.append(('sync', len(self.display.events)))
+        self.display.sync = record_sync
+        next_event = self.display.next_event
+
+        def record_event():
+            event = next_event()
+            self.sent.append(('event', event.first_keycode))
+            return event
+        self.display.next_event = record_event
+
+        self.platform.write_text(u'a\xe9')
+        e_acute = self.sent[2][1]
+        # the key event is only sent once the MappingNotify arrived.
+        self.assertEqual([event[:2] for event in self.sent], [
+            (_DOWN, 38), (_UP, 38), ('remap', e_acute), ('sync', 1),
+            ('event', e_acute), (_DOWN, e_acute), (_UP, e_acute),
+            ('sync', 0)])
+
+
+@unittest.skipUnless(distutils.spawn.find_executable('Xvfb'),
+                     'needs Xvfb')
+class TestXtestOnXvfb(unittest.TestCase):
+    '''Types through a real X server and reports the throughput.'''
+    display = ':98'
+
+    def setUp(self):
+        xvfb = subprocess.Popen(['Xvfb', self.display],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        self.addCleanup(xvfb.terminate)
+        time.sleep(1)
+        self.platform = x11_xtest.XtestPlatformRpcs(display=self.display,
+                                                    cache_geometry=False)
+
+    def test_unicode_paragraph(self):
+        paragraph = (u'Le c\u0153ur a ses raisons que la raison ne conna\xeet '
+                     u'point: \xe0 \xe9 \xe8 \xea \xf1 \xfc \u20ac \u2192 '
+                     u'\u03bb\u03cc\u03b3\u03bf\u03c2. ') * 20
+        missing = set(character for character in paragraph
+                      if x11_xtest.character_keysym(character)
+                      not in self.platform.keymap)
+        start = time.time()
+        self.platform.write_text(paragraph)
+        elapsed = time.time() - start
+        # one mapping change per missing character, not per keystroke.
+        self.assertEqual(self.platform.keycode_pool.remaps, len(missing))
+        print '%i characters in %.3fs (%.0f/s), %i remaps' % (
+            len(paragraph), elapsed, len(paragraph) / elapsed,
+            self.platform.keycode_pool.remaps)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Decides how write_text should get text into the focused window. Typing
+   emulates one key event per character, which makes long dictated
+   paragraphs take seconds. Above a configurable size the text is pasted
+   via the X selection instead. Both the threshold and the chunk size can be
+   overridden per application, keyed by window class.'''
+
+
+class TextInjectionPolicy(object):
+    '''
+    :param int paste_threshold: Text of at least this many characters is
+     pasted instead of typed. None never pastes automatically.
+    :param int type_chunk_size: Maximum number of characters typed per
+     backend call. 0 types everything in one call.
+    :param dict overrides: {window_class: {'paste_threshold': ...,
+     'type_chunk_size': ...}}. Missing keys fall back to the defaults.
+    '''
+    def __init__(self, paste_threshold=None, type_chunk_size=0,
+                 overrides=None):
+        self.paste_threshold = paste_threshold
+        self.type_chunk_size = type_chunk_size
+        self.overrides = overrides or {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            paste_threshold=getattr(config, 'PASTE_THRESHOLD', None),
+            type_chunk_size=getattr(config, 'TYPE_CHUNK_SIZE', 0),
+            overrides=getattr(config, 'TEXT_INJECTION_OVERRIDES', None))
+
+    @property
+    def needs_window_class(self):
+        '''Whether should_paste() and chunks() depend on the window class.
+           Backends use this to avoid querying the focused window when there
+           are no overrides.'''
+        return bool(self.overrides)
+
+    def _setting(self, name, window_class):
+        override = self.overrides.get(window_class, {})
+        return override.get(name, getattr(self, name))
+
+    def should_paste(self, text, window_class=None):
+        threshold = self._setting('paste_threshold', window_class)
+        return threshold is not None and len(text) >= threshold
+
+    def chunks(self, text, window_class=None):
+        '''Split text into the pieces that should each be typed with a single
+           backend call.'''
+        size = self._setting('type_chunk_size', window_class)
+        if not size or len(text) <= size:
+            return [text]
+        return [text[i:i + size] for i in xrange(0, len(text), size)]
@@ -0,0 +1,185 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Caches the active window id and per-window geometry for move_mouse. Mouse
+   grids issue dozens of relative moves per utterance and each one used to
+   query X (or spawn xdotool) for the same answer. Entries are dropped when
+   X reports that a window was moved, resized, unmapped or destroyed, and
+   everything is dropped when the active window changes. Window classes
+   (used to pick per-application text injection settings) are kept until
+   the window is destroyed. Those events are read over a private Xlib
+   connection; without python-xlib or an X display the cache is disabled and
+   every lookup goes to the backend.'''
+
+import logging
+import threading
+
+try:
+    # makes the display connection safe to share with the watcher thread.
+    import Xlib.threaded
+    import Xlib.display
+    import Xlib.X
+except ImportError:
+    Xlib = None
+
+
+class WindowGeometryCache(object):
+    '''
+    :param str display: X display to watch. None uses $DISPLAY.
+    :param bool watch: If False, never cache (every lookup is a miss).
+    :param logger:
+    '''
+    def __init__(self, display=None, watch=True, logger=None):
+        self.logger = logger or logging.getLogger('aenea.WindowGeometryCache')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._active_window = None
+        self._geometry = {}
+        self._classes = {}
+        self._watched = set()
+        self._display = None
+
+        if not watch:
+            return
+        if Xlib is None:
+            self.logger.info('python-xlib is not installed, not caching '
+                             'window geometry')
+            return
+        try:
+            self._display = Xlib.display.Display(display)
+            self._net_active_window = self._display.intern_atom(
+                '_NET_ACTIVE_WINDOW')
+            self._display.screen().root.change_attributes(
+                event_mask=Xlib.X.PropertyChangeMask)
+            self._display.flush()
+        except Exception as error:
+            self.logger.warn('not caching window geometry, cannot watch the '
+                             'X display: %s', error)
+            self._display = None
+            return
+
+        thread = threading.Thread(target=self._watch,
+                                  name='aenea-window-geometry')
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def enabled(self):
+        return self._display is not None
+
+    def active_window(self, query):
+        '''Returns the id of the active window, calling query() to look it up
+           if it is not cached.'''
+        with self._lock:
+            if self._active_window is not None:
+                self.hits += 1
+                return self._active_window
+            self.misses += 1
+            generation = self._generation
+        window_id = query()
+        if self.enabled and window_id is not None:
+            with self._lock:
+                # an event that arrived during the query makes it stale.
+                if generation == self._generation:
+                    self._active_window = window_id
+        return window_id
+
+    def geometry(self, window_id, query):
+        '''Returns the geometry dict of window_id, calling query() to look it
+           up if it is not cached.'''
+        with self._lock:
+            if window_id in self._geometry:
+                self.hits += 1
+                return self._geometry[window_id]
+            self.misses += 1
+            generation = self._generation
+        if self.enabled and window_id is not None:
+            # subscribe before querying so that no change can slip in between.
+            self._watch_window(window_id)
+        geometry = query()
+        if self.enabled and window_id is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._geometry[window_id] = geometry
+        return geometry
+
+    def window_class(self, window_id, query):
+        '''Returns the class of window_id, calling query() to look it up if
+           it is not cached. A window keeps its class until it is destroyed.'''
+        with self._lock:
+            if window_id in self._classes:
+                self.hits += 1
+                return self._classes[window_id]
+            self.misses += 1
+            generation = self._generation
+        if self.enabled and window_id is not None:
+            self._watch_window(window_id)
+        window_class = query()
+        if self.enabled and window_id is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._classes[window_id] = window_class
+        return window_class
+
+    def invalidate(self, window_id=None):
+        '''Drops the geometry of window_id, or everything if it is None.'''
+        with self._lock:
+            self._generation += 1
+            if window_id is None:
+                self._active_window = None
+                self._geometry.clear()
+            else:
+                self._geometry.pop(window_id, None)
+
+    def _watch_window(self, window_id):
+        if window_id in self._watched:
+            return
+        self._watched.add(window_id)
+        window = self._display.create_resource_object('window', window_id)
+        window.change_attributes(event_mask=Xlib.X.StructureNotifyMask,
+                                 onerror=self._ignore_error)
+        self._display.flush()
+
+    def _ignore_error(self, *args):
+        # the window may be gone by the time the request reaches X.
+        pass
+
+    def _watch(self):
+        while True:
+            try:
+                event = self._display.next_event()
+            except Exception as error:
+                self.logger.warn('stopped watching window geometry: %s',
+                                 error)
+                self._display = None
+                self.invalidate()
+                with self._lock:
+                    self._classes.clear()
+                return
+            self.handle_event(event)
+
+    def handle_event(self, event):
+        if event.type == Xlib.X.PropertyNotify:
+            if event.atom == self._net_active_window:
+                self.invalidate()
+        elif event.type in (Xlib.X.ConfigureNotify, Xlib.X.UnmapNotify,
+                            Xlib.X.ReparentNotify):
+            self.invalidate(event.window.id)
+        elif event.type == Xlib.X.DestroyNotify:
+            self._watched.discard(event.window.id)
+            with self._lock:
+                self._classes.pop(event.window.id, None)
+            self.invalidate(event.window.id)
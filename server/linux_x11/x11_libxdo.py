@@ -25,6 +25,11 @@ import Xlib.display
 import psutil
 
 from server.core import AbstractAeneaPlatformRpcs
+from server.linux_x11.selection import SelectionOwner
+from server.linux_x11.text_injection import TextInjectionPolicy
+from server.linux_x11.window_geometry import WindowGeometryCache
+from server.optimizer import ALL_OPTIMIZATIONS
+from server.process_cache import ProcessMetadataCache
 
 _MOUSE_BUTTONS = {
     'left': 1,
@@ -148,10 +153,23 @@ class XdoPlatformRpcs(AbstractAeneaPlatformRpcs):
     """
     Aenea RPC implementation that uses low level C bindings to the xdo library.
     """
-    def __init__(self, xdo_delay=0, display=None, **kwargs):
+    optimizations = ALL_OPTIMIZATIONS
+
+    def __init__(self, xdo_delay=0, display=None, enable_xsel=False,
+                 text_injection=None, cache_geometry=True,
+                 paste_strategy='selection', **kwargs):
         """
         :param int xdo_delay: Default pause between keystrokes.
         :param str display: reserved for future use.
+        :param bool enable_xsel: Allow write_text to paste via xsel. See
+         config.ENABLE_XSEL.
+        :param TextInjectionPolicy text_injection: When to paste instead of
+         type and how to chunk typed text.
+        :param bool cache_geometry: Cache window geometry between moves,
+         invalidated by X events. See WindowGeometryCache.
+        :param str paste_strategy: 'selection' to paste by owning PRIMARY
+         in process, 'xsel' to paste through xsel. See
+         config.PASTE_STRATEGY.
         :param kwargs:
         """
         super(XdoPlatformRpcs, self).__init__(**kwargs)
@@ -160,6 +178,13 @@ class XdoPlatformRpcs(AbstractAeneaPlatformRpcs):
         self.libxdo = xdo.Xdo(display)
 
         self.xdotool_delay = xdo_delay
+        self.enable_xsel = enable_xsel
+        self.text_injection = text_injection or TextInjectionPolicy()
+        self.geometry_cache = WindowGeometryCache(display,
+                                                  watch=cache_geometry)
+        self.processes = ProcessMetadataCache(self._get_process_metadata)
+        self.paste_strategy = paste_strategy
+        self.selection = SelectionOwner(display)
 
         # compute and cache {atom_name: atom_value} dict once to save us from
         # having to repeatedly query X for this data.
@@ -214,21 +239,25 @@ class XdoPlatformRpcs(AbstractAeneaPlatformRpcs):
         try:
             pid = self.libxdo.get_pid_window(window_id)
             properties['pid'] = pid
-            process = psutil.Process(pid)
-
-            try:
-                properties['executable'] = process.exe()
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-            try:
-                properties['cmdline'] = process.cmdline()
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
+            properties.update(self.processes.get(pid, window_id))
         except Exception as e:
-            self.logger.error('failed to get process context: %s' % e)
+            self.logger.error('failed to get process context: %s', e)
 
         return properties
 
+    def _get_process_metadata(self, pid):
+        metadata = {}
+        process = psutil.Process(pid)
+        try:
+            metadata['executable'] = process.exe()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        try:
+            metadata['cmdline'] = process.cmdline()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        return metadata
+
     def key_press(self, key=None, modifiers=(), direction='press', count=1,
                   count_delay=None):
         assert key is not None
@@ -259,8 +288,67 @@ class XdoPlatformRpcs(AbstractAeneaPlatformRpcs):
 
             time.sleep(delay_millis / 1000)  # emulate xdotool sleep
 
-    def write_text(self, text):
-        self.libxdo.enter_text_window(0, text, self.xdotool_delay*1000)
+    def can_paste(self):
+        '''Pasting needs the in-process selection owner or, failing that,
+           xsel (enable_xsel).'''
+        return ((self.paste_strategy == 'selection' and
+                 self.selection.available) or self.enable_xsel)
+
+    def write_text(self, text, paste=False):
+        if not text:
+            return
+
+        window_class = None
+        if self.text_injection.needs_window_class:
+            window_class = self._get_window_class()
+
+        if (paste or self.text_injection.should_paste(text, window_class)) and (
+                self.can_paste()):
+            self.paste_text(text)
+        else:
+            for chunk in self.text_injection.chunks(text, window_class):
+                self.libxdo.enter_text_window(
+                    0, chunk, self.xdotool_delay*1000)
+
+    def paste_text(self, text):
+        if self.paste_strategy == 'selection' and self.selection.available:
+            self.selection.paste(text, lambda: self.libxdo.click_window(
+                0, _MOUSE_BUTTONS['middle']))
+            return
+
+        # same dance as the xdotool backend: back up PRIMARY into SECONDARY,
+        # middle click paste our text, then clear and restore.
+        subprocess.call(['xsel', '-x'])
+        xsel = subprocess.Popen(['xsel', '-i'], stdin=subprocess.PIPE)
+        xsel.communicate(text)
+        self.libxdo.click_window(0, _MOUSE_BUTTONS['middle'])
+        subprocess.call(['xsel', '-c'])
+        subprocess.call(['xsel', '-x'])
+
+    def set_clipboard(self, text, selection='clipboard'):
+        self.selection.set(text, selection)
+
+    def get_clipboard(self, selection='clipboard'):
+        return self.selection.get(selection)
+
+    def _get_window_class(self):
+        try:
+            window_id = self.libxdo.get_focused_window_sane()
+        except Exception as error:
+            self.logger.error('failed to get window class error=%s', error)
+            return None
+
+        def query():
+            try:
+                window = self.display.create_resource_object('window',
+                                                             window_id)
+                window_class = window.get_wm_class()
+            except Exception as error:
+                self.logger.error('failed to get window class error=%s',
+                                  error)
+                return None
+            return window_class[1] if window_class is not None else None
+        return self.geometry_cache.window_class(window_id, query)
 
     def click_mouse(self, button, direction='click', count=1, count_delay=None):
         delay_millis = 0 if count_delay is None or count < 2 else count_delay
@@ -289,33 +377,39 @@ class XdoPlatformRpcs(AbstractAeneaPlatformRpcs):
     def _get_geometry(self, window_id=None):
         if window_id is None:
             window_id = self.libxdo.get_focused_window_sane()
-        window_location = self.libxdo.get_window_location(window_id)
-        window_size = self.libxdo.get_window_size(window_id)
-        return {
-            'x': int(window_location.x),
-            'y': int(window_location.y),
-            'screen': window_location.screen.display,
-            'height': int(window_size.height),
-            'width': int(window_size.width),
-        }
+
+        def query():
+            window_location = self.libxdo.get_window_location(window_id)
+            window_size = self.libxdo.get_window_size(window_id)
+            return {
+                'x': int(window_location.x),
+                'y': int(window_location.y),
+                'screen': window_location.screen.display,
+                'height': int(window_size.height),
+                'width': int(window_size.width),
+            }
+        return self.geometry_cache.geometry(window_id, query)
 
     def move_mouse(self, x, y, reference='absolute', proportional=False,
                    phantom=None):
-        original_location = self.libxdo.get_mouse_location()
-        geo = self._get_geometry()
+        if phantom is not None:
+            original_location = self.libxdo.get_mouse_location()
+
+        # only look up the window geometry when the reference needs it.
+        geo = None
+        if reference == 'relative_active':
+            geo = self._get_geometry(self.libxdo.get_active_window())
+        elif proportional:
+            geo = self._get_geometry()
 
         if proportional:
             x = int(geo['width'] * x)
             y = int(geo['height'] * y)
 
         if reference == 'absolute':
-            x = x if x > 0 else x
-            y = y if y > 0 else y
             self.libxdo.move_mouse(x, y)
         elif reference == 'relative_active':
-            window_location = self.libxdo.get_window_location(
-                    self.libxdo.get_active_window())
-            self.libxdo.move_mouse(window_location.x + x, window_location.y + y)
+            self.libxdo.move_mouse(geo['x'] + x, geo['y'] + y)
         elif reference == 'relative':
             self.libxdo.move_mouse_relative(x, y)
         else:
@@ -330,5 +424,5 @@ class XdoPlatformRpcs(AbstractAeneaPlatformRpcs):
         try:
             subprocess.Popen(['notify-send', message])
         except Exception as e:
-            self.logger.warn('failed to start notify-send process: %s' % e)
+            self.logger.warn('failed to start notify-send process: %s', e)
 
@@ -1,11 +1,18 @@
 import logging
 import os
+import signal
 import subprocess
+import threading
 
 import time
 
 import config
 from server.core import AbstractAeneaPlatformRpcs
+from server.linux_x11.selection import SelectionOwner
+from server.linux_x11.text_injection import TextInjectionPolicy
+from server.linux_x11.window_geometry import WindowGeometryCache
+from server.optimizer import ALL_OPTIMIZATIONS
+from server.process_cache import ProcessMetadataCache
 
 _MOUSE_BUTTONS = {
     'left': 1,
@@ -149,22 +156,35 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
     """
     Implement all of Aenea's RPCs via shelling out to xdotool, xsel, and xprop
     """
+    optimizations = ALL_OPTIMIZATIONS
+
     def __init__(self, config, xdotool='xdotool'):
         super(XdotoolPlatformRpcs, self).__init__(
             logger=logging.getLogger('aenea.XdotoolPlatformRpcs'))
 
         self.xdotool = xdotool
         self.xdotool_delay = getattr(config, 'XDOTOOL_DELAY', 0)
+        self.text_injection = TextInjectionPolicy.from_config(config)
+        self.geometry_cache = WindowGeometryCache(
+            watch=getattr(config, 'CACHE_WINDOW_GEOMETRY', True))
+        self.processes = ProcessMetadataCache(self.get_process_metadata)
+        self.paste_strategy = getattr(config, 'PASTE_STRATEGY', 'selection')
+        self.selection = SelectionOwner()
+        # processes typing input right now, killed by interrupt().
+        self._children = set()
+        self._children_lock = threading.Lock()
 
     def run_command(self, command, executable=None):
         executable = executable or self.xdotool
         command_string = '%s %s' % (executable, command)
-        self.logger.debug(command_string)
-        os.system(command_string)
+        self.logger.debug('%s', command_string)
+        self.metrics.increment('subprocess_spawns', executable=executable)
+        self._spawn(command_string)
 
     def read_command(self, command, executable=None):
         executable = executable or self.xdotool
-        self.logger.debug('%s %s | <server>' % (executable, command))
+        self.logger.debug('%s %s | <server>', executable, command)
+        self.metrics.increment('subprocess_spawns', executable=executable)
         with os.popen('%s %s' % (executable, command), 'r') as fd:
             rval = fd.read()
         return rval
@@ -173,9 +193,68 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
                       executable=None):
         executable = executable or self.xdotool
         self.logger.debug(
-                'echo \'%s\' | %s %s' % (message, executable, arguments))
-        with os.popen('%s %s' % (executable, arguments), 'w') as fd:
-            fd.write(message)
+                'echo \'%s\' | %s %s', message, executable, arguments)
+        self.metrics.increment('subprocess_spawns', executable=executable)
+        self._spawn('%s %s' % (executable, arguments), message)
+
+    def _spawn(self, command_string, message=None):
+        '''runs command_string through the shell and waits for it, writing
+           message to its stdin if given. It gets a process group of its own
+           so that interrupt() can kill the shell along with its children.'''
+        process = subprocess.Popen(
+            command_string, shell=True, preexec_fn=os.setsid,
+            stdin=subprocess.PIPE if message is not None else None)
+        with self._children_lock:
+            self._children.add(process)
+        try:
+            process.communicate(message)
+        finally:
+            with self._children_lock:
+                self._children.discard(process)
+
+    def interrupt(self):
+        '''kill the xdotool processes that are still typing.'''
+        with self._children_lock:
+            children = list(self._children)
+        for process in children:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except OSError:
+                # exited in the meantime
+                pass
+
+    batch_argument = '_xdotool'
+
+    def start_batch(self):
+        return []
+
+    def finish_batch(self, batch):
+        self.flush_xdotool(batch)
+
+    def discard_batch(self, batch):
+        del batch[:]
+
+    def compile_actions(self, actions):
+        '''macros that only press keys, click and move the mouse to absolute
+           coordinates become a single xdotool command line.'''
+        commands = []
+        for method, parameters, optional in actions:
+            if parameters or not self._accumulates(method, optional):
+                return None
+            getattr(self, method)(_xdotool=commands, **optional)
+        return ' '.join(commands)
+
+    def _accumulates(self, method, optional):
+        '''whether an action only adds to the batch's xdotool command.'''
+        if method in ('key_press', 'click_mouse'):
+            return True
+        return (method == 'move_mouse' and
+                optional.get('reference', 'absolute') == 'absolute' and
+                not optional.get('proportional') and
+                optional.get('x', 0) > 0 and optional.get('y', 0) > 0)
+
+    def run_compiled(self, compiled):
+        self.run_command(compiled)
 
     def flush_xdotool(self, actions):
         if actions:
@@ -190,9 +269,8 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
         '''Returns the window id and title of the active window.'''
 
         self.flush_xdotool(_xdotool)
-        window_id = self.read_command('getactivewindow')
-        if window_id:
-            window_id = int(window_id)
+        window_id = self.get_active_window_id()
+        if window_id is not None:
             window_title = self.read_command(
                     'getwindowname %i' % window_id
             ).strip()
@@ -200,18 +278,45 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
         else:
             return None, None
 
+    def get_active_window_id(self):
+        '''Returns the id of the active window or None.'''
+        def query():
+            window_id = self.read_command('getactivewindow')
+            return int(window_id) if window_id.strip() else None
+        return self.geometry_cache.active_window(query)
+
     def get_geometry(self, window_id=None, _xdotool=None):
         self.flush_xdotool(_xdotool)
         if window_id is None:
-            window_id, _ = self.get_active_window()
-        geometry = self.read_command('getwindowgeometry --shell %i' % window_id)
-        geometry = geometry.strip().split('\n')
-        geo = dict([val.lower()
-                    for val in line.split('=')]
-                   for line in geometry)
-        geo = dict((key, int(value)) for (key, value) in geo.iteritems())
-        relevant_keys = 'x', 'y', 'width', 'height', 'screen'
-        return dict((key, geo[key]) for key in relevant_keys)
+            window_id = self.get_active_window_id()
+
+        def query():
+            geometry = self.read_command(
+                'getwindowgeometry --shell %i' % window_id)
+            geometry = geometry.strip().split('\n')
+            geo = dict([val.lower()
+                        for val in line.split('=')]
+                       for line in geometry)
+            geo = dict((key, int(value)) for (key, value) in geo.iteritems())
+            relevant_keys = 'x', 'y', 'width', 'height', 'screen'
+            return dict((key, geo[key]) for key in relevant_keys)
+        return self.geometry_cache.geometry(window_id, query)
+
+    def get_window_class(self, window_id=None):
+        '''Returns the class of the window (the cls of get_context) or None.'''
+        if window_id is None:
+            window_id = self.get_active_window_id()
+            if window_id is None:
+                return None
+
+        def query():
+            wm_class = self.read_command('-id %i WM_CLASS' % window_id,
+                                         'xprop')
+            if ' = ' not in wm_class:
+                return None
+            classes = wm_class.split(' = ', 1)[1].strip().split('", "')
+            return classes[-1].strip('"')
+        return self.geometry_cache.window_class(window_id, query)
 
     def transform_relative_mouse_event(self, event):
         geo = self.get_geometry()
@@ -244,32 +349,38 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
                     properties['cls_name'] = window_class_name[1:]
                     properties['cls'] = window_class[:-1]
 
-        # Sigh...
-        properties['executable'] = None
         properties['executable'] = None
         if 'pid' in properties:
-            try:
-                proc_command = '/proc/%s/exe' % properties['pid']
-                properties['executable'] = os.readlink(proc_command)
-            except OSError:
-                ps = self.read_command('%s' % properties['pid'], executable='ps')
-                ps = ps.split('\n')[1:]
-                if ps:
-                    try:
-                        properties['executable'] = ps[0].split()[4]
-                    except Exception:
-                        pass
-
-            try:
-                cmdline_path = '/proc/%s/cmdline' % properties['pid']
-                with open(cmdline_path) as fd:
-                    properties['cmdline'] = fd.read().replace('\x00', ' ').strip()
-            except (IOError, OSError):
-                pass
+            properties.update(self.processes.get(properties['pid'], window_id))
         else:
-            self.logger.warn('pid not set. properties: %s' % properties)
+            self.logger.warn('pid not set. properties: %s', properties)
         return properties
 
+    def get_process_metadata(self, pid):
+        '''Looks up the executable and command line of process pid. Called
+           through self.processes, which caches the result.'''
+        metadata = {}
+        # Sigh...
+        try:
+            proc_command = '/proc/%s/exe' % pid
+            metadata['executable'] = os.readlink(proc_command)
+        except OSError:
+            ps = self.read_command('%s' % pid, executable='ps')
+            ps = ps.split('\n')[1:]
+            if ps:
+                try:
+                    metadata['executable'] = ps[0].split()[4]
+                except Exception:
+                    pass
+
+        try:
+            cmdline_path = '/proc/%s/cmdline' % pid
+            with open(cmdline_path) as fd:
+                metadata['cmdline'] = fd.read().replace('\x00', ' ').strip()
+        except (IOError, OSError):
+            pass
+        return metadata
+
     def pause(self, amount, _xdotool=None):
         '''pause amount in ms.'''
         if _xdotool is not None:
@@ -277,12 +388,14 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
         else:
             time.sleep(amount / 1000.)
 
-    def notify(self, message):
+    def notify(self, message, _xdotool=None):
         '''Send a message to the notification daemon via notify-send.'''
+        self.flush_xdotool(_xdotool)
         try:
+            self.metrics.increment('subprocess_spawns', executable='notify-send')
             subprocess.Popen(['notify-send', message])
         except Exception as e:
-            self.logger.warn('failed to start notify-send process: %s' % e)
+            self.logger.warn('failed to start notify-send process: %s', e)
 
     def move_mouse(self, x, y, reference='absolute', proportional=False,
                    phantom=None, _xdotool=None):
@@ -294,13 +407,16 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
         moves. Negative coordinates are allowed for all references; in the
         case of absolute they will be clamped to 0.'''
 
-        geo = self.get_geometry()
+        # only proportional and relative_active moves depend on the active
+        # window, and both are answered from the geometry cache if possible.
         if proportional:
+            geo = self.get_geometry(_xdotool=_xdotool)
             x = geo['width'] * x
             y = geo['height'] * y
         command = _MOUSE_MOVE_COMMANDS[reference]
         if command == 'mousemove_active':
-            command = 'mousemove --window %i' % self.get_active_window()[0]
+            self.flush_xdotool(_xdotool)
+            command = 'mousemove --window %i' % self.get_active_window_id()
 
         if x <= 0 or y <= 0:
             commands = ['%s -- %f %f' % (command, x, y)]
@@ -313,7 +429,7 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
         # To avoid headaches down the road with argparse, we don't chain commands
         # if we need to use -- since it would block future flags from being
         # interpreted.
-        if _xdotool is not None and x >= 0 and y >= 0:
+        if _xdotool is not None and x > 0 and y > 0:
             _xdotool.extend(commands)
         else:
             self.flush_xdotool(_xdotool)
@@ -346,41 +462,75 @@ class XdotoolPlatformRpcs(AbstractAeneaPlatformRpcs):
             self.run_command(command)
 
 
+    def can_paste(self):
+        '''pasting needs the in-process selection owner or, failing that,
+           xsel (config.ENABLE_XSEL).'''
+        return ((self.paste_strategy == 'selection' and
+                 self.selection.available) or config.ENABLE_XSEL)
+
     def write_text(self, text, paste=False, _xdotool=None):
         '''send text formatted exactly as written to active window. If paste
            is True, will use X11 PRIMARY clipboard to paste the text instead
-           of typing it. See config.ENABLE_XSEL documentation for more
-           information on this.'''
+           of typing it. Text longer than config.PASTE_THRESHOLD is pasted
+           as well. Text is typed if pasting is impossible, see can_paste.'''
 
         # Workaround for https://github.com/jordansissel/xdotool/pull/29
         if text:
-            if paste and config.ENABLE_XSEL:
-                # swap primary and secondary X11 clipboards so we can
-                # restore after paste
-                self.run_command('-x', executable='xsel')
-
-                # copy the pasted text to the clipboard
-                self.write_command(text, arguments='-i', executable='xsel')
-
-                # paste by simulating midde click
-                # TODO: can we do this even in programs that don't have a
-                #     middle click?
-                #     if not, we may need a blacklist of buggy programs.
-                self.click_mouse(2, _xdotool=_xdotool)
+            window_class = None
+            if self.text_injection.needs_window_class:
                 self.flush_xdotool(_xdotool)
+                window_class = self.get_window_class()
 
-                # nuke the text we selected
-                self.run_command('-c', executable='xsel')
-
-                # restore the previous clipboard contents
-                self.run_command('-x', executable='xsel')
+            if (paste or
+                    self.text_injection.should_paste(text, window_class)) and (
+                    self.can_paste()):
+                self.paste_text(text, _xdotool=_xdotool)
             else:
                 self.flush_xdotool(_xdotool)
+                for chunk in self.text_injection.chunks(text, window_class):
+                    self.write_command(
+                            chunk,
+                            arguments='type --file - --delay %d' % self.xdotool_delay
+                    )
+
+    def paste_text(self, text, _xdotool=None):
+        '''paste text through the PRIMARY selection, restoring whatever was
+           selected before.'''
+        if self.paste_strategy == 'selection' and self.selection.available:
+            self.flush_xdotool(_xdotool)
+            self.selection.paste(text, lambda: self.click_mouse(2))
+            return
+
+        # swap primary and secondary X11 clipboards so we can
+        # restore after paste
+        self.run_command('-x', executable='xsel')
+
+        # copy the pasted text to the clipboard
+        self.write_command(text, arguments='-i', executable='xsel')
+
+        # paste by simulating midde click
+        # TODO: can we do this even in programs that don't have a
+        #     middle click?
+        #     if not, we may need a blacklist of buggy programs.
+        self.click_mouse(2, _xdotool=_xdotool)
+        self.flush_xdotool(_xdotool)
 
-                self.write_command(
-                        text,
-                        arguments='type --file - --delay %d' % self.xdotool_delay
-                )
+        # nuke the text we selected
+        self.run_command('-c', executable='xsel')
+
+        # restore the previous clipboard contents
+        self.run_command('-x', executable='xsel')
+
+    def set_clipboard(self, text, selection='clipboard', _xdotool=None):
+        '''make text the contents of selection ('clipboard', 'primary' or
+           'secondary').'''
+        self.flush_xdotool(_xdotool)
+        self.selection.set(text, selection)
+
+    def get_clipboard(self, selection='clipboard', _xdotool=None):
+        '''return the text in selection, or None.'''
+        self.flush_xdotool(_xdotool)
+        return self.selection.get(selection)
 
     def key_press(self, key=None, modifiers=(), direction='press', count=1,
                   count_delay=None, _xdotool=None):
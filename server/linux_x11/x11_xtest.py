@@ -0,0 +1,663 @@
+#!/usr/bin/python
+
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import array
+import os
+import subprocess
+import time
+
+import Xlib.X
+import Xlib.XK
+import Xlib.display
+import Xlib.ext.xtest
+
+from server.core import AbstractAeneaPlatformRpcs
+from server.linux_x11.keycode_pool import KeycodePool
+from server.linux_x11.selection import SelectionOwner
+from server.linux_x11.text_injection import TextInjectionPolicy
+from server.linux_x11.window_geometry import WindowGeometryCache
+from server.optimizer import ALL_OPTIMIZATIONS
+from server.process_cache import ProcessMetadataCache
+
+_MOUSE_BUTTONS = {
+    'left': 1,
+    'middle': 2,
+    'right': 3,
+    'wheelup': 4,
+    'wheeldown': 5
+    }
+
+
+# Additional X properties that we'd like to expose via get_context()
+_X_PROPERTIES = {
+    '_NET_WM_DESKTOP': 'desktop',
+    'WM_WINDOW_ROLE': 'role',
+    '_NET_WM_WINDOW_TYPE': 'type',
+    '_NET_WM_PID': 'pid',
+    'WM_LOCALE_NAME': 'locale',
+    'WM_CLIENT_MACHINE': 'client_machine',
+    'WM_NAME': 'name'
+}
+
+
+# Queue entry that binds a pool keycode to a keysym, see KeycodePool.
+_REMAP = 'remap'
+
+
+# Keysyms of characters write_text types that are not named after themselves.
+_CHARACTER_KEYSYMS = {
+    '\n': 'Return',
+    '\t': 'Tab',
+}
+
+
+_MOD_TRANSLATION = {
+    'alt': 'Alt_L',
+    'shift': 'Shift_L',
+    'control': 'Control_L',
+    'super': 'Super_L',
+    'hyper': 'Hyper_L',
+    'meta': 'Meta_L',
+    'win': 'Super_L',
+    'flag': 'Super_L',
+    }
+
+
+_KEY_TRANSLATION = {
+    'ampersand': 'ampersand',
+    'apostrophe': 'apostrophe',
+    'apps': 'Menu',
+    'asterisk': 'asterisk',
+    'at': 'at',
+    'backslash': 'backslash',
+    'backspace': 'BackSpace',
+    'backtick': 'grave',
+    'bar': 'bar',
+    'caret': 'asciicircum',
+    'colon': 'colon',
+    'comma': 'comma',
+    'del': 'Delete',
+    'delete': 'Delete',
+    'dollar': 'dollar',
+    'dot': 'period',
+    'dquote': 'quotedbl',
+    'enter': 'Return',
+    'equal': 'equal',
+    'exclamation': 'exclam',
+    'hash': 'numbersign',
+    'hyphen': 'minus',
+    'langle': 'less',
+    'lbrace': 'braceleft',
+    'lbracket': 'bracketleft',
+    'lparen': 'parenleft',
+    'minus': 'minus',
+    'npadd': 'KP_Add',
+    'npdec': 'KP_Decimal',
+    'npdiv': 'KP_Divide',
+    'npmul': 'KP_Multiply',
+    'percent': 'percent',
+    'pgdown': 'Next',
+    'pgup': 'Prior',
+    'plus': 'plus',
+    'question': 'question',
+    'rangle': 'greater',
+    'rbrace': 'braceright',
+    'rbracket': 'bracketright',
+    'rparen': 'parenright',
+    'semicolon': 'semicolon',
+    'shift': 'Shift_L',
+    'slash': 'slash',
+    'space': 'space',
+    'squote': 'apostrophe',
+    'tilde': 'asciitilde',
+    'underscore': 'underscore',
+    'win': 'Super_L',
+    }
+
+
+def update_key_translation(translation):
+    caps_keys = [
+        'left',
+        'right',
+        'up',
+        'down',
+        'home',
+        'end',
+        'tab',
+        'insert',
+        'escape'
+        ]
+    caps_keys.extend('f%i' % i for i in xrange(1, 13))
+    for key in caps_keys:
+        translation[key] = key[0].upper() + key[1:]
+    for index in xrange(10):
+        translation['np%i' % index] = 'KP_%i' % index
+    for c in range(ord('a'), ord('z')) + range(ord('0'), ord('9')):
+        translation[chr(c)] = chr(c)
+        translation[chr(c).upper()] = chr(c).upper()
+update_key_translation(_KEY_TRANSLATION)
+
+
+def character_keysym(character):
+    '''Returns the keysym that types the (unicode) character.'''
+    if character in _CHARACTER_KEYSYMS:
+        return Xlib.XK.string_to_keysym(_CHARACTER_KEYSYMS[character])
+    code = ord(character)
+    # Latin-1 keysyms equal their code point, everything else has a keysym
+    # in the Unicode range.
+    if 0x20 <= code <= 0x7e or 0xa0 <= code <= 0xff:
+        return code
+    return 0x01000000 + code
+
+
+class XtestPlatformRpcs(AbstractAeneaPlatformRpcs):
+    """
+    Aenea RPC implementation that fakes input through the XTEST extension
+    over a direct python-xlib connection. Keysyms are translated to keycodes
+    with a table built from the keyboard mapping; characters missing from it
+    are typed through a pool of spare keycodes. All events of an RPC
+    (or of a whole multiple_actions batch) are written to the connection
+    together and submitted with a single round trip.
+    """
+    optimizations = ALL_OPTIMIZATIONS
+
+    # seconds to wait for the MappingNotify of a pool keycode remap.
+    mapping_timeout = 0.1
+
+    def __init__(self, display=None, xtest_delay=0, enable_xsel=False,
+                 text_injection=None, cache_geometry=True,
+                 paste_strategy='selection', **kwargs):
+        """
+        :param str display: X display to connect to. None uses $DISPLAY.
+        :param int xtest_delay: Pause between typed characters in ms.
+        :param bool enable_xsel: Allow write_text to paste via xsel. See
+         config.ENABLE_XSEL.
+        :param TextInjectionPolicy text_injection: When to paste instead of
+         type and how to chunk typed text.
+        :param bool cache_geometry: Cache window geometry between moves,
+         invalidated by X events. See WindowGeometryCache.
+        :param str paste_strategy: 'selection' to paste by owning PRIMARY
+         in process, 'xsel' to paste through xsel. See
+         config.PASTE_STRATEGY.
+        :param kwargs:
+        """
+        super(XtestPlatformRpcs, self).__init__(**kwargs)
+
+        self.display = Xlib.display.Display(display)
+        if not self.display.has_extension('XTEST'):
+            raise RuntimeError('X server does not support the XTEST extension')
+        self.root = self.display.screen().root
+
+        self.xtest_delay = xtest_delay
+        self.enable_xsel = enable_xsel
+        self.text_injection = text_injection or TextInjectionPolicy()
+        self.geometry_cache = WindowGeometryCache(display,
+                                                  watch=cache_geometry)
+        self.processes = ProcessMetadataCache(self._get_process_metadata)
+        self.paste_strategy = paste_strategy
+        self.selection = SelectionOwner(display)
+
+        self.x_atoms = {
+            name: self.display.intern_atom(name) for name in _X_PROPERTIES
+        }
+        self.net_active_window = self.display.intern_atom('_NET_ACTIVE_WINDOW')
+        self.keycode_pool = KeycodePool()
+        self._mapping_changed = False
+        self.load_keymap()
+
+    def load_keymap(self):
+        '''Builds the {keysym: (keycode, shifted)} table from the keyboard
+           mapping. The unshifted binding of a keysym wins. Keycodes without
+           any keysym go to the keycode pool and are left out.'''
+        first = self.display.display.info.min_keycode
+        count = self.display.display.info.max_keycode - first + 1
+        mapping = dict(
+            (first + offset, keysyms) for (offset, keysyms) in
+            enumerate(self.display.get_keyboard_mapping(first, count)))
+        self.keycode_pool.update(mapping)
+        pooled = self.keycode_pool.keycodes
+
+        keymap = {}
+        for keycode, keysyms in sorted(mapping.iteritems()):
+            if keycode in pooled:
+                continue
+            for index, keysym in enumerate(keysyms[:2]):
+                if keysym != Xlib.X.NoSymbol and keysym not in keymap:
+                    keymap[keysym] = (keycode, index == 1)
+        self.keymap = keymap
+        self.shift_keycode = self._shift_keycode()
+
+    def _shift_keycode(self):
+        '''Keycode pressed to type shifted keysyms: Shift_L, Shift_R or
+           else whatever key the shift modifier is bound to.'''
+        for keysym in (Xlib.XK.XK_Shift_L, Xlib.XK.XK_Shift_R):
+            if keysym in self.keymap:
+                return self.keymap[keysym][0]
+        shift_keys = self.display.get_modifier_mapping()[Xlib.X.ShiftMapIndex]
+        for keycode in shift_keys:
+            if keycode:
+                return keycode
+        raise RuntimeError('keyboard mapping has no Shift key (neither '
+                           'Shift_L, Shift_R nor a key bound to the shift '
+                           'modifier)')
+
+    def _check_mapping(self):
+        '''Reloads the keymap if the keyboard mapping changed. MappingNotify is
+           delivered to every client, so there is nothing to select.'''
+        while self.display.pending_events():
+            if self._keyboard_mapping_event(self.display.next_event()):
+                self._mapping_changed = True
+        if self._mapping_changed:
+            self._mapping_changed = False
+            self.load_keymap()
+
+    def _keyboard_mapping_event(self, event):
+        return (event.type == Xlib.X.MappingNotify and
+                event.request == Xlib.X.MappingKeyboard)
+
+    def _wait_for_remap(self, keycode):
+        '''Waits until the X server announced the new binding of keycode, so
+           that the key event typing it is not handled with the old one.
+           Other keyboard mapping changes seen meanwhile are left to
+           _check_mapping.'''
+        deadline = time.time() + self.mapping_timeout
+        while True:
+            while self.display.pending_events():
+                event = self.display.next_event()
+                if not self._keyboard_mapping_event(event):
+                    continue
+                if event.first_keycode == keycode and event.count == 1:
+                    return
+                self._mapping_changed = True
+            if time.time() >= deadline:
+                self.logger.warn('no MappingNotify for keycode %i after '
+                                 '%.3fs, typing anyway', keycode,
+                                 self.mapping_timeout)
+                return
+            time.sleep(0.001)
+
+    batch_argument = '_xtest'
+
+    def start_batch(self):
+        self._check_mapping()
+        return []
+
+    def finish_batch(self, batch):
+        self.flush_events(batch)
+
+    def discard_batch(self, batch):
+        del batch[:]
+        self.keycode_pool.unpin()
+
+    def flush_events(self, events):
+        '''Writes the queued events to the connection and waits until the X
+           server has processed them. Pauses are carried out by the server
+           through the XTEST delay field instead of sleeping here.'''
+        if not events:
+            return
+        delay = 0
+        for event_type, detail, x, y in events:
+            if event_type is None:
+                delay += detail
+                continue
+            if event_type == _REMAP:
+                # (_REMAP, keycode, keysym, 0).  The events before it are
+                # submitted along with the remap.
+                self.display.change_keyboard_mapping(detail, [(x, x)])
+                self.display.sync()
+                self._wait_for_remap(detail)
+                continue
+            root = self.root if event_type == Xlib.X.MotionNotify else 0
+            Xlib.ext.xtest.fake_input(
+                self.display, event_type, detail, time=int(delay), root=root,
+                x=int(x), y=int(y))
+            delay = 0
+        self.display.sync()
+        del events[:]
+        self.keycode_pool.unpin()
+        if delay:
+            time.sleep(delay / 1000.)
+
+    def _submit(self, events, _xtest):
+        if _xtest is not None:
+            _xtest.extend(events)
+        else:
+            self.flush_events(events)
+
+    def _keycode(self, keysym):
+        try:
+            return self.keymap[keysym]
+        except KeyError:
+            return None, False
+
+    def _key_events(self, name, events):
+        '''Returns (down, up) events of the named key. Keysyms the keymap
+           lacks are bound to a pool keycode, appending the remap to events.
+           Returns None if the pool has nothing left to rebind.'''
+        keysym = Xlib.XK.string_to_keysym(name)
+        if keysym == Xlib.X.NoSymbol and len(name) == 1:
+            keysym = character_keysym(name)
+        if keysym == Xlib.X.NoSymbol:
+            raise ValueError('invalid "key" parameter: "%s"' % name)
+        keycode, shifted = self._keycode(keysym)
+        if keycode is None:
+            keycode, remap = self.keycode_pool.bind(keysym)
+            if keycode is None:
+                return None
+            if remap:
+                events.append((_REMAP, keycode, keysym, 0))
+        down = [(Xlib.X.KeyPress, keycode, 0, 0)]
+        up = [(Xlib.X.KeyRelease, keycode, 0, 0)]
+        if shifted:
+            down = ([(Xlib.X.KeyPress, self.shift_keycode, 0, 0)] + down +
+                    [(Xlib.X.KeyRelease, self.shift_keycode, 0, 0)])
+        return down, up
+
+    def _pause_event(self, amount):
+        return (None, amount, 0, 0)
+
+    def server_info(self, _xtest=None):
+        return {
+            'window_manager': 'idk',
+            'operating_system': 'linux',
+            'platform': 'linux',
+            'display': 'X11',
+            'server': 'x11_xtest',
+            'server_version': 1
+        }
+
+    def _get_active_window(self):
+        def query():
+            active = self.root.get_full_property(self.net_active_window,
+                                                 Xlib.X.AnyPropertyType)
+            if active is not None and len(active.value) and active.value[0]:
+                return int(active.value[0])
+            focus = self.display.get_input_focus().focus
+            return getattr(focus, 'id', None)
+        return self.geometry_cache.active_window(query)
+
+    def _get_geometry(self, window_id=None):
+        if window_id is None:
+            window_id = self._get_active_window()
+
+        def query():
+            window = self.display.create_resource_object('window', window_id)
+            geometry = window.get_geometry()
+            origin = self.root.translate_coords(window, 0, 0)
+            return {
+                'x': int(origin.x),
+                'y': int(origin.y),
+                'screen': self.display.get_default_screen(),
+                'height': int(geometry.height),
+                'width': int(geometry.width),
+            }
+        return self.geometry_cache.geometry(window_id, query)
+
+    def _get_window_class(self):
+        window_id = self._get_active_window()
+
+        def query():
+            try:
+                window = self.display.create_resource_object('window',
+                                                             window_id)
+                window_class = window.get_wm_class()
+            except Exception as error:
+                self.logger.error('failed to get window class error=%s',
+                                  error)
+                return None
+            return window_class[1] if window_class is not None else None
+        return self.geometry_cache.window_class(window_id, query)
+
+    def _get_process_metadata(self, pid):
+        metadata = {}
+        try:
+            metadata['executable'] = os.readlink('/proc/%s/exe' % pid)
+        except OSError:
+            pass
+        try:
+            with open('/proc/%s/cmdline' % pid) as fd:
+                metadata['cmdline'] = fd.read().rstrip('\x00').split('\x00')
+        except (IOError, OSError):
+            pass
+        return metadata
+
+    def get_context(self, _xtest=None):
+        self.flush_events(_xtest)
+        try:
+            window_id = self._get_active_window()
+            window = self.display.create_resource_object('window', window_id)
+            properties = {'id': window_id}
+
+            window_class = window.get_wm_class()
+            if window_class is not None:
+                properties['cls_name'] = window_class[0]
+                properties['cls'] = window_class[1]
+
+            window_title = window.get_wm_name()
+            if window_title is not None:
+                properties['title'] = window_title
+
+            for atom_name, atom in self.x_atoms.items():
+                queried_property = window.get_full_property(atom, 0)
+                if queried_property is not None:
+                    value = queried_property.value
+                    if type(value) == array.array:
+                        value = value.tolist()
+                        if not len(value):
+                            continue
+                        value = value[0]
+                    properties[_X_PROPERTIES[atom_name]] = str(value)
+        except Exception as error:
+            self.logger.error('failed to get active window error=%s', error)
+            return {}
+
+        if 'pid' in properties:
+            properties.update(self.processes.get(int(properties['pid']),
+                                                 window_id))
+        return properties
+
+    def key_press(self, key=None, modifiers=(), direction='press', count=1,
+                  count_delay=None, _xtest=None):
+        assert key is not None
+        if _xtest is None:
+            self._check_mapping()
+
+        delay = 0 if count_delay is None or count < 2 else count_delay
+        names = ([_MOD_TRANSLATION.get(mod, mod) for mod in modifiers] +
+                 [_KEY_TRANSLATION.get(key, key)])
+        events = []
+        keys = [self._key_events(name, events) for name in names]
+        if None in keys and _xtest:
+            # the batch pins the pool keycodes it uses; submit it to free
+            # them up and bind all over again.
+            self.flush_events(_xtest)
+            events = []
+            keys = [self._key_events(name, events) for name in names]
+        if None in keys:
+            raise ValueError('no keycode left for "key" parameter: "%s"' %
+                             names[keys.index(None)])
+        modifiers, (down, up) = keys[:-1], keys[-1]
+        if direction == 'press':
+            press = down + up
+        elif direction == 'down':
+            press = down
+        elif direction == 'up':
+            press = up
+        else:
+            raise ValueError('invalid "direction" parameter: "%s"' % direction)
+
+        for mod_down, _ in modifiers:
+            events.extend(mod_down)
+        for index in xrange(count):
+            if index and delay:
+                events.append(self._pause_event(delay))
+            events.extend(press)
+        for _, mod_up in reversed(modifiers):
+            events.extend(mod_up)
+        self._submit(events, _xtest)
+
+    def _type_events(self, text, events):
+        '''Appends the events typing text to events. Characters the keymap
+           lacks are bound to pool keycodes first; if the pool has nothing
+           left to rebind, events is submitted to free it up.'''
+        for character in text:
+            keysym = character_keysym(character)
+            keycode, shifted = self._keycode(keysym)
+            if keycode is None:
+                keycode, remap = self.keycode_pool.bind(keysym)
+                if keycode is None:
+                    self.flush_events(events)
+                    keycode, remap = self.keycode_pool.bind(keysym)
+                if keycode is None:
+                    self.logger.warn('no keycode left to type %r, skipping '
+                                     'it', character)
+                    continue
+                if remap:
+                    events.append((_REMAP, keycode, keysym, 0))
+            if shifted:
+                events.append((Xlib.X.KeyPress, self.shift_keycode, 0, 0))
+            events.append((Xlib.X.KeyPress, keycode, 0, 0))
+            events.append((Xlib.X.KeyRelease, keycode, 0, 0))
+            if shifted:
+                events.append((Xlib.X.KeyRelease, self.shift_keycode, 0, 0))
+            if self.xtest_delay:
+                events.append(self._pause_event(self.xtest_delay))
+
+    def can_paste(self):
+        '''Pasting needs the in-process selection owner or, failing that,
+           xsel (enable_xsel).'''
+        return ((self.paste_strategy == 'selection' and
+                 self.selection.available) or self.enable_xsel)
+
+    def write_text(self, text, paste=False, _xtest=None):
+        if not text:
+            return
+        if _xtest is None:
+            self._check_mapping()
+
+        window_class = None
+        if self.text_injection.needs_window_class:
+            window_class = self._get_window_class()
+
+        if (paste or self.text_injection.should_paste(text, window_class)) and (
+                self.can_paste()):
+            self.paste_text(text, _xtest=_xtest)
+        else:
+            for chunk in self.text_injection.chunks(text, window_class):
+                events = _xtest if _xtest is not None else []
+                self._type_events(chunk, events)
+                if _xtest is None:
+                    self.flush_events(events)
+
+    def paste_text(self, text, _xtest=None):
+        self.flush_events(_xtest)
+        if self.paste_strategy == 'selection' and self.selection.available:
+            self.selection.paste(text, lambda: self.click_mouse('middle'))
+            return
+
+        # same dance as the other backends: back up PRIMARY into SECONDARY,
+        # middle click paste our text, then clear and restore.
+        subprocess.call(['xsel', '-x'])
+        xsel = subprocess.Popen(['xsel', '-i'], stdin=subprocess.PIPE)
+        xsel.communicate(text)
+        self.click_mouse('middle')
+        subprocess.call(['xsel', '-c'])
+        subprocess.call(['xsel', '-x'])
+
+    def set_clipboard(self, text, selection='clipboard', _xtest=None):
+        self.flush_events(_xtest)
+        self.selection.set(text, selection)
+
+    def get_clipboard(self, selection='clipboard', _xtest=None):
+        self.flush_events(_xtest)
+        return self.selection.get(selection)
+
+    def click_mouse(self, button, direction='click', count=1, count_delay=None,
+                    _xtest=None):
+        delay = 0 if count_delay is None or count < 2 else count_delay
+
+        if button in _MOUSE_BUTTONS:
+            button = _MOUSE_BUTTONS[button]
+        else:
+            try:
+                button = int(button)
+            except ValueError:
+                raise ValueError('invalid "button" parameter: "%s"' % button)
+
+        down = [(Xlib.X.ButtonPress, button, 0, 0)]
+        up = [(Xlib.X.ButtonRelease, button, 0, 0)]
+        if direction == 'click':
+            click = down + up
+        elif direction == 'down':
+            click = down
+        elif direction == 'up':
+            click = up
+        else:
+            raise ValueError('invalid "direction" parameter: "%s"' % direction)
+
+        events = []
+        for index in xrange(count):
+            if index and delay:
+                events.append(self._pause_event(delay))
+            events.extend(click)
+        self._submit(events, _xtest)
+
+    def move_mouse(self, x, y, reference='absolute', proportional=False,
+                   phantom=None, _xtest=None):
+        geo = None
+        if reference == 'relative_active' or proportional:
+            # the batch so far may have switched windows.
+            self.flush_events(_xtest)
+            geo = self._get_geometry()
+
+        if proportional:
+            x = int(geo['width'] * x)
+            y = int(geo['height'] * y)
+
+        if reference == 'absolute':
+            move = (Xlib.X.MotionNotify, False, x, y)
+        elif reference == 'relative_active':
+            move = (Xlib.X.MotionNotify, False, geo['x'] + x, geo['y'] + y)
+        elif reference == 'relative':
+            move = (Xlib.X.MotionNotify, True, x, y)
+        else:
+            raise ValueError('invalid "reference" parameter "%s"' % reference)
+
+        if phantom is None:
+            self._submit([move], _xtest)
+            return
+
+        self.flush_events(_xtest)
+        original = self.root.query_pointer()
+        self.flush_events([
+            move,
+            (Xlib.X.ButtonPress, _MOUSE_BUTTONS[phantom], 0, 0),
+            (Xlib.X.ButtonRelease, _MOUSE_BUTTONS[phantom], 0, 0),
+            (Xlib.X.MotionNotify, False, original.root_x, original.root_y)])
+
+    def pause(self, amount, _xtest=None):
+        '''pause amount in ms.'''
+        if _xtest is not None:
+            _xtest.append(self._pause_event(amount))
+        else:
+            time.sleep(amount / 1000.)
+
+    def notify(self, message, _xtest=None):
+        self.flush_events(_xtest)
+        try:
+            subprocess.Popen(['notify-send', message])
+        except Exception as e:
+            self.logger.warn('failed to start notify-send process: %s', e)
@@ -0,0 +1,112 @@
+import collections
+import logging
+import threading
+
+DEFAULT_QUEUE_SIZE = 10000
+
+_formatter = logging.Formatter()
+
+
+class QueueHandler(logging.Handler):
+    """
+    Logging handler that only appends records to a queue; a QueueListener
+    formats and writes them on its own thread.  The message is not formatted
+    here, so the arguments of a record are rendered by the listener (after
+    the call returned) and must not be mutated by the caller.  When the
+    queue is full the record is dropped and counted rather than blocking the
+    thread that logged it.
+    """
+    def __init__(self, listener, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param QueueListener listener:
+        :param int queue_size: Records buffered before new ones are dropped.
+        """
+        logging.Handler.__init__(self)
+        self.listener = listener
+        self.queue_size = queue_size
+        self.dropped = 0
+
+    def createLock(self):
+        # appending to a deque is atomic, there is nothing to serialize.
+        self.lock = None
+
+    def emit(self, record):
+        if record.exc_info:
+            # tracebacks reference frames that are gone by the time the
+            # listener gets to them.
+            record.exc_text = _formatter.formatException(record.exc_info)
+            record.exc_info = None
+        if len(self.listener.records) >= self.queue_size:
+            self.dropped += 1
+            return
+        self.listener.records.append(record)
+        if self.listener.idle:
+            self.listener.wake.set()
+
+
+class QueueListener(object):
+    """
+    Hands the records of a QueueHandler to handlers on a background thread.
+    The thread only sleeps when the queue is empty, so a burst of records
+    costs the threads logging them no more than an append each.
+    """
+    def __init__(self, handlers):
+        """
+        :param list handlers: Handlers that format and write the records.
+         Each still applies its own level.
+        """
+        self.handlers = list(handlers)
+        self.records = collections.deque()
+        self.idle = False
+        self.wake = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='aenea-log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                record = self.records.popleft()
+            except IndexError:
+                if self._stopping:
+                    return
+                self.idle = True
+                self.wake.clear()
+                # a record appended before idle was set did not wake us.
+                if not self.records:
+                    self.wake.wait(1)
+                self.idle = False
+                continue
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        """
+        Write every record queued so far, then stop the thread.
+        """
+        if not self._thread.is_alive():
+            return
+        self._stopping = True
+        self.wake.set()
+        self._thread.join()
+        for handler in self.handlers:
+            handler.flush()
+
+
+def install(logger, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Move the handlers of logger behind a queue.
+
+    :param logging.Logger logger:
+    :param int queue_size: Records buffered before new ones are dropped.
+    :return: the listener writing to logger's former handlers and the
+     handler that replaced them.
+    :rtype: (QueueListener, QueueHandler)
+    """
+    listener = QueueListener(logger.handlers)
+    handler = QueueHandler(listener, queue_size)
+    logger.handlers = [handler]
+    return listener, handler
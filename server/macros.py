@@ -0,0 +1,64 @@
+# Key of a placeholder in the actions of a macro: {"macro_argument": name}
+# is replaced by the argument name of invoke_macro.
+ARGUMENT = 'macro_argument'
+
+
+class Macro(object):
+    """
+    An action list registered with AeneaServer.register_macro.
+    """
+    def __init__(self, actions):
+        """
+        :param list actions: (method, parameters, optional) triples.  Any
+         value in parameters or optional (nested ones included) may be a
+         placeholder.
+        """
+        self.actions = [tuple(action) for action in actions]
+        self.arguments = frozenset(_placeholders(self.actions))
+        # set by AeneaServer for macros without arguments, see
+        # AbstractAeneaPlatformRpcs.compile_actions.
+        self.compiled = None
+
+    def bind(self, arguments=None):
+        """
+        :param dict arguments: Values for the placeholders.
+        :return: the actions with every placeholder replaced by its value.
+        :rtype: list
+        :raises ValueError: if a placeholder has no value.
+        """
+        if not self.arguments:
+            return self.actions
+        arguments = arguments or {}
+        missing = self.arguments.difference(arguments)
+        if missing:
+            raise ValueError('missing macro arguments: %s' %
+                             ', '.join(sorted(missing)))
+        return [_bind(action, arguments) for action in self.actions]
+
+
+def _is_placeholder(value):
+    return isinstance(value, dict) and value.keys() == [ARGUMENT]
+
+
+def _placeholders(value):
+    if _is_placeholder(value):
+        yield value[ARGUMENT]
+    elif isinstance(value, dict):
+        for item in value.itervalues():
+            for name in _placeholders(item):
+                yield name
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            for name in _placeholders(item):
+                yield name
+
+
+def _bind(value, arguments):
+    if _is_placeholder(value):
+        return arguments[value[ARGUMENT]]
+    elif isinstance(value, dict):
+        return dict((key, _bind(item, arguments))
+                    for (key, item) in value.iteritems())
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_bind(item, arguments) for item in value)
+    return value
@@ -0,0 +1,199 @@
+import functools
+import os
+import threading
+import time
+
+
+# Upper bounds (in seconds) of the latency histogram buckets.  The last,
+# implicit bucket is +Inf.
+DEFAULT_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LatencyHistogram(object):
+    """
+    Fixed bucket latency histogram.  Buckets are stored non-cumulatively and
+    only converted to Prometheus' cumulative representation when exported.
+    """
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def cumulative(self):
+        """
+        :return: list of (upper_bound, cumulative_count) pairs. The upper
+         bound of the last bucket is the string '+Inf'.
+        :rtype: list
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'buckets': self.cumulative()
+        }
+
+
+class AeneaMetrics(object):
+    """
+    Collects per RPC call counts, error counts and latency histograms, plus
+    arbitrary labelled counters (e.g. subprocess spawns) reported by the
+    platform implementations.  All methods are thread safe.
+    """
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._rpcs = {}
+        self._counters = {}
+
+    def wrap(self, name, func):
+        """
+        Wrap func so that every call is recorded under the RPC name <name>.
+        Wrapping an already wrapped function is a no-op.
+        :param str name: RPC name to record calls under.
+        :param func: callable to wrap.
+        :return: wrapped callable.
+        """
+        if getattr(func, '_aenea_metrics', None) is self:
+            return func
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.time()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self.observe(name, time.time() - start, error=True)
+                raise
+            self.observe(name, time.time() - start)
+            return result
+
+        timed._aenea_metrics = self
+        return timed
+
+    def observe(self, name, duration, error=False):
+        """
+        Record a single call of RPC <name> that took <duration> seconds.
+        """
+        with self._lock:
+            stats = self._rpcs.get(name)
+            if stats is None:
+                stats = self._rpcs[name] = {
+                    'calls': 0,
+                    'errors': 0,
+                    'latency': LatencyHistogram(self.buckets)
+                }
+            stats['calls'] += 1
+            if error:
+                stats['errors'] += 1
+            stats['latency'].observe(duration)
+
+    def increment(self, name, amount=1, **labels):
+        """
+        Increment the counter <name> with the given labels.
+        e.g. metrics.increment('subprocess_spawns', executable='xdotool')
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        """
+        Return a JSON serializable copy of all metrics.
+        :rtype: dict
+        """
+        with self._lock:
+            rpcs = dict(
+                (name, {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'latency': stats['latency'].to_dict()
+                })
+                for name, stats in self._rpcs.items())
+            counters = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                counters.setdefault(name, []).append(
+                    {'labels': dict(labels), 'value': value})
+        return {
+            'uptime': time.time() - self.started,
+            'rpcs': rpcs,
+            'counters': counters
+        }
+
+    def prometheus_text(self, prefix='aenea'):
+        """
+        Render all metrics in the Prometheus text exposition format.
+        :rtype: str
+        """
+        snapshot = self.snapshot()
+        rpcs = sorted(snapshot['rpcs'].items())
+        lines = []
+
+        lines.append('# TYPE %s_rpc_calls_total counter' % prefix)
+        for name, stats in rpcs:
+            lines.append('%s_rpc_calls_total{method="%s"} %d' %
+                         (prefix, name, stats['calls']))
+
+        lines.append('# TYPE %s_rpc_errors_total counter' % prefix)
+        for name, stats in rpcs:
+            lines.append('%s_rpc_errors_total{method="%s"} %d' %
+                         (prefix, name, stats['errors']))
+
+        lines.append('# TYPE %s_rpc_latency_seconds histogram' % prefix)
+        for name, stats in rpcs:
+            latency = stats['latency']
+            for bound, count in latency['buckets']:
+                lines.append(
+                    '%s_rpc_latency_seconds_bucket{method="%s",le="%s"} %d' %
+                    (prefix, name, bound, count))
+            lines.append('%s_rpc_latency_seconds_sum{method="%s"} %f' %
+                         (prefix, name, latency['sum']))
+            lines.append('%s_rpc_latency_seconds_count{method="%s"} %d' %
+                         (prefix, name, latency['count']))
+
+        for name, values in sorted(snapshot['counters'].items()):
+            lines.append('# TYPE %s_%s_total counter' % (prefix, name))
+            for value in values:
+                labels = ','.join(
+                    '%s="%s"' % item for item in sorted(value['labels'].items()))
+                lines.append('%s_%s_total{%s} %s' %
+                             (prefix, name, labels, value['value']))
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Atomically write the Prometheus text representation to <path>, which
+        makes the file suitable for node_exporter's textfile collector.
+        """
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as fd:
+            fd.write(self.prometheus_text())
+        os.rename(tmp_path, path)
@@ -0,0 +1,115 @@
+INTERPOLATIONS = {
+    'linear': lambda t: t,
+    # eases in and out of the movement (smoothstep)
+    'smooth': lambda t: t * t * (3 - 2 * t),
+}
+
+
+def path_actions(points, rate=60):
+    """
+    Turn the waypoints of a mouse_path RPC into the move_mouse, click_mouse
+    and pause actions that execute it.
+
+    :param list points: Waypoints, dicts with the (all optional) keys:
+
+      - x, y, reference, proportional: where to move the pointer, as for
+        move_mouse.  A waypoint without x and y does not move.
+      - duration: milliseconds the movement from the previous waypoint takes.
+        The pointer is moved there in steps, rate times a second.  0 (the
+        default) moves it there at once.
+      - interpolation: how the steps are spaced, one of INTERPOLATIONS
+        (default 'linear').
+      - button, direction, count, count_delay: click, press or release a
+        button once the pointer arrived, as for click_mouse.
+      - pause: milliseconds to wait before the next waypoint.
+
+     Movements are interpolated between waypoints with the same reference
+     and proportional flag, and for relative moves.  Other movements jump.
+    :param int rate: Pointer moves per second while interpolating.
+    :return: (method, parameters, optional) triples.
+    :rtype: list
+    """
+    actions = []
+    previous = None
+    for point in points:
+        if 'x' in point or 'y' in point:
+            actions.extend(_movement(previous, point, rate))
+            previous = point
+        if point.get('button') is not None:
+            actions.append(('click_mouse', [], dict(
+                (key, point[key]) for key in
+                ('button', 'direction', 'count', 'count_delay')
+                if key in point)))
+        if point.get('pause'):
+            actions.append(('pause', [], {'amount': point['pause']}))
+    return actions
+
+
+def expand_paths(actions):
+    """
+    :param list actions: (method, parameters, optional) triples.
+    :return: actions with every mouse_path replaced by its path_actions.
+    :rtype: list
+    """
+    if not any(method == 'mouse_path' for (method, _, _) in actions):
+        return actions
+    expanded = []
+    for action in actions:
+        method, parameters, optional = action
+        if method == 'mouse_path':
+            expanded.extend(path_actions(*parameters, **optional))
+        else:
+            expanded.append(action)
+    return expanded
+
+
+def _target(point):
+    return {'x': point.get('x', 0),
+            'y': point.get('y', 0),
+            'reference': point.get('reference', 'absolute'),
+            'proportional': point.get('proportional', False)}
+
+
+def _movement(previous, point, rate):
+    target = _target(point)
+    interpolation = point.get('interpolation', 'linear')
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError(
+            'invalid "interpolation" parameter: "%s"' % interpolation)
+    steps = int(point.get('duration', 0) * rate / 1000.0)
+    if steps < 2:
+        return [('move_mouse', [], target)]
+
+    if target['reference'] == 'relative':
+        start = {'x': 0, 'y': 0}
+    elif previous is not None:
+        start = _target(previous)
+        if (start['reference'], start['proportional']) != (
+                target['reference'], target['proportional']):
+            return [('move_mouse', [], target)]
+    else:
+        # nowhere to interpolate from.
+        return [('move_mouse', [], target)]
+
+    interval = point['duration'] / float(steps)
+    interpolate = INTERPOLATIONS[interpolation]
+    actions = []
+    moved = {'x': 0, 'y': 0}
+    for step in xrange(1, steps + 1):
+        fraction = interpolate(step / float(steps))
+        position = dict(target)
+        for axis in ('x', 'y'):
+            position[axis] = (start[axis] +
+                              (target[axis] - start[axis]) * fraction)
+            if not target['proportional']:
+                position[axis] = int(round(position[axis]))
+        if target['reference'] == 'relative':
+            # move by the difference between two samples, so that rounding
+            # does not add up.
+            delta = dict(position, x=position['x'] - moved['x'],
+                         y=position['y'] - moved['y'])
+            moved = position
+            position = delta
+        actions.append(('pause', [], {'amount': interval}))
+        actions.append(('move_mouse', [], position))
+    return actions
@@ -0,0 +1,85 @@
+import logging
+import time
+
+from server.core import AbstractAeneaPlatformRpcs
+
+
+class NullPlatformRpcs(AbstractAeneaPlatformRpcs):
+    """
+    Platform implementation that emulates nothing.  Useful for benchmarking
+    and testing the server itself without an X server.  Calls are optionally
+    recorded and may be slowed down to simulate a real backend.  Every input
+    RPC is logged at debug level, as the xdotool backend logs its commands.
+    """
+    def __init__(self, record=False, latency=0, context=None, logger=None):
+        """
+        :param bool record: If True, append (method, kwargs) to self.calls for
+         every input RPC.
+        :param float latency: Seconds each input RPC sleeps for.
+        :param dict context: Value returned by get_context.
+        :param logger:
+        """
+        super(NullPlatformRpcs, self).__init__(
+            logger=logger or logging.getLogger('aenea.NullPlatformRpcs'))
+        self.record = record
+        self.latency = latency
+        self.context = context or {
+            'id': 1,
+            'title': 'aenea null platform',
+            'cls_name': 'aenea',
+            'cls': 'Null',
+            'executable': '/bin/true'
+        }
+        self.calls = []
+        self.clipboards = {}
+
+    def _call(self, method, **kwargs):
+        self.logger.debug('%s %s', method, kwargs)
+        if self.record:
+            self.calls.append((method, kwargs))
+        if self.latency:
+            time.sleep(self.latency)
+
+    def server_info(self):
+        return {
+            'window_manager': 'none',
+            'operating_system': 'none',
+            'platform': 'null',
+            'display': 'none',
+            'server': 'aenea_null',
+            'server_version': 1
+        }
+
+    def get_context(self):
+        return dict(self.context)
+
+    def key_press(self, key=None, modifiers=(), direction='press', count=1,
+                  count_delay=None):
+        self._call('key_press', key=key, modifiers=modifiers,
+                   direction=direction, count=count, count_delay=count_delay)
+
+    def write_text(self, text, paste=False):
+        self._call('write_text', text=text, paste=paste)
+
+    def click_mouse(self, button, direction='click', count=1,
+                    count_delay=None):
+        self._call('click_mouse', button=button, direction=direction,
+                   count=count, count_delay=count_delay)
+
+    def move_mouse(self, x, y, reference='absolute', proportional=False,
+                   phantom=None):
+        self._call('move_mouse', x=x, y=y, reference=reference,
+                   proportional=proportional, phantom=phantom)
+
+    def pause(self, amount):
+        self._call('pause', amount=amount)
+
+    def notify(self, message):
+        self._call('notify', message=message)
+
+    def set_clipboard(self, text, selection='clipboard'):
+        self._call('set_clipboard', text=text, selection=selection)
+        self.clipboards[selection] = text
+
+    def get_clipboard(self, selection='clipboard'):
+        return self.clipboards.get(selection)
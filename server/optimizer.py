@@ -0,0 +1,164 @@
+import threading
+
+from server.metrics import AeneaMetrics
+
+# Transformations the optimizer knows.  Platforms list the ones they support
+# in AbstractAeneaPlatformRpcs.optimizations.
+MERGE_TEXT = 'merge_text'
+MERGE_KEY_REPEATS = 'merge_key_repeats'
+DROP_EMPTY_PAUSES = 'drop_empty_pauses'
+CANCEL_MODIFIER_RELEASES = 'cancel_modifier_releases'
+
+ALL_OPTIMIZATIONS = frozenset([
+    MERGE_TEXT, MERGE_KEY_REPEATS, DROP_EMPTY_PAUSES, CANCEL_MODIFIER_RELEASES
+])
+
+_MODIFIER_KEYS = frozenset([
+    'alt', 'shift', 'control', 'super', 'hyper', 'meta', 'win', 'flag'
+])
+
+
+def _key_press(optional):
+    """
+    :return: (key, modifiers, direction, count, count_delay) with the
+     defaults of key_press filled in.
+    """
+    return (optional.get('key'),
+            tuple(optional.get('modifiers') or ()),
+            optional.get('direction', 'press'),
+            optional.get('count', 1),
+            optional.get('count_delay'))
+
+
+class ActionOptimizer(object):
+    """
+    Peephole pass over the actions of a multiple_actions batch.  Rewrites
+    adjacent actions without reordering anything:
+
+      - merge_text: consecutive write_text calls (with the same paste flag)
+        become one.
+      - merge_key_repeats: consecutive presses of the same key with the same
+        modifiers and count_delay become one press with the summed count.
+      - drop_empty_pauses: pauses of 0 ms are dropped.
+      - cancel_modifier_releases: releasing a modifier and immediately
+        pressing it down again is dropped; the modifier stays held.
+
+    Only actions passed as keyword arguments ("optional") are touched.
+    """
+    def __init__(self, capabilities=ALL_OPTIMIZATIONS, metrics=None):
+        """
+        :param capabilities: Names of the transformations to apply.
+        :param AeneaMetrics metrics: Receives an actions_eliminated counter
+         per transformation.
+        """
+        self.capabilities = frozenset(capabilities) & ALL_OPTIMIZATIONS
+        self.metrics = metrics or AeneaMetrics()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.actions_in = 0
+        self.actions_out = 0
+        self.eliminated = dict((name, 0) for name in self.capabilities)
+
+    def optimize(self, actions):
+        """
+        :param list actions: (method, parameters, optional) triples.
+        :return: the rewritten list.
+        :rtype: list
+        """
+        eliminated = dict((name, 0) for name in self.capabilities)
+        result = []
+        for action in actions:
+            method, parameters, optional = action
+            previous = result[-1] if result else None
+            if parameters or previous is not None and previous[1]:
+                result.append(action)
+                continue
+
+            if (DROP_EMPTY_PAUSES in self.capabilities and
+                    method == 'pause' and optional.get('amount', 0) <= 0):
+                eliminated[DROP_EMPTY_PAUSES] += 1
+                continue
+
+            if previous is None or previous[0] != method:
+                result.append(action)
+                continue
+
+            if method == 'write_text' and MERGE_TEXT in self.capabilities:
+                merged = self._merge_text(previous[2], optional)
+                if merged is not None:
+                    result[-1] = (method, parameters, merged)
+                    eliminated[MERGE_TEXT] += 1
+                    continue
+
+            if method == 'key_press':
+                if (CANCEL_MODIFIER_RELEASES in self.capabilities and
+                        self._cancels(previous[2], optional)):
+                    result.pop()
+                    eliminated[CANCEL_MODIFIER_RELEASES] += 2
+                    continue
+                if MERGE_KEY_REPEATS in self.capabilities:
+                    merged = self._merge_key_press(previous[2], optional)
+                    if merged is not None:
+                        result[-1] = (method, parameters, merged)
+                        eliminated[MERGE_KEY_REPEATS] += 1
+                        continue
+
+            result.append(action)
+
+        with self._lock:
+            self.batches += 1
+            self.actions_in += len(actions)
+            self.actions_out += len(result)
+            for name, count in eliminated.iteritems():
+                self.eliminated[name] += count
+        for name, count in eliminated.iteritems():
+            if count:
+                self.metrics.increment('actions_eliminated', count,
+                                       transformation=name)
+        return result
+
+    def _merge_text(self, first, second):
+        allowed = set(['text', 'paste'])
+        if 'text' not in first or 'text' not in second:
+            return None
+        if set(first) - allowed or set(second) - allowed:
+            return None
+        if first.get('paste', False) != second.get('paste', False):
+            return None
+        merged = dict(first)
+        merged['text'] = first['text'] + second['text']
+        return merged
+
+    def _merge_key_press(self, first, second):
+        key, modifiers, direction, count, count_delay = _key_press(first)
+        other = _key_press(second)
+        if direction != 'press':
+            return None
+        if (other[:3] != (key, modifiers, direction) or
+                other[4] != count_delay):
+            return None
+        merged = dict(first)
+        merged['count'] = count + other[3]
+        return merged
+
+    def _cancels(self, first, second):
+        first, second = _key_press(first), _key_press(second)
+        return (first[0] in _MODIFIER_KEYS and first[0] == second[0] and
+                not first[1] and not second[1] and
+                (first[2], second[2]) == ('up', 'down') and
+                first[3] == second[3] == 1)
+
+    def stats(self):
+        """
+        :return: batches optimized, actions before and after, and actions
+         eliminated per transformation.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'actions_in': self.actions_in,
+                'actions_out': self.actions_out,
+                'eliminated': dict(self.eliminated),
+                'capabilities': sorted(self.capabilities)
+            }
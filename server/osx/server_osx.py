@@ -425,14 +425,9 @@ def key_press(
        'meta', and 'flag' (same as super). count is number of times to
        press it. count_delay delay in ms between presses.'''
 
-    logging.debug(("key = {key} modifiers = {modifiers} " +
-                  "direction = {direction} " +
-                  "count = {count} count_delay = {count_delay} ").
-                  format(modifiers=modifiers,
-                         direction=direction,
-                         count=count,
-                         count_delay=count_delay,
-                         key=key))
+    logging.debug('key = %s modifiers = %s direction = %s count = %s '
+                  'count_delay = %s', key, modifiers, direction, count,
+                  count_delay)
 
     if count_delay is None or count < 2:
         delay = 'delay 0.01'
@@ -493,7 +488,7 @@ def write_text(text, paste=False):
     '''send text formatted exactly as written to active window.  will use
        pbpaste clipboard to paste the text instead of typing it.'''
 
-    logging.debug("text = '%s' paste = %s" % (text, paste))
+    logging.debug("text = '%s' paste = %s", text, paste)
 
     if not text:
         return
@@ -618,7 +613,7 @@ def click_mouse(
     '''click the mouse button specified. button maybe one of 'right',
        'left', 'middle', 'wheeldown', 'wheelup'.'''
 
-    logging.debug("mouse click, button = "+button)
+    logging.debug('mouse click, button = %s', button)
     if count_delay is None or count < 2:
         delay = 0
     else:
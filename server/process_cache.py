@@ -0,0 +1,109 @@
+import collections
+import threading
+
+
+def process_start_time(pid):
+    """
+    Start time of process pid in clock ticks since boot, read from
+    /proc/<pid>/stat.  Together with the pid it identifies a process even
+    after its pid has been reused.
+
+    :return: start time, or None if the process is gone or /proc is not
+     available.
+    """
+    try:
+        with open('/proc/%s/stat' % pid) as fd:
+            stat = fd.read()
+    except (IOError, OSError):
+        return None
+    # the command name (field 2) may contain spaces and parentheses, so
+    # count fields from the last closing parenthesis. starttime is field 22.
+    try:
+        return int(stat.rsplit(')', 1)[1].split()[19])
+    except (IndexError, ValueError):
+        return None
+
+
+class ProcessMetadataCache(object):
+    """
+    Bounded LRU cache of per-process metadata (executable, cmdline, ...) for
+    get_context.  Entries are keyed by (pid, start time) so a reused pid is
+    never answered with the metadata of the process that used to own it.
+    Lookups that also pass the window id skip even the start time check as
+    long as the window still belongs to the same pid: a window can not
+    outlive the process that created it.
+    """
+    def __init__(self, load, max_size=128, start_time=process_start_time,
+                 max_windows=512):
+        """
+        :param load: Called as load(pid) on a cache miss.  Returns a dict of
+         metadata.
+        :param int max_size: Maximum number of processes remembered.
+        :param start_time: Called as start_time(pid), see
+         process_start_time.  Processes whose start time is None are never
+         cached.
+        :param int max_windows: Maximum number of window ids remembered.
+         Closed windows are never reported, so the least recently used ones
+         are forgotten beyond this.
+        """
+        self.load = load
+        self.max_size = max_size
+        self.max_windows = max_windows
+        self.start_time = start_time
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        # window id -> (pid, start time), least recently used first.
+        self._windows = collections.OrderedDict()
+
+    def get(self, pid, window_id=None):
+        """
+        :return: a copy of the metadata of process pid.
+        :rtype: dict
+        """
+        with self._lock:
+            key = self._windows.get(window_id)
+            if key is not None and key[0] == pid and key in self._entries:
+                self._remember_window(window_id, key)
+                return self._hit(key)
+
+        key = (pid, self.start_time(pid))
+        with self._lock:
+            if key in self._entries:
+                self._remember_window(window_id, key)
+                return self._hit(key)
+            self.misses += 1
+
+        metadata = self.load(pid)
+        if key[1] is None:
+            return dict(metadata)
+
+        with self._lock:
+            self._entries[key] = metadata
+            self._remember_window(window_id, key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                for window, window_key in self._windows.items():
+                    if window_key == evicted:
+                        del self._windows[window]
+        return dict(metadata)
+
+    def _remember_window(self, window_id, key):
+        if window_id is None:
+            return
+        self._windows.pop(window_id, None)
+        self._windows[window_id] = key
+        while len(self._windows) > self.max_windows:
+            self._windows.popitem(last=False)
+
+    def _hit(self, key):
+        self.hits += 1
+        metadata = self._entries.pop(key)
+        self._entries[key] = metadata
+        return dict(metadata)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._windows.clear()
@@ -0,0 +1,155 @@
+import cProfile
+import functools
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+class AeneaProfiler(object):
+    """
+    Profiles a running server without having to restart it.  Two modes are
+    supported:
+
+      - cprofile: deterministic profiling of every call wrapped with
+        profiled() (AeneaServer wraps RPCs and the batches of its action
+        queue), on whichever thread makes it.  Each thread gets its own
+        profiler; they are merged into one pstats file.  Calls still running
+        when profiling stops are left out.
+      - sampling: a background thread periodically samples the stacks of all
+        other threads.  Output is in the collapsed stack format understood by
+        flamegraph.pl and speedscope.  Overhead is bounded by the interval.
+    """
+    modes = ('cprofile', 'sampling')
+
+    def __init__(self, output_dir=None, logger=None):
+        """
+        :param str output_dir: Directory profiles are written to. Defaults
+         to the current working directory.
+        :param logger:
+        """
+        self.output_dir = output_dir or os.getcwd()
+        self.logger = logger
+        self.mode = None
+        self.started = None
+        self._profiles = {}
+        self._profiles_lock = threading.Lock()
+        self._local = threading.local()
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+        self._samples = {}
+
+    @property
+    def running(self):
+        return self.mode is not None
+
+    def start(self, mode='cprofile', interval=0.005):
+        """
+        :param str mode: 'cprofile' or 'sampling'
+        :param float interval: seconds between samples in sampling mode.
+        """
+        if self.running:
+            raise RuntimeError('profiler already running (%s)' % self.mode)
+        if mode not in self.modes:
+            raise ValueError('invalid "mode" parameter: "%s"' % mode)
+
+        self.mode = mode
+        self.started = time.time()
+        if mode == 'cprofile':
+            with self._profiles_lock:
+                self._profiles = {}
+        else:
+            self._samples = {}
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(
+                target=self._sample_loop, args=(interval,))
+            self._sampler.daemon = True
+            self._sampler.start()
+
+    def stop(self):
+        """
+        Stop profiling and write the result to output_dir.
+        :return: path of the written profile.
+        :rtype: str
+        """
+        if not self.running:
+            raise RuntimeError('profiler is not running')
+
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))
+
+        if self.mode == 'cprofile':
+            with self._profiles_lock:
+                self.mode = None
+                profiles = [profile for (profile, active)
+                            in self._profiles.values() if not active[0]]
+                self._profiles = {}
+            path = os.path.join(self.output_dir, 'aenea-%s.pstats' % stamp)
+            stats = pstats.Stats(*(profiles or [cProfile.Profile()]))
+            stats.dump_stats(path)
+        else:
+            self._stop_sampling.set()
+            self._sampler.join()
+            self._sampler = None
+            path = os.path.join(self.output_dir, 'aenea-%s.collapsed' % stamp)
+            with open(path, 'w') as fd:
+                for stack, count in sorted(self._samples.items()):
+                    fd.write('%s %d\n' % (stack, count))
+
+        self.mode = None
+        return path
+
+    def profiled(self, function):
+        """
+        :return: function wrapped to be profiled while the cprofile mode is
+         running, on the thread calling it.  Calls nested in a profiled call
+         are profiled as part of it.
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if (self.mode != 'cprofile' or
+                    getattr(self._local, 'profiling', False)):
+                return function(*args, **kwargs)
+            ident = threading.current_thread().ident
+            with self._profiles_lock:
+                if self.mode == 'cprofile':
+                    if ident not in self._profiles:
+                        self._profiles[ident] = (cProfile.Profile(), [False])
+                    profile, active = self._profiles[ident]
+                    active[0] = True
+                else:
+                    # stopped in the meantime
+                    profile = None
+            if profile is None:
+                return function(*args, **kwargs)
+            self._local.profiling = True
+            profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._local.profiling = False
+                with self._profiles_lock:
+                    active[0] = False
+        return wrapper
+
+    def _sample_loop(self, interval):
+        own_ident = threading.current_thread().ident
+        while not self._stop_sampling.wait(interval):
+            names = dict((thread.ident, thread.name)
+                         for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('%s (%s:%d)' % (
+                        code.co_name, os.path.basename(code.co_filename),
+                        code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ';'.join(reversed(stack))
+                self._samples[key] = self._samples.get(key, 0) + 1
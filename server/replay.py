@@ -0,0 +1,151 @@
+#!/usr/bin/python
+
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Replays a trace recorded with the server's TRACE_FILE setting against a
+   platform backend and reports per RPC latency and throughput as JSON.
+   Requests go through the JSON-RPC dispatcher of a real AeneaServer, as in
+   benchmark.py. With --speed 1 (the default) calls are made with their
+   recorded timing, and the report includes how far the backend fell behind
+   that schedule; --speed 0 replays as fast as possible.
+
+   The X11 backends really type the recorded input, so use --xvfb unless
+   that is what you want. From the root of the aenea project:
+     python -m server.replay /path/to/aenea.trace --backend null
+     python -m server.replay /path/to/aenea.trace --xvfb --backend xdotool \\
+         --backend libxdo --speed 0'''
+
+import argparse
+import json
+import sys
+import time
+from os.path import join, dirname, realpath
+
+# enable server.core imports by adding the root of the aenea project to path
+sys.path.append(realpath(join(dirname(__file__), '..')))
+
+import jsonrpclib
+
+from server.benchmark import (make_platform, make_server, report,
+                              start_xvfb, summarize)
+from server.rpc_trace import read_trace
+
+BATCH_RPCS = ('multiple_actions', 'enqueue_actions')
+
+
+def count_actions(method, params):
+    '''Returns the number of input actions an RPC carries.'''
+    if method not in BATCH_RPCS:
+        return 1
+    if isinstance(params, dict):
+        return len(params.get('actions', ()))
+    return len(params[0]) if params else 0
+
+
+def replay(server, calls, speed=1.0, max_gap=5.0):
+    '''Feeds calls, (timestamp, method, params) tuples as returned by
+       read_trace, to server. speed scales the recorded timing (2 is twice
+       as fast, 0 as fast as possible). Pauses longer than max_gap seconds,
+       e.g. between two sessions in the same trace, are shortened to
+       max_gap.'''
+    durations = {}
+    errors = {}
+    lag = []
+    actions = 0
+    schedule = 0.0
+    previous = None
+    start = time.time()
+    for timestamp, method, params in calls:
+        if speed:
+            if previous is not None:
+                schedule += min(max(timestamp - previous, 0), max_gap) / speed
+            previous = timestamp
+            wait = start + schedule - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            lag.append(max(-wait, 0))
+
+        request = jsonrpclib.dumps(params, methodname=method, rpcid=1)
+        before = time.time()
+        response = server.server._marshaled_dispatch(request)
+        durations.setdefault(method, []).append(time.time() - before)
+        # JSON-RPC 1.0 responses carry "error": null on success.
+        if json.loads(response).get('error') is not None:
+            errors[method] = errors.get(method, 0) + 1
+        actions += count_actions(method, params)
+    # enqueue_actions returns before its batch was typed.
+    server.action_queue.drain()
+    elapsed = time.time() - start
+
+    results = {
+        'calls': len(calls),
+        'actions': actions,
+        'elapsed': elapsed,
+        'calls_per_second': len(calls) / elapsed if elapsed else None,
+        'actions_per_second': actions / elapsed if elapsed else None,
+        'errors': errors,
+        'methods': dict((method, summarize(values))
+                        for (method, values) in durations.items())
+    }
+    if lag:
+        results['schedule_lag'] = summarize(lag)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Aenea trace replay')
+    parser.add_argument('trace', help='Trace file recorded by the server.')
+    parser.add_argument(
+        '--backend', action='append', dest='backends',
+        choices=('null', 'xdotool', 'libxdo', 'xtest'),
+        help='Platform backend(s) to replay against (default null).')
+    parser.add_argument(
+        '--xvfb', action='store_true',
+        help='Run the X11 backends against a private Xvfb display.')
+    parser.add_argument(
+        '--speed', type=float, default=1.0,
+        help='Replay speed relative to the recording, 0 for maximum speed.')
+    parser.add_argument(
+        '--max-gap', type=float, default=5.0,
+        help='Longest pause between two calls in seconds.')
+    parser.add_argument(
+        '--limit', type=int, help='Only replay the first LIMIT calls.')
+    parser.add_argument(
+        '--output', help='Write JSON results here instead of stdout.')
+    arguments = parser.parse_args(argv)
+
+    calls = read_trace(arguments.trace)[:arguments.limit]
+    backends = arguments.backends or ['null']
+    xvfb = None
+    if arguments.xvfb:
+        xvfb = start_xvfb()
+    results = {}
+    try:
+        for backend in backends:
+            server = make_server(make_platform(backend))
+            results[backend] = replay(server, calls, arguments.speed,
+                                      arguments.max_gap)
+            server.server.server_close()
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    if len(backends) == 1:
+        report(backends[0], results[backends[0]], arguments.output)
+    else:
+        report(backends, results, arguments.output)
+
+if __name__ == '__main__':
+    main()
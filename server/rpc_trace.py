@@ -0,0 +1,70 @@
+import functools
+import json
+import threading
+import time
+
+
+class TraceRecorder(object):
+    """
+    Appends every RPC the server receives to a trace file so that real
+    dictation sessions can be replayed against a backend later (see
+    server/replay.py).  Each line is a compact JSON array
+    [timestamp, method, params] with params as the client sent them, so a
+    multiple_actions or enqueue_actions call carries its whole batch.
+    Recording happens before the RPC is dispatched; nested calls made by
+    multiple_actions are not recorded separately.
+    """
+    def __init__(self, path):
+        """
+        :param str path: Trace file, appended to if it exists.
+        """
+        self.path = path
+        self.records = 0
+        self._lock = threading.Lock()
+        # line buffered, so that a crashed session is still on disk.
+        self._file = open(path, 'ab', 1)
+
+    def record(self, method, params, timestamp=None):
+        line = json.dumps(
+            [timestamp or time.time(), method, params],
+            separators=(',', ':'))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + '\n')
+            self.records += 1
+
+    def wrap(self, dispatch):
+        """
+        :param dispatch: The JSON-RPC server's _dispatch(method, params).
+        :return: dispatch, recording every call before it is made.
+        """
+        @functools.wraps(dispatch)
+        def wrapper(method, params):
+            self.record(method, params)
+            return dispatch(method, params)
+        return wrapper
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_trace(path):
+    """
+    :param str path: Trace file written by TraceRecorder.
+    :return: (timestamp, method, params) tuples in the order they were
+     recorded.  A trailing line cut short by a crash is ignored.
+    :rtype: list
+    """
+    calls = []
+    with open(path, 'rb') as fd:
+        for line in fd:
+            try:
+                timestamp, method, params = json.loads(line)
+            except ValueError:
+                continue
+            calls.append((timestamp, method, params))
+    return calls
@@ -0,0 +1,306 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server.action_queue import ActionQueue, chunked, timed_steps
+from server.core import AeneaServer
+from server.test_core import RecordingPlatformRpcs
+
+
+class TestActionQueue(unittest.TestCase):
+    def setUp(self):
+        self.executed = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def execute(self, actions):
+        self.release.wait(5)
+        self.executed.append(actions)
+
+    def test_fifo(self):
+        queue = ActionQueue(self.execute)
+        self.release.clear()
+        self.assertEqual(queue.enqueue(['a']), 1)
+        queue.enqueue(['b'])
+        self.release.set()
+        queue.drain()
+        self.assertEqual(self.executed, [['a'], ['b']])
+
+    def test_sequence_order(self):
+        queue = ActionQueue(self.execute)
+        queue.enqueue(['2'], 2, 'stream')
+        queue.enqueue(['1'], 1, 'stream')
+        queue.enqueue(['other'], 0, 'other')
+        queue.enqueue(['0'], 0, 'stream')
+        # duplicates (e.g. a retried batch) are executed once.
+        queue.enqueue(['1'], 1, 'stream')
+        queue.drain()
+        self.assertEqual(self.executed, [['other'], ['0'], ['1'], ['2']])
+
+    def test_gap_timeout(self):
+        queue = ActionQueue(self.execute, gap_timeout=0.05)
+        queue.enqueue(['0'], 0, 'stream')
+        queue.enqueue(['2'], 2, 'stream')
+        queue.drain()
+        self.assertEqual(self.executed, [['0'], ['2']])
+        counters = queue.metrics.snapshot()['counters']
+        self.assertEqual(counters['skipped_sequence_numbers'][0]['value'], 1)
+
+    def test_errors_do_not_stop_the_queue(self):
+        queue = ActionQueue(lambda actions: self.executed.append(1 / actions))
+        queue.enqueue(0)
+        queue.enqueue(1)
+        queue.drain()
+        self.assertEqual(self.executed, [1])
+
+    def test_cancel(self):
+        queue = ActionQueue(self.execute)
+        self.release.clear()
+        queue.enqueue(['a'])
+        queue.enqueue(['b'])
+        queue.enqueue(['2'], 2, 'stream')
+        while not queue._busy:
+            time.sleep(0.001)
+        self.assertEqual(queue.cancel(), 3)
+        self.release.set()
+        queue.enqueue(['3'], 3, 'stream')
+        queue.drain()
+        # the executing step is finished, the rest dropped.
+        self.assertEqual(self.executed, [['a'], ['3']])
+        counters = queue.metrics.snapshot()['counters']
+        self.assertEqual(counters['cancelled_batches'][0]['value'], 3)
+
+
+class TestEnqueueActions(unittest.TestCase):
+    def test_effects_are_ordered(self):
+        platform = RecordingPlatformRpcs()
+        rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+        self.addCleanup(rpc_server.server_close)
+        AeneaServer(platform, rpc_server)
+        funcs = rpc_server.funcs
+
+        funcs['enqueue_actions']([('write_text', [], {'text': 'b'})], 1, 's')
+        funcs['enqueue_actions']([('write_text', [], {'text': 'a'})], 0, 's')
+        funcs['get_context']()
+        self.assertEqual(platform.calls, [
+            ('write_text', {'text': 'a'}),
+            ('write_text', {'text': 'b'}),
+            ('get_context', {})])
+
+    def test_timed_steps(self):
+        key = ('key_press', [], {'key': 'a'})
+        self.assertEqual(timed_steps([key]), [([key], 0)])
+        self.assertEqual(timed_steps([]), [([], 0)])
+        self.assertEqual(
+            timed_steps([key, ('pause', [], {'amount': 0}), key,
+                         ('pause', [250], {}), key,
+                         ('pause', [], {'amount': 100})]),
+            [([key, ('pause', [], {'amount': 0}), key], 0.25),
+             ([key], 0.1)])
+
+    def test_chunked_steps(self):
+        down = ('key_press', [], {'key': 'down', 'count': 25,
+                                  'count_delay': 20})
+        parts = chunked(down, key_chunk=10)
+        self.assertEqual([(part[2]['count'], wait) for part, wait in parts],
+                         [(10, 0.02), (10, 0.02), (5, 0.02)])
+        self.assertEqual(chunked(down), [(down, 0)])
+        text = ('write_text', [], {'text': 'abcde'})
+        self.assertEqual(
+            [part[2]['text'] for part, _ in chunked(text, text_chunk=2)],
+            ['ab', 'cd', 'e'])
+        self.assertEqual(chunked(('write_text', [], {'text': 'abcde',
+                                                     'paste': True}), 0, 2),
+                         [(('write_text', [], {'text': 'abcde',
+                                               'paste': True}), 0)])
+
+        key = ('key_press', [], {'key': 'a'})
+        steps = timed_steps([key, down, key], key_chunk=10)
+        self.assertEqual([len(step) for step, _ in steps], [2, 1, 2])
+        self.assertEqual(steps[0][0][0], key)
+        self.assertEqual(steps[2][0][1], key)
+
+
+class TestPauseScheduling(unittest.TestCase):
+    def setUp(self):
+        self.platform = RecordingPlatformRpcs()
+        rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+        self.addCleanup(rpc_server.server_close)
+        AeneaServer(self.platform, rpc_server)
+        self.funcs = rpc_server.funcs
+
+    def paused_batch(self, amount=300):
+        return [('write_text', [], {'text': 'a'}),
+                ('pause', [], {'amount': amount}),
+                ('write_text', [], {'text': 'b'})]
+
+    def timed(self, method, *args):
+        start = time.time()
+        self.funcs[method](*args)
+        return time.time() - start
+
+    def test_reads_served_during_queued_pause(self):
+        self.funcs['enqueue_actions'](self.paused_batch())
+        self.assertTrue(self.timed('get_context') < 0.2)
+        # input waits for the whole batch.
+        self.assertTrue(self.timed('key_press', 'x') > 0.1)
+        self.assertEqual([call[0] for call in self.platform.calls], [
+            'write_text', 'get_context', 'write_text', 'key_press'])
+
+    def test_reads_served_during_multiple_actions_pause(self):
+        thread = threading.Thread(target=self.funcs['multiple_actions'],
+                                  args=(self.paused_batch(),))
+        thread.start()
+        while not self.platform.calls:
+            time.sleep(0.001)
+        self.assertTrue(self.timed('get_context') < 0.2)
+        thread.join()
+        self.assertEqual([call[0] for call in self.platform.calls], [
+            'write_text', 'get_context', 'write_text'])
+
+    def test_pause_rpc(self):
+        self.funcs['enqueue_actions']([('write_text', [], {'text': 'a'})])
+        self.assertTrue(self.timed('pause', 50) >= 0.05)
+        self.assertEqual(self.platform.calls, [('write_text', {'text': 'a'})])
+
+    def test_errors_reach_the_caller(self):
+        self.assertRaises(ValueError, self.funcs['multiple_actions'], [
+            ('pause', [], {'amount': 1}),
+            ('click_mouse', [], {'button': 'invalid'}),
+            ('write_text', [], {'text': 'never'})])
+        self.assertEqual(self.platform.calls, [])
+
+
+class SlowPlatformRpcs(RecordingPlatformRpcs):
+    '''Presses keys at their count_delay until it is interrupted.'''
+    def __init__(self):
+        super(SlowPlatformRpcs, self).__init__()
+        self.interrupted = threading.Event()
+
+    def key_press(self, key=None, modifiers=(), direction='press', count=1,
+                  count_delay=None):
+        self.calls.append(('key_press', {'key': key, 'count': count}))
+        self.interrupted.wait(count * (count_delay or 0) / 1000.0)
+
+    def write_text(self, text):
+        # a millisecond per character
+        self.calls.append(('write_text', {'text': text}))
+        self.interrupted.wait(len(text) / 1000.0)
+
+    def interrupt(self):
+        self.interrupted.set()
+
+
+class TestCancelPending(unittest.TestCase):
+    # 50 presses 20 ms apart take a second to type.
+    down = ('key_press', [], {'key': 'down', 'count': 50, 'count_delay': 20})
+
+    def setUp(self):
+        self.platform = SlowPlatformRpcs()
+        rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+        self.addCleanup(rpc_server.server_close)
+        self.server = AeneaServer(self.platform, rpc_server)
+        self.funcs = rpc_server.funcs
+
+    def wait_for_input(self):
+        start = time.time()
+        while not self.platform.calls and time.time() - start < 5:
+            time.sleep(0.001)
+
+    def cancel_latency(self):
+        start = time.time()
+        self.funcs['cancel_pending']()
+        self.server.action_queue.drain()
+        return time.time() - start
+
+    def pressed(self):
+        return sum(call[1]['count'] for call in self.platform.calls
+                   if call[0] == 'key_press')
+
+    def test_cancel_queued_batches(self):
+        self.funcs['enqueue_actions']([self.down])
+        self.funcs['enqueue_actions']([('write_text', [], {'text': 'a'})])
+        self.wait_for_input()
+        self.assertEqual(self.funcs['cancel_pending'](), 2)
+        self.assertTrue(self.cancel_latency() < 0.1)
+        self.assertEqual(self.pressed(), 10)
+        self.assertEqual(self.funcs['cancel_pending'](), 0)
+
+    def test_cancel_without_interrupt(self):
+        # platforms that cannot abort input stop after the current part.
+        self.platform.interrupt = lambda: None
+        self.funcs['enqueue_actions']([self.down])
+        self.wait_for_input()
+        self.assertTrue(self.cancel_latency() < 0.5)
+        self.assertEqual(self.pressed(), 10)
+
+    def test_cancel_direct_key_press(self):
+        thread = threading.Thread(target=self.funcs['key_press'],
+                                  kwargs=self.down[2])
+        thread.start()
+        self.wait_for_input()
+        start = time.time()
+        self.funcs['cancel_pending']()
+        thread.join(5)
+        self.assertTrue(time.time() - start < 0.1)
+        self.assertEqual(self.pressed(), 10)
+
+    def test_cancel_during_pause(self):
+        thread = threading.Thread(target=self.funcs['multiple_actions'], args=(
+            [('write_text', [], {'text': 'a'}),
+             ('pause', [], {'amount': 1000}),
+             ('write_text', [], {'text': 'b'})],))
+        thread.start()
+        self.wait_for_input()
+        start = time.time()
+        self.funcs['cancel_pending']()
+        thread.join(5)
+        self.assertTrue(time.time() - start < 0.1)
+        self.assertEqual(self.platform.calls, [('write_text', {'text': 'a'})])
+
+    def test_cancel_stops_rest_of_step(self):
+        self.funcs['enqueue_actions']([('write_text', [], {'text': 'x' * 500}),
+                                       ('key_press', [], {'key': 'enter'})])
+        self.wait_for_input()
+        self.assertTrue(self.cancel_latency() < 0.1)
+        self.assertEqual([call[0] for call in self.platform.calls],
+                         ['write_text'])
+
+        # a direct batch is cancelled the same way.
+        thread = threading.Thread(target=self.funcs['multiple_actions'], args=(
+            [('write_text', [], {'text': 'x' * 500}),
+             ('key_press', [], {'key': 'enter'})],))
+        self.platform.interrupted.clear()
+        thread.start()
+        while len(self.platform.calls) < 2:
+            time.sleep(0.001)
+        self.funcs['cancel_pending']()
+        thread.join(5)
+        self.assertEqual([call[0] for call in self.platform.calls],
+                         ['write_text', 'write_text'])
+
+    def test_typed_in_parts(self):
+        self.funcs['key_press'](key='down', count=10)
+        self.funcs['multiple_actions']([('key_press', [], {'key': 'down',
+                                                           'count': 25})])
+        self.assertEqual([call[1]['count'] for call in self.platform.calls],
+                         [10, 10, 10, 5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server import optimizer
+from server.core import AeneaServer, AbstractAeneaPlatformRpcs
+
+
+class RecordingPlatformRpcs(AbstractAeneaPlatformRpcs):
+    '''Platform that records every call instead of emulating input.'''
+    def __init__(self):
+        super(RecordingPlatformRpcs, self).__init__()
+        self.calls = []
+
+    def server_info(self):
+        return {'platform': 'test'}
+
+    def get_context(self):
+        self.calls.append(('get_context', {}))
+        return {'title': 'test'}
+
+    def key_press(self, key=None, modifiers=(), direction='press', count=1,
+                  count_delay=None):
+        self.calls.append(('key_press', {'key': key, 'count': count}))
+
+    def write_text(self, text):
+        self.calls.append(('write_text', {'text': text}))
+
+    def click_mouse(self, button, direction='click', count=1,
+                    count_delay=None):
+        raise ValueError('invalid "button" parameter: "%s"' % button)
+
+
+class EchoPlugin(object):
+    def register_rpcs(self, server):
+        server.register_function(lambda message: message, 'echo')
+
+
+class TestAeneaServer(unittest.TestCase):
+    def setUp(self):
+        self.platform = RecordingPlatformRpcs()
+        self.rpc_server = SimpleJSONRPCServer(
+            ('127.0.0.1', 0), logRequests=False)
+        self.server = AeneaServer(
+            self.platform, self.rpc_server, plugins=[EchoPlugin()])
+
+    def tearDown(self):
+        self.rpc_server.server_close()
+
+    def call(self, method, *a, **kw):
+        return self.rpc_server.funcs[method](*a, **kw)
+
+    def test_multiple_actions(self):
+        self.call('multiple_actions', [
+            ('key_press', [], {'key': 'a', 'count': 2}),
+            ('write_text', [], {'text': 'hello'}),
+            ('unknown', [], {}),
+            ('write_text', [], {'text': 'never'}),
+        ])
+        self.assertEqual(self.platform.calls, [
+            ('key_press', {'key': 'a', 'count': 2}),
+            ('write_text', {'text': 'hello'}),
+        ])
+
+    def test_optimized_multiple_actions(self):
+        self.rpc_server.server_close()
+        self.platform = RecordingPlatformRpcs()
+        self.platform.optimizations = optimizer.ALL_OPTIMIZATIONS
+        self.rpc_server = SimpleJSONRPCServer(
+            ('127.0.0.1', 0), logRequests=False)
+        AeneaServer(self.platform, self.rpc_server)
+        self.call('multiple_actions', [
+            ('key_press', [], {'key': 'a'}),
+            ('key_press', [], {'key': 'a', 'count': 2}),
+            ('write_text', [], {'text': 'hel'}),
+            ('pause', [], {'amount': 0}),
+            ('write_text', [], {'text': 'lo'}),
+        ])
+        self.assertEqual(self.platform.calls, [
+            ('key_press', {'key': 'a', 'count': 3}),
+            ('write_text', {'text': 'hello'}),
+        ])
+        stats = self.call('get_optimizer_stats')
+        self.assertEqual((stats['actions_in'], stats['actions_out']), (5, 2))
+
+        # the recording platform of the other tests does not opt in.
+        self.assertEqual(self.server.optimizer.capabilities, frozenset())
+
+    def test_metrics(self):
+        self.call('multiple_actions', [
+            ('key_press', [], {'key': 'a'}),
+            ('key_press', [], {'key': 'b'}),
+        ])
+        self.call('echo', 'hi')
+        self.assertRaises(ValueError, self.call, 'click_mouse', 'bogus')
+
+        metrics = self.call('get_metrics')
+        rpcs = metrics['rpcs']
+        self.assertEqual(rpcs['multiple_actions']['calls'], 1)
+        self.assertEqual(rpcs['key_press']['calls'], 2)
+        self.assertEqual(rpcs['key_press']['latency']['count'], 2)
+        self.assertEqual(rpcs['key_press']['latency']['buckets'][-1],
+                         ('+Inf', 2))
+        self.assertEqual(rpcs['echo']['calls'], 1)
+        self.assertEqual(rpcs['click_mouse']['errors'], 1)
+        self.assertNotIn('get_context', rpcs)
+
+    def test_prometheus_text(self):
+        self.platform.metrics.increment('subprocess_spawns', executable='xdotool')
+        self.call('key_press', key='a')
+        text = self.server.metrics.prometheus_text()
+        self.assertIn('aenea_rpc_calls_total{method="key_press"} 1', text)
+        self.assertIn(
+            'aenea_rpc_latency_seconds_bucket{method="key_press",le="+Inf"} 1',
+            text)
+        self.assertIn(
+            'aenea_subprocess_spawns_total{executable="xdotool"} 1', text)
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.platform = RecordingPlatformRpcs()
+        self.rpc_server = SimpleJSONRPCServer(
+            ('127.0.0.1', 0), logRequests=False)
+        self.server = AeneaServer(
+            self.platform, self.rpc_server, profile_dir=self.profile_dir)
+
+    def tearDown(self):
+        self.rpc_server.server_close()
+        shutil.rmtree(self.profile_dir)
+
+    def test_cprofile(self):
+        funcs = self.rpc_server.funcs
+        funcs['start_profiling']()
+        self.assertRaises(RuntimeError, funcs['start_profiling'])
+        funcs['key_press'](key='a')
+        path = funcs['stop_profiling']()
+        self.assertTrue(path.endswith('.pstats'))
+        self.assertEqual(os.path.dirname(path), self.profile_dir)
+
+        stats = pstats.Stats(path)
+        self.assertTrue(any(func[2] == 'key_press' for func in stats.stats))
+
+    def test_cprofile_every_thread(self):
+        funcs = self.rpc_server.funcs
+        funcs['start_profiling']()
+        # executed on the action queue's worker thread
+        funcs['enqueue_actions']([('write_text', [], {'text': 'a'})])
+        self.server.action_queue.drain()
+        thread = threading.Thread(target=funcs['key_press'],
+                                  kwargs={'key': 'a'})
+        thread.start()
+        thread.join()
+        stats = pstats.Stats(funcs['stop_profiling']())
+        functions = set(func[2] for func in stats.stats)
+        self.assertIn('write_text', functions)
+        self.assertIn('key_press', functions)
+
+    def test_sampling(self):
+        funcs = self.rpc_server.funcs
+        funcs['start_profiling'](mode='sampling', interval=0.001)
+        time.sleep(0.05)
+        path = funcs['stop_profiling']()
+        self.assertTrue(path.endswith('.collapsed'))
+        with open(path) as fd:
+            lines = fd.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertRaises(RuntimeError, funcs['stop_profiling'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from server import logging_queue
+from server.core import AeneaLoggingManager
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.messages = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+        self.threads.add(threading.current_thread().name)
+
+
+class TestLoggingQueue(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('aenea.test_logging_queue')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.recording = RecordingHandler(logging.INFO)
+        self.logger.handlers = [self.recording]
+
+    def tearDown(self):
+        self.logger.handlers = []
+
+    def test_written_in_order_by_listener(self):
+        listener, handler = logging_queue.install(self.logger)
+        self.assertEqual(self.logger.handlers, [handler])
+        for index in range(100):
+            self.logger.info('record %s', index)
+        listener.stop()
+        self.assertEqual(self.recording.messages,
+                         ['record %i' % index for index in range(100)])
+        self.assertEqual(self.recording.threads, set(['aenea-log-writer']))
+
+    def test_handler_level_applies(self):
+        listener, _ = logging_queue.install(self.logger)
+        self.logger.debug('hidden')
+        self.logger.info('shown')
+        listener.stop()
+        self.assertEqual(self.recording.messages, ['shown'])
+
+    def test_formatting_deferred(self):
+        class Argument(object):
+            formatted = 0
+
+            def __str__(self):
+                Argument.formatted += 1
+                return 'argument'
+
+        listener, _ = logging_queue.install(self.logger)
+        listener.stop()
+        self.logger.info('%s', Argument())
+        self.assertEqual(Argument.formatted, 0)
+        self.assertEqual(self.recording.messages, [])
+
+    def test_full_queue_drops(self):
+        listener, handler = logging_queue.install(self.logger, queue_size=0)
+        self.logger.info('dropped')
+        listener.stop()
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(self.recording.messages, [])
+
+    def test_exception_rendered_when_logged(self):
+        listener, _ = logging_queue.install(self.logger)
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            self.logger.exception('failed')
+        listener.stop()
+        self.assertIn('ValueError: boom', self.recording.messages[0])
+
+
+class TestAeneaLoggingManager(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.directory, 'aenea.log')
+
+    def tearDown(self):
+        AeneaLoggingManager.flush()
+        logging.shutdown()
+        shutil.rmtree(self.directory)
+
+    def test_queued(self):
+        AeneaLoggingManager.configure(console_level='CRITICAL',
+                                      file_level='INFO',
+                                      log_file=self.log_file, queued=True)
+        logger = logging.getLogger('aenea.test')
+        logger.debug('not enabled')
+        logger.info('written %s', 1)
+        AeneaLoggingManager.flush()
+        with open(self.log_file) as fd:
+            lines = fd.readlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('written 1', lines[0])
+
+    def test_disabled_levels_rejected_by_logger(self):
+        AeneaLoggingManager.configure(level='WARNING', queued=True)
+        aenea = logging.getLogger(AeneaLoggingManager.aenea_logger_name)
+        self.assertFalse(aenea.isEnabledFor(logging.INFO))
+        AeneaLoggingManager.configure(console_level='WARNING',
+                                      file_level='DEBUG',
+                                      log_file=self.log_file)
+        self.assertTrue(aenea.isEnabledFor(logging.DEBUG))
+
+if __name__ == '__main__':
+    unittest.main()
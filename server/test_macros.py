@@ -0,0 +1,95 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server.core import AeneaServer
+from server.macros import Macro
+from server.null import NullPlatformRpcs
+
+
+class CompilingPlatformRpcs(NullPlatformRpcs):
+    '''Compiles batches of key presses into a string of their keys.'''
+    def compile_actions(self, actions):
+        if any(method != 'key_press' for (method, _, _) in actions):
+            return None
+        return ''.join(optional['key'] for (_, _, optional) in actions)
+
+    def run_compiled(self, compiled):
+        self._call('run_compiled', compiled=compiled)
+
+
+class TestMacro(unittest.TestCase):
+    def test_bind(self):
+        macro = Macro([
+            ['write_text', [], {'text': {'macro_argument': 'name'}}],
+            ['mouse_path', [], {'points': [{'x': {'macro_argument': 'x'},
+                                            'y': 1}]}]])
+        self.assertEqual(macro.arguments, frozenset(['name', 'x']))
+        self.assertEqual(macro.bind({'name': 'aenea', 'x': 5}), [
+            ('write_text', [], {'text': 'aenea'}),
+            ('mouse_path', [], {'points': [{'x': 5, 'y': 1}]})])
+        self.assertRaises(ValueError, macro.bind, {'name': 'aenea'})
+
+    def test_static(self):
+        actions = [('key_press', [], {'key': 'a'})]
+        self.assertEqual(Macro(actions).bind(), actions)
+
+
+class TestMacroRpcs(unittest.TestCase):
+    def setUp(self):
+        self.platform = CompilingPlatformRpcs(record=True)
+        rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+        self.addCleanup(rpc_server.server_close)
+        AeneaServer(self.platform, rpc_server)
+        self.funcs = rpc_server.funcs
+
+    def test_compiled(self):
+        self.funcs['register_macro']('keys', [('key_press', [], {'key': 'a'}),
+                                              ('key_press', [], {'key': 'b'})])
+        self.funcs['invoke_macro']('keys')
+        self.funcs['invoke_macro']('keys')
+        self.assertEqual(self.platform.calls,
+                         [('run_compiled', {'compiled': 'ab'})] * 2)
+
+    def test_arguments(self):
+        self.assertEqual(self.funcs['register_macro']('greet', [
+            ('write_text', [], {'text': {'macro_argument': 'name'}}),
+            ('key_press', [], {'key': 'enter'})]), ['name'])
+        self.funcs['invoke_macro']('greet', {'name': 'world'})
+        self.assertEqual(self.platform.calls[0],
+                         ('write_text', {'text': 'world', 'paste': False}))
+        self.assertEqual(self.platform.calls[1][1]['key'], 'enter')
+
+    def test_in_batches(self):
+        self.funcs['register_macro']('keys', [('key_press', [], {'key': 'a'})])
+        self.funcs['multiple_actions']([
+            ('write_text', [], {'text': 'x'}),
+            ('invoke_macro', ['keys'], {})])
+        self.funcs['enqueue_actions']([('invoke_macro', [],
+                                        {'macro_id': 'keys'})])
+        self.funcs['get_context']()
+        self.assertEqual([method for (method, _) in self.platform.calls],
+                         ['write_text', 'key_press', 'key_press'])
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, self.funcs['invoke_macro'], 'unknown')
+        self.assertRaises(ValueError, self.funcs['multiple_actions'],
+                          [('invoke_macro', ['unknown'], {})])
+        self.assertEqual(self.platform.calls, [])
+
+if __name__ == '__main__':
+    unittest.main()
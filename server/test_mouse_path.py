@@ -0,0 +1,125 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import unittest
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server.core import AeneaServer
+from server.mouse_path import expand_paths, path_actions
+from server.null import NullPlatformRpcs
+
+
+def moves(actions):
+    return [(optional['x'], optional['y']) for (method, _, optional)
+            in actions if method == 'move_mouse']
+
+
+class TestPathActions(unittest.TestCase):
+    def test_jumps_without_duration(self):
+        self.assertEqual(path_actions([{'x': 10, 'y': 20}, {'x': 30}]), [
+            ('move_mouse', [], {'x': 10, 'y': 20, 'reference': 'absolute',
+                                'proportional': False}),
+            ('move_mouse', [], {'x': 30, 'y': 0, 'reference': 'absolute',
+                                'proportional': False})])
+
+    def test_linear(self):
+        actions = path_actions([{'x': 0, 'y': 0},
+                                {'x': 100, 'y': 50, 'duration': 100}],
+                               rate=20)
+        self.assertEqual(moves(actions), [(0, 0), (50, 25), (100, 50)])
+        self.assertEqual([optional['amount'] for (method, _, optional)
+                          in actions if method == 'pause'], [50, 50])
+
+    def test_smooth(self):
+        actions = path_actions([{'x': 0, 'y': 0},
+                                {'x': 100, 'y': 0, 'duration': 100,
+                                 'interpolation': 'smooth'}], rate=40)
+        self.assertEqual(moves(actions), [(0, 0), (16, 0), (50, 0), (84, 0),
+                                          (100, 0)])
+        self.assertRaises(ValueError, path_actions, [
+            {'x': 0}, {'x': 1, 'duration': 100, 'interpolation': 'bounce'}])
+
+    def test_relative_adds_up(self):
+        actions = path_actions([{'x': 10, 'y': -7, 'reference': 'relative',
+                                 'duration': 60}], rate=100)
+        steps = moves(actions)
+        self.assertEqual(len(steps), 6)
+        self.assertEqual((sum(x for (x, _) in steps),
+                          sum(y for (_, y) in steps)), (10, -7))
+
+    def test_different_references_jump(self):
+        actions = path_actions([
+            {'x': 0.5, 'y': 0.5, 'proportional': True},
+            {'x': 10, 'y': 10, 'duration': 100}])
+        self.assertEqual(moves(actions), [(0.5, 0.5), (10, 10)])
+
+    def test_buttons_and_pauses(self):
+        self.assertEqual(
+            [action[0] for action in path_actions([
+                {'x': 1, 'y': 1, 'button': 'left', 'direction': 'down',
+                 'pause': 10},
+                {'x': 2, 'y': 2, 'button': 'left', 'direction': 'up'},
+                {'button': 'right'}])],
+            ['move_mouse', 'click_mouse', 'pause', 'move_mouse',
+             'click_mouse', 'click_mouse'])
+
+    def test_expand_paths(self):
+        key = ('key_press', [], {'key': 'a'})
+        self.assertEqual(expand_paths([key]), [key])
+        self.assertEqual(
+            [action[0] for action in expand_paths([
+                key, ('mouse_path', [], {'points': [{'x': 1, 'y': 1},
+                                                     {'button': 'left'}]})])],
+            ['key_press', 'move_mouse', 'click_mouse'])
+
+
+class TestMousePathRpc(unittest.TestCase):
+    drag = [{'x': 0, 'y': 0, 'button': 'left', 'direction': 'down'},
+            {'x': 100, 'y': 100, 'duration': 100, 'button': 'left',
+             'direction': 'up'}]
+
+    def setUp(self):
+        self.platform = NullPlatformRpcs(record=True)
+        rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+        self.addCleanup(rpc_server.server_close)
+        AeneaServer(self.platform, rpc_server)
+        self.funcs = rpc_server.funcs
+
+    def test_drag(self):
+        start = time.time()
+        self.funcs['mouse_path'](self.drag, rate=20)
+        self.assertTrue(time.time() - start >= 0.1)
+        self.assertEqual(
+            [(method, kwargs.get('x', kwargs.get('direction')))
+             for (method, kwargs) in self.platform.calls],
+            [('move_mouse', 0), ('click_mouse', 'down'), ('move_mouse', 50),
+             ('move_mouse', 100), ('click_mouse', 'up')])
+
+    def test_in_multiple_actions(self):
+        self.funcs['multiple_actions']([
+            ('mouse_path', [], {'points': self.drag, 'rate': 20}),
+            ('key_press', [], {'key': 'a'})])
+        self.assertEqual([method for (method, _) in self.platform.calls],
+                         ['move_mouse', 'click_mouse', 'move_mouse',
+                          'move_mouse', 'click_mouse', 'key_press'])
+
+    def test_platform_default(self):
+        self.platform.mouse_path([{'x': 1, 'y': 2}, {'button': 'left'}])
+        self.assertEqual([method for (method, _) in self.platform.calls],
+                         ['move_mouse', 'click_mouse'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from server import optimizer
+
+
+def key(key, **optional):
+    optional['key'] = key
+    return ('key_press', [], optional)
+
+
+def text(text, **optional):
+    optional['text'] = text
+    return ('write_text', [], optional)
+
+
+def pause(amount):
+    return ('pause', [], {'amount': amount})
+
+
+class TestActionOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.optimizer = optimizer.ActionOptimizer()
+
+    def test_merge_text(self):
+        self.assertEqual(
+            self.optimizer.optimize([text('a'), text('b'), text('c'),
+                                     text('d', paste=True), key('x'),
+                                     text('e')]),
+            [text('abc'), text('d', paste=True), key('x'), text('e')])
+
+    def test_merge_key_repeats(self):
+        self.assertEqual(
+            self.optimizer.optimize([
+                key('a', modifiers=['control']),
+                key('a', modifiers=['control'], count=3),
+                key('a'),
+                key('b', direction='down'), key('b', direction='down'),
+                key('c', count_delay=10), key('c')]),
+            [key('a', modifiers=['control'], count=4),
+             key('a'),
+             key('b', direction='down'), key('b', direction='down'),
+             key('c', count_delay=10), key('c')])
+
+    def test_drop_empty_pauses(self):
+        self.assertEqual(
+            self.optimizer.optimize([text('a'), pause(0), text('b'),
+                                     pause(5)]),
+            [text('ab'), pause(5)])
+
+    def test_cancel_modifier_releases(self):
+        self.assertEqual(
+            self.optimizer.optimize([
+                key('alt', direction='down'), key('tab'),
+                key('alt', direction='up'), key('alt', direction='down'),
+                key('tab'), key('alt', direction='up')]),
+            [key('alt', direction='down'), key('tab', count=2),
+             key('alt', direction='up')])
+        # a tap of a modifier is not a no-op (e.g. alt opens menus).
+        tap = [key('alt', direction='down'), key('alt', direction='up')]
+        self.assertEqual(self.optimizer.optimize(tap), tap)
+
+    def test_capabilities(self):
+        only_pauses = optimizer.ActionOptimizer([optimizer.DROP_EMPTY_PAUSES])
+        actions = [text('a'), pause(0), text('b')]
+        self.assertEqual(only_pauses.optimize(actions), [text('a'), text('b')])
+
+    def test_positional_actions_are_left_alone(self):
+        actions = [('write_text', ['a'], {}), ('write_text', ['b'], {})]
+        self.assertEqual(self.optimizer.optimize(actions), actions)
+
+    def test_stats(self):
+        self.optimizer.optimize([text('a'), text('b'), pause(0)])
+        stats = self.optimizer.stats()
+        self.assertEqual((stats['batches'], stats['actions_in'],
+                          stats['actions_out']), (1, 3, 1))
+        self.assertEqual(stats['eliminated'][optimizer.MERGE_TEXT], 1)
+        self.assertEqual(stats['eliminated'][optimizer.DROP_EMPTY_PAUSES], 1)
+        counters = self.optimizer.metrics.snapshot()['counters']
+        self.assertEqual(
+            sum(c['value'] for c in counters['actions_eliminated']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
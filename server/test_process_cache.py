@@ -0,0 +1,92 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import unittest
+
+from server.process_cache import ProcessMetadataCache, process_start_time
+
+
+class TestProcessMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.loads = []
+        self.start_times = {1: 100, 2: 200, 3: 300}
+        self.start_time_calls = 0
+        self.cache = ProcessMetadataCache(
+            self.load, max_size=2, start_time=self.start_time)
+
+    def load(self, pid):
+        self.loads.append(pid)
+        return {'executable': '/bin/%s-%s' % (pid, self.start_times[pid])}
+
+    def start_time(self, pid):
+        self.start_time_calls += 1
+        return self.start_times[pid]
+
+    def test_hit(self):
+        for _ in xrange(3):
+            self.assertEqual(self.cache.get(1), {'executable': '/bin/1-100'})
+        self.assertEqual(self.loads, [1])
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_pid_reuse(self):
+        self.cache.get(1)
+        self.start_times[1] = 150
+        self.assertEqual(self.cache.get(1), {'executable': '/bin/1-150'})
+        self.assertEqual(self.loads, [1, 1])
+
+    def test_window_skips_start_time(self):
+        self.cache.get(1, window_id=10)
+        self.cache.get(1, window_id=10)
+        self.cache.get(1, window_id=10)
+        self.assertEqual(self.start_time_calls, 1)
+        # a different pid behind the same window id is checked again.
+        self.cache.get(2, window_id=10)
+        self.assertEqual(self.loads, [1, 2])
+
+    def test_bounded(self):
+        self.cache.get(1)
+        self.cache.get(2)
+        self.cache.get(1)
+        self.cache.get(3)
+        self.cache.get(1)
+        self.cache.get(2)
+        self.assertEqual(self.loads, [1, 2, 3, 2])
+
+    def test_windows_bounded(self):
+        self.cache.max_windows = 2
+        self.cache.get(1, window_id=10)
+        self.cache.get(1, window_id=11)
+        self.cache.get(1, window_id=10)
+        self.cache.get(1, window_id=12)
+        self.assertEqual(self.cache._windows.keys(), [10, 12])
+        self.cache.get(1, window_id=11)
+        self.assertEqual(self.start_time_calls, 4)
+
+    def test_unknown_start_time_is_not_cached(self):
+        self.start_times[1] = None
+        self.cache.get(1)
+        self.cache.get(1)
+        self.assertEqual(self.loads, [1, 1])
+
+    @unittest.skipUnless(os.path.exists('/proc/self/stat'), 'needs /proc')
+    def test_process_start_time(self):
+        start = process_start_time(os.getpid())
+        self.assertTrue(isinstance(start, (int, long)))
+        self.assertEqual(start, process_start_time(os.getpid()))
+        self.assertEqual(process_start_time(-1), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
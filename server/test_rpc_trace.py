@@ -0,0 +1,112 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import jsonrpclib
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+from server import replay
+from server.core import AeneaServer
+from server.null import NullPlatformRpcs
+from server.rpc_trace import read_trace
+
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'aenea.trace')
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.server.server_close()
+            if server.trace is not None:
+                server.trace.close()
+        shutil.rmtree(self.directory)
+
+    def make_server(self, **kwargs):
+        platform = NullPlatformRpcs(record=True)
+        rpc_server = SimpleJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+        server = AeneaServer(platform, rpc_server, **kwargs)
+        self.servers.append(server)
+        return server
+
+    def dispatch(self, server, method, params):
+        request = jsonrpclib.dumps(params, methodname=method, rpcid=1)
+        return server.server._marshaled_dispatch(request)
+
+    def record_session(self):
+        server = self.make_server(trace_file=self.path)
+        self.dispatch(server, 'key_press', {'key': 'a'})
+        self.dispatch(server, 'multiple_actions', {'actions': [
+            ['write_text', [], {'text': 'hello'}],
+            ['key_press', [], {'key': 'left', 'count': 2}],
+        ]})
+        self.dispatch(server, 'get_context', {})
+        server.trace.close()
+        return server
+
+    def test_records_incoming_rpcs_only(self):
+        self.record_session()
+        calls = read_trace(self.path)
+        self.assertEqual([method for (_, method, _) in calls],
+                         ['key_press', 'multiple_actions', 'get_context'])
+        self.assertEqual(calls[1][2]['actions'][0],
+                         ['write_text', [], {'text': 'hello'}])
+        self.assertTrue(calls[0][0] <= calls[1][0] <= calls[2][0])
+
+    def test_appends_and_skips_truncated_line(self):
+        self.record_session()
+        self.record_session()
+        with open(self.path, 'ab') as fd:
+            fd.write('[1.0,"key_pr')
+        self.assertEqual(len(read_trace(self.path)), 6)
+
+    def test_replay(self):
+        recorded = self.record_session()
+        server = self.make_server()
+        results = replay.replay(server, read_trace(self.path), speed=0)
+        self.assertEqual(server.rpc_impl.calls, recorded.rpc_impl.calls)
+        self.assertEqual(results['calls'], 3)
+        self.assertEqual(results['actions'], 4)
+        self.assertEqual(results['errors'], {})
+        self.assertEqual(results['methods']['multiple_actions']['iterations'],
+                         1)
+        self.assertNotIn('schedule_lag', results)
+
+    def test_replay_errors(self):
+        server = self.make_server()
+        # a result mentioning "error" is not an error.
+        server.rpc_impl.context = {'title': 'error', 'error': None}
+        calls = [(100.0, 'get_context', {}),
+                 (100.0, 'no_such_method', {})]
+        results = replay.replay(server, calls, speed=0)
+        self.assertEqual(results['errors'], {'no_such_method': 1})
+
+    def test_replay_timing(self):
+        calls = [(100.0, 'key_press', {'key': 'a'}),
+                 (100.05, 'key_press', {'key': 'b'}),
+                 # a new session an hour later
+                 (3700.0, 'key_press', {'key': 'c'})]
+        results = replay.replay(self.make_server(), calls, speed=1,
+                                max_gap=0.05)
+        self.assertTrue(0.1 <= results['elapsed'] < 1)
+        self.assertEqual(results['schedule_lag']['iterations'], 3)
+
+if __name__ == '__main__':
+    unittest.main()